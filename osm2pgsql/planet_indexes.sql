@@ -0,0 +1,49 @@
+-- Additional indexes of osm2pgsql tables for the POI matcher queries.
+-- osm2pgsql creates the GiST index of "way" column, these indexes are for the radius
+-- filters (bounding box prefilter with "&&") and the address based priority tiers.
+-- Run it after every osm2pgsql import: psql -d poi -f planet_indexes.sql
+
+-- Buildings around POIs (query_osm_building_poi_gpd)
+CREATE INDEX IF NOT EXISTS planet_osm_polygon_building_way_idx ON planet_osm_polygon USING GIST (way)
+  WHERE building <> '';
+CREATE INDEX IF NOT EXISTS planet_osm_polygon_building_address_idx
+  ON planet_osm_polygon (LOWER(TEXT("addr:street")), LOWER(TEXT("addr:housenumber")))
+  WHERE building <> '';
+
+-- Water areas (query_poi_in_water)
+CREATE INDEX IF NOT EXISTS planet_osm_polygon_water_way_idx ON planet_osm_polygon USING GIST (way)
+  WHERE water IS NOT NULL OR waterway IS NOT NULL;
+
+-- Roads (query_name_road_around)
+CREATE INDEX IF NOT EXISTS planet_osm_line_highway_way_idx ON planet_osm_line USING GIST (way)
+  WHERE highway IS NOT NULL;
+
+-- Address based priority tiers of the matcher (965, 940)
+CREATE INDEX IF NOT EXISTS planet_osm_point_addr_city_idx ON planet_osm_point (LOWER(TEXT("addr:city")))
+  WHERE "addr:city" IS NOT NULL;
+CREATE INDEX IF NOT EXISTS planet_osm_polygon_addr_city_idx ON planet_osm_polygon (LOWER(TEXT("addr:city")))
+  WHERE "addr:city" IS NOT NULL;
+
+-- Trigram indexes of normalised (lower case, unaccented) names and brands for matcher.name.matching=trigram
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+-- unaccent() is only STABLE (it depends on search_path), expression indexes need an IMMUTABLE function
+CREATE OR REPLACE FUNCTION opm_unaccent(text) RETURNS text
+  AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+CREATE INDEX IF NOT EXISTS planet_osm_point_name_trgm_idx ON planet_osm_point
+  USING GIN (LOWER(opm_unaccent(name)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS planet_osm_point_brand_trgm_idx ON planet_osm_point
+  USING GIN (LOWER(opm_unaccent(brand)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS planet_osm_polygon_name_trgm_idx ON planet_osm_polygon
+  USING GIN (LOWER(opm_unaccent(name)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS planet_osm_polygon_brand_trgm_idx ON planet_osm_polygon
+  USING GIN (LOWER(opm_unaccent(brand)) gin_trgm_ops);
+
+-- Objects changed since the previous matcher run (create_db --incremental)
+CREATE INDEX IF NOT EXISTS planet_osm_point_osm_timestamp_idx ON planet_osm_point (osm_timestamp);
+CREATE INDEX IF NOT EXISTS planet_osm_polygon_osm_timestamp_idx ON planet_osm_polygon (osm_timestamp);
+
+ANALYZE planet_osm_point;
+ANALYZE planet_osm_polygon;
+ANALYZE planet_osm_line;
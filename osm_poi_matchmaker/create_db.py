@@ -7,6 +7,7 @@ __version__ = '0.7.0'
 
 try:
     import os
+    import argparse
     import logging
     import logging.config
     import sys
@@ -17,11 +18,14 @@ try:
     from osm_poi_matchmaker.utils import config, timing
     from osm_poi_matchmaker.libs.osm import timestamp_now
     from osm_poi_matchmaker.libs.online_poi_matching import online_poi_matching
+    from osm_poi_matchmaker.libs.checkpoint import checkpoint_directory, split_spatial_chunks, chunk_key, \
+        load_chunk, clear_checkpoints, CheckpointWorker, WorkerStats
+    from osm_poi_matchmaker.libs.osm_changes import load_osm_changes
+    from osm_poi_matchmaker.libs.name_classifier import build_poi_osm_candidates
     from osm_poi_matchmaker.libs.import_poi_data_module import import_poi_data_module
     from osm_poi_matchmaker.libs.export import export_raw_poi_data, export_raw_poi_data_xml, export_grouped_poi_data, \
         export_grouped_poi_data_with_postcode_groups
-    from sqlalchemy.orm import scoped_session, sessionmaker
-    from osm_poi_matchmaker.dao.poi_base import POIBase
+    from osm_poi_matchmaker.dao.poi_base import get_poi_base, init_worker, worker_processes, worker_pool_size
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
     logging.exception('Exception occurred')
@@ -67,15 +71,48 @@ def load_common_data(database):
     return database.query_all_pd('poi_common')
 
 
+def load_incremental_changes(database, data, osc_file=''):
+    '''
+    Load OSM objects changed since the previous matcher run for incremental matching
+    :param database: POIBase instance
+    :param data: POI dataset
+    :param osc_file: OSM change file of the replication diffs, planet tables are compared with the stored match
+      decisions when it is empty
+    :return: OSMChanges or None when all POIs have to be matched
+    '''
+    if not config.get_matcher_memo():
+        logging.warning('Incremental matching needs stored match decisions (matcher.memo), matching all POIs ...')
+        return None
+    if osc_file:
+        return load_osm_changes(database, osc_file)
+    since = database.query_poi_osm_snapshot(data['poi_hash'].dropna().unique())
+    if since is None:
+        logging.info('There is no previous matcher run, matching all POIs ...')
+        return None
+    return load_osm_changes(database, since=since)
+
+
 class WorkflowManager(object):
 
     def __init__(self):
         self.manager = multiprocessing.Manager()
         self.queue = self.manager.Queue()
-        self.NUMBER_OF_PROCESSES = multiprocessing.cpu_count()
+        # Every worker process has its own connection pool, together they must fit in the connection limit of the
+        # database server
+        self.NUMBER_OF_PROCESSES = worker_processes()
         self.items = 0
         self.pool = None
         self.results = []
+        # Keys and number of POIs of the chunks whose matching failed in the last start_matcher() call
+        self.failed_chunks = []
+
+    def create_pool(self):
+        '''
+        Create a process pool whose workers create their database engine and session factory only once, every stage
+        running in the worker reuses them
+        '''
+        return multiprocessing.Pool(processes=self.NUMBER_OF_PROCESSES, initializer=init_worker,
+                                    initargs=(worker_pool_size(self.NUMBER_OF_PROCESSES),))
 
     def start_poi_harvest(self):
         for m in config.get_dataproviders_modules_enable():
@@ -84,7 +121,7 @@ class WorkflowManager(object):
             # Start multiprocessing in case multiple cores
             logging.info('Starting processing on %s cores.', self.NUMBER_OF_PROCESSES)
             self.results = []
-            self.pool = multiprocessing.Pool(processes=self.NUMBER_OF_PROCESSES)
+            self.pool = self.create_pool()
             self.results = self.pool.map_async(import_poi_data_module, config.get_dataproviders_modules_enable())
             self.pool.close()
         except Exception as e:
@@ -99,21 +136,54 @@ class WorkflowManager(object):
             # Start multiprocessing in case multiple cores
             logging.info('Starting processing on %s cores.', self.NUMBER_OF_PROCESSES)
             self.results = []
-            self.pool = multiprocessing.Pool(processes=self.NUMBER_OF_PROCESSES)
+            self.pool = self.create_pool()
             self.results = self.pool.map_async(to_do, modules)
             self.pool.close()
         except Exception as e:
             logging.error(e)
             logging.exception('Exception occurred')
 
-    def start_matcher(self, data, comm_data):
+    def start_matcher(self, data, comm_data, resume=False, changes=None):
         try:
-            workers = self.NUMBER_OF_PROCESSES
-            self.pool = multiprocessing.Pool(processes=self.NUMBER_OF_PROCESSES)
-            self.results = self.pool.map_async(online_poi_matching,
-                                               [(d, comm_data) for d in np.array_split(data, workers)])
+            directory = checkpoint_directory()
+            if not resume:
+                clear_checkpoints(directory)
+            # Many small chunks of neighbouring POIs, so no worker gets a much slower part of the dataset
+            chunks = [(chunk_key(d), d) for d in split_spatial_chunks(data,
+                                                                      config.get_matcher_checkpoint_chunk_size())]
+            results = {}
+            if resume:
+                for key, d in chunks:
+                    result = load_chunk(directory, key)
+                    if result is not None:
+                        results[key] = result
+                logging.info('Resuming matcher, %s of %s chunks are loaded from checkpoints.', len(results),
+                             len(chunks))
+            to_do = [(directory, key, d, comm_data, changes) for key, d in chunks if key not in results]
+            self.pool = self.create_pool()
+            # Chunks are saved as soon as they are matched, an interrupted run loses only the unfinished chunks.
+            # Workers take the next chunk when they are ready with the previous one.
+            worker_stats = WorkerStats()
+            self.failed_chunks = []
+            for key, result, stats in self.pool.imap_unordered(CheckpointWorker(online_poi_matching, True), to_do):
+                worker_stats.add(stats)
+                if result is None:
+                    # Failed chunks are not checkpointed, the next run with --resume matches them again
+                    self.failed_chunks.append((key, stats[2]))
+                    logging.error('Matching of chunk %s (%s POIs) failed.', key, stats[2])
+                    continue
+                results[key] = result
+                logging.info('Matched %s of %s chunks.', len(results), len(chunks))
             self.pool.close()
-            return pd.concat(list(self.results.get()), sort=False)
+            worker_stats.log_stats()
+            if self.failed_chunks:
+                logging.error('%s chunks (%s POIs) failed, rerun with --resume to match them.',
+                              len(self.failed_chunks), sum(pois for key, pois in self.failed_chunks))
+            if not results:
+                return data.iloc[0:0]
+            matched = pd.concat([results[key] for key, d in chunks if key in results], sort=False)
+            # The original order of POIs is restored
+            return matched.loc[data.index.intersection(matched.index, sort=False)]
         except Exception as e:
             logging.error(e)
             logging.exception('Exception occurred')
@@ -122,22 +192,25 @@ class WorkflowManager(object):
         self.pool.join()
 
 
-def main():
+def main(resume=False, incremental=None, migrate=False):
+    '''
+    Import POI datasets, match them with OpenStreetMap and export the results
+    :return: Exit status, non-zero when some chunks of POIs could not be matched
+    '''
     logging.info('Starting %s ...', __program__)
-    db = POIBase('{}://{}:{}@{}:{}/{}'.format(config.get_database_type(), config.get_database_writer_username(),
-                                              config.get_database_writer_password(),
-                                              config.get_database_writer_host(),
-                                              config.get_database_writer_port(),
-                                              config.get_database_poi_database()))
-    pgsql_pool = db.pool
-    session_factory = sessionmaker(pgsql_pool)
-    Session = scoped_session(session_factory)
-    session = Session()
+    db = get_poi_base()
+    session = db.session
     try:
-        import_basic_data(db.session)
+        if migrate:
+            db.migrate_poi_osm()
         manager = WorkflowManager()
-        manager.start_poi_harvest()
-        manager.join()
+        if not resume:
+            import_basic_data(session)
+            manager.start_poi_harvest()
+            manager.join()
+        else:
+            # Checkpoints belong to the POI dataset of the interrupted run, it must not be imported again
+            logging.info('Resuming interrupted run, skipping import of POI datasets ...')
         # Load basic dataset from database
         poi_addr_data = load_poi_data(db)
         # Download and load POI dataset to database
@@ -161,26 +234,50 @@ def main():
         logging.info('Merging with OSM datasets ...')
         poi_addr_data['osm_nodes'] = None
         poi_addr_data['poi_distance'] = None
+        changes = None
+        if incremental is not None:
+            changes = load_incremental_changes(db, poi_addr_data, incremental)
+        if config.get_matcher_name_matching() == 'candidate' and not resume:
+            # OSM objects are tagged with their candidate POI codes once, the matcher does not evaluate names
+            logging.info('Tagging OSM objects with candidate POI codes ...')
+            build_poi_osm_candidates(db, poi_common_data)
         # Enrich POI datasets from online OpenStreetMap database
         logging.info('Starting online POI matching part...')
-        poi_addr_data = manager.start_matcher(poi_addr_data, poi_common_data)
+        poi_addr_data = manager.start_matcher(poi_addr_data, poi_common_data, resume, changes)
         manager.join()
         # Export filesets
         export_raw_poi_data(poi_addr_data, poi_common_data, '_merge')
         manager.start_exporter(poi_addr_data, 'merge_')
         manager.start_exporter(poi_addr_data, 'merge_', export_grouped_poi_data_with_postcode_groups)
         manager.join()
+        if manager.failed_chunks:
+            # The merged export misses the POIs of failed chunks, the run is not successful
+            return 1
+        return 0
 
     except (KeyboardInterrupt, SystemExit):
         logging.info('Interrupt signal received')
         sys.exit(1)
     except Exception as err:
         raise err
+    finally:
+        session.close()
 
 
 if __name__ == '__main__':
     config.set_mode(config.Mode.matcher)
     init_log()
+    parser = argparse.ArgumentParser(description='Import POI datasets and match them with OpenStreetMap')
+    parser.add_argument('--resume', action='store_true',
+                        help='reuse matched chunks of an interrupted run from checkpoint directory')
+    parser.add_argument('--incremental', nargs='?', const='', metavar='OSC_FILE',
+                        help='match again only POIs around OSM objects changed since the previous run (listed in '
+                             'OSC_FILE or newer in the planet tables), other POIs reuse their stored match')
+    parser.add_argument('--migrate', action='store_true',
+                        help='migrate poi_osm table of an earlier version, so match decisions can be stored '
+                             '(matcher.memo)')
+    args = parser.parse_args()
     timer = timing.Timing()
-    main()
+    status = main(args.resume, args.incremental, args.migrate)
     logging.info('Total duration of process: %s. Finished, exiting and go home ...', timer.end())
+    sys.exit(status)
@@ -219,9 +219,47 @@ class POI_osm(Base):
     _plural_name_ = 'poi_osm'
     po_id = Column(Integer, primary_key=True, index=True)
     id = synonym('po_id')
-    poi_osm_id = Column(BigInteger, unique=True, index=True)
+    # Match decision of a POI, poi_osm_id is NULL when there was no matching OSM object
+    poi_osm_id = Column(BigInteger, nullable=True, index=True)
     poi_osm_object_type = Column(Enum(OSM_object_type))
-    poi_hash = Column(Unicode(128), nullable=True, unique=False, index=True)
+    poi_hash = Column(Unicode(128), nullable=False, unique=True, index=True)
+    # Hash of POI type, search names and search distances used for the match
+    poi_search_hash = Column(Unicode(128), nullable=True)
     geom_hint = Column(Geometry('POINT, {}'.format(config.get_geo_default_projection())))
+    poi_osm_tier = Column(Integer, nullable=True)
+    poi_osm_distance = Column(Float, nullable=True)
+    poi_osm_version = Column(Integer, nullable=True)
+    osm_snapshot = Column(DateTime(True), nullable=True)
+    poi_osm_updated = Column(DateTime(True), nullable=False, server_default=func.now())
+
+
+class POI_OSM_candidate(Base):
+    __tablename__ = 'poi_osm_candidate'
+    _plural_name_ = 'poi_osm_candidate'
+    pocd_id = Column(Integer, primary_key=True, index=True)
+    id = synonym('pocd_id')
+    # OSM object whose name or brand matches the search name (or the avoid name) of a POI common
+    osm_id = Column(BigInteger, nullable=False, index=True)
+    osm_object_type = Column(Enum(OSM_object_type), nullable=False)
+    poi_code = Column(Unicode(10), nullable=False, index=True)
+    poi_avoid = Column(Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return '<POI OSM candidate {}: {} {} ({})>'.format(self.pocd_id, self.osm_object_type, self.osm_id,
+                                                           self.poi_code)
+
+
+class POI_tier_stat(Base):
+    __tablename__ = 'poi_tier_stat'
+    _plural_name_ = 'poi_tier_stat'
+    pts_id = Column(Integer, primary_key=True, index=True)
+    id = synonym('pts_id')
+    poi_code = Column(Unicode(10), nullable=False, index=True)
+    # Priority tier of the matches, 0 counts the lookups without match
+    poi_osm_tier = Column(Integer, nullable=False)
+    hits = Column(BigInteger, nullable=False, default=0)
 
-    __table_args__ = (UniqueConstraint('poi_osm_id', 'poi_osm_object_type', name='uc_poi_osm_osm_type'),)
+    __table_args__ = (UniqueConstraint('poi_code', 'poi_osm_tier', name='uc_poi_code_osm_tier'),)
+
+    def __repr__(self):
+        return '<POI tier stat {}: {} {} ({})>'.format(self.pts_id, self.poi_code, self.poi_osm_tier, self.hits)
@@ -5,11 +5,18 @@ try:
     import geopandas as gpd
     import pandas as pd
     import sqlalchemy
+    import os
     import time
     import math
+    import multiprocessing
+    import re
+    import unicodedata
     from math import isnan
+    from collections import namedtuple
     from osm_poi_matchmaker.utils import config, poitypes
-    from osm_poi_matchmaker.dao.data_structure import Base
+    from sqlalchemy.dialects.postgresql import insert
+    from osm_poi_matchmaker.dao.data_structure import Base, POI_osm, POI_OSM_candidate, POI_tier_stat, \
+        POI_OSM_cache
     import psycopg2
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
@@ -18,6 +25,404 @@ except ImportError as err:
     sys.exit(128)
 
 
+# Priority tiers in the order the matcher tries them. The address based tiers (965, 940) have no distance limit
+# and they are checked before the distance based ones, therefore ordering by priority number is not enough.
+CASCADE_TIER_ORDER = (965, 940, 950, 970, 980, 990)
+# Tiers queried together in one round trip by query_osm_shop_poi_gpd
+CASCADE_TIER_GROUPS = ((965,), (940,), (950, 970, 980, 990))
+TIER_ORDER_SQL = 'array_position(ARRAY[{}], priority)'.format(', '.join(str(p) for p in CASCADE_TIER_ORDER))
+
+# Name of OSM object type, table, object id filter and representative point of matcher sources
+SHOP_POI_SOURCES = (('way', 'planet_osm_polygon', 'osm_id > 0', 'ST_PointOnSurface(planet_osm_polygon.way)'),
+                    ('node', 'planet_osm_point', 'osm_id > 0', 'planet_osm_point.way'),
+                    ('relation', 'planet_osm_polygon', 'osm_id < 0', 'ST_PointOnSurface(planet_osm_polygon.way)'))
+
+SHOP_POI_FILTERS = {
+    'name': ' AND (LOWER(TEXT(name)) ~* LOWER(TEXT(:name)) OR LOWER(TEXT(brand)) ~* LOWER(TEXT(:name)))',
+    'avoid_name': ' AND (LOWER(TEXT(name)) !~* LOWER(TEXT(:avoid_name)) AND LOWER(TEXT(brand)) !~* LOWER(TEXT(:avoid_name)))',
+    # Trigram index usable variants of name filters, see rewrite_search_name()
+    'name_like': ' AND (LOWER(opm_unaccent(name)) LIKE ANY(CAST(:name_like AS text[])) OR '
+                 'LOWER(opm_unaccent(brand)) LIKE ANY(CAST(:name_like AS text[])))',
+    'avoid_name_like': ' AND NOT (LOWER(opm_unaccent(name)) LIKE ANY(CAST(:avoid_name_like AS text[]))) AND '
+                       'NOT (LOWER(opm_unaccent(brand)) LIKE ANY(CAST(:avoid_name_like AS text[])))',
+    # Pre-tagged variants of name filters (poi_osm_candidate table), see libs/name_classifier.py
+    'name_candidate': ' AND EXISTS (SELECT 1 FROM poi_osm_candidate JOIN poi_common USING (poi_code) '
+                      'WHERE poi_osm_candidate.osm_id = {table}.osm_id AND poi_osm_candidate.osm_object_type = '
+                      '\'{node}\' AND NOT poi_osm_candidate.poi_avoid AND poi_common.poi_search_name = '
+                      ':name_candidate)',
+    'avoid_name_candidate': ' AND name IS NOT NULL AND brand IS NOT NULL AND NOT EXISTS (SELECT 1 FROM '
+                            'poi_osm_candidate JOIN poi_common USING (poi_code) '
+                            'WHERE poi_osm_candidate.osm_id = {table}.osm_id AND poi_osm_candidate.osm_object_type = '
+                            '\'{node}\' AND poi_osm_candidate.poi_avoid AND poi_common.poi_search_avoid_name = '
+                            ':avoid_name_candidate)',
+    'street_name': ' AND LOWER(TEXT("addr:street")) = LOWER(TEXT({street_name}))',
+    'housenumber': ' AND LOWER(TEXT("addr:housenumber")) = LOWER(TEXT({housenumber}))',
+    'conscriptionnumber': ' AND LOWER(TEXT("addr:conscriptionnumber")) = LOWER(TEXT({conscriptionnumber}))',
+    'city': ' AND LOWER(TEXT("addr:city")) = LOWER(TEXT({city}))'}
+
+# POI address fields of batch queries and their column names in the POI dataframe
+BATCH_ADDRESS_COLUMNS = {'street_name': 'poi_addr_street', 'housenumber': 'poi_addr_housenumber',
+                         'conscriptionnumber': 'poi_conscriptionnumber', 'city': 'poi_city'}
+
+# Planet tables of OSM objects by object type with the sign of their osm_id (relations are negative)
+PLANET_OBJECT_SOURCES = {'node': (('planet_osm_point', 1),),
+                         'way': (('planet_osm_polygon', 1), ('planet_osm_line', 1)),
+                         'relation': (('planet_osm_polygon', -1), ('planet_osm_line', -1))}
+# Migration of a poi_osm table created before match decisions were stored: poi_hash becomes unique, an OSM object
+# may be matched by more POIs and the columns of match decisions are added. Every statement can run again.
+POI_OSM_MIGRATION = (
+    'ALTER TABLE poi_osm DROP CONSTRAINT IF EXISTS uc_poi_osm_osm_type',
+    'DROP INDEX IF EXISTS ix_poi_osm_poi_osm_id',
+    'CREATE INDEX IF NOT EXISTS ix_poi_osm_poi_osm_id ON poi_osm (poi_osm_id)',
+    'ALTER TABLE poi_osm ADD COLUMN IF NOT EXISTS poi_search_hash VARCHAR(128)',
+    'ALTER TABLE poi_osm ADD COLUMN IF NOT EXISTS poi_osm_tier INTEGER',
+    'ALTER TABLE poi_osm ADD COLUMN IF NOT EXISTS poi_osm_distance FLOAT',
+    'ALTER TABLE poi_osm ADD COLUMN IF NOT EXISTS poi_osm_version INTEGER',
+    'ALTER TABLE poi_osm ADD COLUMN IF NOT EXISTS osm_snapshot TIMESTAMP WITH TIME ZONE',
+    'ALTER TABLE poi_osm ADD COLUMN IF NOT EXISTS poi_osm_updated TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()',
+    # Rows without poi_hash and older rows of the same poi_hash cannot be reused
+    'DELETE FROM poi_osm WHERE poi_hash IS NULL',
+    'DELETE FROM poi_osm AS o USING poi_osm AS n WHERE o.poi_hash = n.poi_hash AND o.po_id < n.po_id',
+    'ALTER TABLE poi_osm ALTER COLUMN poi_hash SET NOT NULL',
+    'DROP INDEX IF EXISTS ix_poi_osm_poi_hash',
+    'CREATE UNIQUE INDEX ix_poi_osm_poi_hash ON poi_osm (poi_hash)',
+)
+
+# Metadata columns of the planet tables (imported with --extra-attributes)
+PLANET_METADATA_COLUMNS = ('osm_user', 'osm_uid', 'osm_version', 'osm_changeset', 'osm_timestamp')
+
+# Length of one degree of latitude on the sphere of ST_DistanceSphere() in meter
+SPHERE_DEGREE_LENGTH = 111194.87
+
+# PostgreSQL types of the matcher query parameters in prepared statements, the others are text
+QUERY_PARAMETER_TYPES = {'lon': 'float8', 'lat': 'float8', 'distance_perfect': 'float8', 'distance_safe': 'float8',
+                         'distance_unsafe': 'float8', 'name_like': 'text[]', 'avoid_name_like': 'text[]'}
+
+# Variants of name filters by name matching mode (matcher.name.matching), see search_name_params()
+NAME_FILTER_VARIANTS = ('like', 'candidate')
+
+# Connections of the database server reserved for superusers (superuser_reserved_connections of PostgreSQL)
+RESERVED_CONNECTIONS = 3
+# Connection pool size of a process: a session and a direct query of the engine may be used at the same time
+MIN_POOL_SIZE = 2
+
+# POIBase of this process keyed by process id and database url, see get_poi_base()
+__databases = {}
+
+ShopPOITier = namedtuple('ShopPOITier', ['priority', 'filters', 'distance', 'without'])
+QueryTemplate = namedtuple('QueryTemplate', ['name', 'text', 'positional_text', 'params', 'tiers'])
+
+
+def shop_poi_tiers(present, guarded=False):
+    '''
+    List the priority tiers of OSM POI search that can be used with the given search fields
+    :param present: Set of filter names (name, avoid_name, street_name, housenumber, conscriptionnumber, city)
+      that have value
+    :param guarded: The address parts are checked POI by POI in the query, so keep mutually exclusive tiers too
+    :return: List of ShopPOITier in cascade order
+    '''
+    name = ('name',) if 'name' in present else ()
+    avoid_name = ('avoid_name',) if 'avoid_name' in present else ()
+    tiers = []
+    # WITH NAME, WITH CONSCRIPTINNUMBER, WITH CITY
+    if {'name', 'conscriptionnumber', 'city'} <= present:
+        tiers.append(ShopPOITier(965, ('name', 'conscriptionnumber', 'city'), None, ()))
+    # WITH NAME, WITH CITY, WITH STREETNAME, WITH HOUSENUMBER
+    if {'name', 'city', 'street_name', 'housenumber'} <= present:
+        tiers.append(ShopPOITier(940, ('name', 'city', 'street_name', 'housenumber'), None, ()))
+    if 'street_name' in present:
+        # WITH NAME, WITH STREETNAME, WITH HOUSENUMBER
+        if 'housenumber' in present:
+            tiers.append(ShopPOITier(950, name + ('street_name', 'housenumber'), 'distance_perfect', ()))
+        # WITH NAME, WITH STREETNAME, NO HOUSENUMBER
+        tiers.append(ShopPOITier(970, name + ('street_name',), 'distance_safe', ()))
+    if 'housenumber' in present and ('street_name' not in present or guarded):
+        # WITH NAME, NO STREETNAME, WITH HOUSENUMBER
+        tiers.append(ShopPOITier(970, name + ('housenumber',), 'distance_safe', ('street_name',)))
+    # WITH NAME, NO STREETNAME, NO HOUSENUMBER
+    tiers.append(ShopPOITier(980, name, 'distance_safe', ()))
+    # NO NAME, NO STREETNAME, NO HOUSENUMBER
+    tiers.append(ShopPOITier(990, avoid_name, 'distance_unsafe', ()))
+    return tiers
+
+
+def distance_within_sql(geom, point, distance):
+    '''
+    Generate a radius filter that can use the GiST index of the geometry column: bounding box of the point expanded
+    with the radius (converted to degrees at the farthest latitude of the circle) and the exact spherical distance
+    :param geom: SQL expression of the geometry column
+    :param point: SQL expression of the point
+    :param distance: SQL expression of the radius in meter
+    :return: SQL text of the condition
+    '''
+    return '''({geom} && ST_Expand({point},
+                {distance} / ({length} * cos(radians(LEAST(abs(ST_Y({point})) + {distance} / {length}, 89.9)))),
+                {distance} / {length})
+            AND ST_DistanceSphere({geom}, {point}) < {distance})'''.format(geom=geom, point=point, distance=distance,
+                                                                      length=SPHERE_DEGREE_LENGTH)
+
+
+def shop_poi_filter(name, variants=()):
+    '''
+    Key of a filter in SHOP_POI_FILTERS
+    :param name: Filter name
+    :param variants: Name filter variants in use, see search_name_params()
+    :return: Key of the variant of the filter or its own key when there is no variant in use
+    '''
+    for variant in NAME_FILTER_VARIANTS:
+        if '{}_{}'.format(name, variant) in variants:
+            return '{}_{}'.format(name, variant)
+    return name
+
+
+def shop_poi_tier_query(tier, query_type, with_metadata=True, batch=False, variants=()):
+    '''
+    Generate the SQL of one priority tier: UNION ALL of OSM way, node and relation selectors
+    :param tier: ShopPOITier to generate
+    :param query_type: OSM tag filter of POI type, see poitypes.getPOITypes()
+    :param with_metadata: Query OpenStreetMap metadata information
+    :param batch: Generate for query_osm_shop_poi_gpd_batch(), where the POI is the "poi" relation
+    :param variants: Name filter variants used instead of regular expression, see search_name_params()
+    :return: SQL text
+    '''
+    metadata_fields = ' osm_user, osm_uid, osm_version, osm_changeset, osm_timestamp, ' if with_metadata else ''
+    if batch:
+        point, point_from = 'poi.geom', ''
+        values = {k: 'poi.{}'.format(k) for k in BATCH_ADDRESS_COLUMNS}
+    else:
+        point, point_from = 'point.geom', ', (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point'
+        values = {k: ':{}'.format(k) for k in BATCH_ADDRESS_COLUMNS}
+    # Formatted by selector: the pre-tagged name filters refer to their table and object type
+    filters = ''.join(SHOP_POI_FILTERS[shop_poi_filter(f, variants)] for f in tier.filters)
+    conditions = ''
+    if batch:
+        # Skip the address tier when the POI itself has no such address part
+        conditions += ''.join(' AND {} <> \'\''.format(values[f]) for f in tier.filters if f in values)
+        conditions += ''.join(' AND COALESCE({}, \'\') = \'\''.format(values[f]) for f in tier.without)
+    if tier.distance is not None:
+        distance = 'ST_DistanceSphere(way, {})'.format(point)
+        conditions += ' AND {}'.format(distance_within_sql('way', point, ':{}'.format(tier.distance)))
+    else:
+        # Numeric zero, so the address tiers can be in UNION with the distance based ones
+        distance, point_from = '0', ''
+    selectors = []
+    for node, table, id_filter, position in SHOP_POI_SOURCES:
+        selectors.append('''
+            --- The {node} selector of priority {priority}
+            SELECT name, osm_id, {metadata_fields} {priority} AS priority, '{node}' AS node, shop, amenity,
+                   "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
+                   "addr:conscriptionnumber", {distance} as distance, way, ST_AsEWKT(way) as way_ewkt,
+                   ST_X({position}) as lon,
+                   ST_Y({position}) as lat
+            FROM {table}{point_from}
+            WHERE ({query_type}) AND {id_filter} {conditions}
+            '''.format(node=node, priority=tier.priority, metadata_fields=metadata_fields, distance=distance,
+                       position=position, table=table, point_from=point_from, query_type=query_type,
+                       id_filter=id_filter,
+                       conditions=filters.format(node=node, table=table, **values) + conditions))
+    return 'UNION ALL'.join(selectors)
+
+
+def shop_poi_candidates_query(query_type, with_metadata=True, conditions=''):
+    '''
+    Generate the SQL that loads every OSM object of a POI type for the in-memory candidate index
+    :param query_type: OSM tag filter of POI type, see poitypes.getPOITypes()
+    :param with_metadata: Query OpenStreetMap metadata information
+    :param conditions: Additional SQL conditions (starting with AND) of every selector
+    :return: SQL text
+    '''
+    metadata_fields = ' osm_user, osm_uid, osm_version, osm_changeset, osm_timestamp, ' if with_metadata else ''
+    selectors = []
+    for node, table, id_filter, position in SHOP_POI_SOURCES:
+        selectors.append('''
+            --- The {node} selector of candidate index
+            SELECT name, brand, osm_id, {metadata_fields} '{node}' AS node, shop, amenity,
+                   "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
+                   "addr:conscriptionnumber", way, ST_AsEWKT(way) as way_ewkt,
+                   ST_X({position}) as lon,
+                   ST_Y({position}) as lat
+            FROM {table}
+            WHERE ({query_type}) AND {id_filter} {conditions}
+            '''.format(node=node, metadata_fields=metadata_fields, position=position, table=table,
+                       query_type=query_type, id_filter=id_filter, conditions=conditions))
+    return 'UNION ALL'.join(selectors)
+
+
+def shop_poi_group_query(tiers, query_type, with_metadata=True, single=False, variants=()):
+    '''
+    Generate the SQL of a group of priority tiers ordered by cascade order and distance
+    :param tiers: List of ShopPOITier
+    :param query_type: OSM tag filter of POI type, see poitypes.getPOITypes()
+    :param with_metadata: Query OpenStreetMap metadata information
+    :param single: Every tier returns only its nearest object and the query returns the first one in cascade order,
+      this is for running the whole cascade in one statement: the UNION ALL branches are executed in order and the
+      outer LIMIT stops at the first tier with a hit, so lower priority tiers are not evaluated
+    :param variants: Name filter variants used instead of regular expression, see search_name_params()
+    :return: SQL text
+    '''
+    if not single:
+        return '{} ORDER BY {}, distance ASC'.format(
+            'UNION ALL'.join(shop_poi_tier_query(t, query_type, with_metadata, variants=variants) for t in tiers),
+            TIER_ORDER_SQL)
+    selectors = []
+    # No outer sort: it would need every branch, the branches are in cascade order instead
+    for tier in sorted(tiers, key=lambda t: CASCADE_TIER_ORDER.index(t.priority)):
+        selectors.append('''
+        (SELECT * FROM ({tier_query}) AS tier_{priority} ORDER BY distance ASC LIMIT 1)
+        '''.format(tier_query=shop_poi_tier_query(tier, query_type, with_metadata, variants=variants),
+                   priority=tier.priority))
+    return 'SELECT * FROM ({}) AS tiers LIMIT 1'.format('UNION ALL'.join(selectors))
+
+
+def normalize_name(value):
+    '''
+    Lower case and unaccented text, like LOWER(opm_unaccent()) of the trigram indexes
+    '''
+    return ''.join(c for c in unicodedata.normalize('NFKD', value) if not unicodedata.combining(c)).lower()
+
+
+def rewrite_search_name(pattern):
+    '''
+    Rewrite a search name regular expression (like "(spar|interspar)") to LIKE patterns of normalised names that can
+    use the trigram indexes. Only alternation of literals (and "." as any character) can be rewritten.
+    :param pattern: poi_search_name or poi_search_avoid_name value
+    :return: List of LIKE patterns or None when the pattern can not be rewritten
+    '''
+    pattern = normalize_name(pattern)
+    if pattern.startswith('(') and pattern.endswith(')'):
+        pattern = pattern[1:-1]
+    patterns = []
+    for alternative in pattern.split('|'):
+        if re.search(r'[\[\](){}*+?^$\\]', alternative):
+            return None
+        patterns.append('%{}%'.format(alternative.replace('%', '\\%').replace('_', '\\_').replace('.', '_')))
+    return patterns
+
+
+def shop_poi_params(name='', avoid_name='', street_name='', housenumber='', conscriptionnumber='', city='',
+                    distance_perfect=None, distance_safe=None, distance_unsafe=None):
+    '''
+    Search fields and query parameters of the cascade of one POI, see POIBase.query_osm_shop_poi_gpd()
+    :return: Tuple of the set of filter names that have value, parameter dictionary and name filter variants
+    '''
+    distance_perfect, distance_safe, distance_unsafe = search_distances(name, distance_perfect, distance_safe,
+                                                                        distance_unsafe)
+    query_params = {'distance_perfect': distance_perfect, 'distance_safe': distance_safe,
+                    'distance_unsafe': distance_unsafe}
+    filters = {'name': name, 'avoid_name': avoid_name, 'street_name': street_name, 'housenumber': housenumber,
+               'conscriptionnumber': conscriptionnumber, 'city': city}
+    present = set()
+    for key, value in filters.items():
+        if value is not None and value != '':
+            present.add(key)
+            if key not in ('name', 'avoid_name'):
+                query_params.update({key: value})
+    name_params, variants = search_name_params(name, avoid_name)
+    query_params.update(name_params)
+    return present, query_params, variants
+
+
+def shop_poi_batch_params(pois, name='', avoid_name='', distance_perfect=None, distance_safe=None,
+                          distance_unsafe=None):
+    '''
+    Priority tiers and query parameters of the batch cascade of POIs of the same POI common, see
+    POIBase.query_osm_shop_poi_gpd_batch(). The address parts are different POI by POI, so every address tier is
+    guarded in the query itself: a tier is skipped for a POI without its filter fields or with its without fields.
+    :return: Tuple of the list of ShopPOITier, parameter dictionary (address parts and coordinates are arrays) and
+      name filter variants
+    '''
+    distance_perfect, distance_safe, distance_unsafe = search_distances(name, distance_perfect, distance_safe,
+                                                                        distance_unsafe)
+    query_params = {'distance_perfect': distance_perfect, 'distance_safe': distance_safe,
+                    'distance_unsafe': distance_unsafe}
+    name_params, variants = search_name_params(name, avoid_name)
+    query_params.update(name_params)
+    present = {k for k, v in (('name', name), ('avoid_name', avoid_name)) if v is not None and v != ''}
+    present.update(BATCH_ADDRESS_COLUMNS.keys())
+    for key, column in BATCH_ADDRESS_COLUMNS.items():
+        query_params.update({key: [clean_value(v) for v in pois[column]]})
+    query_params.update({'pa_id': [int(v) for v in pois['pa_id']],
+                         'lon': [float(v) for v in pois['poi_lon']],
+                         'lat': [float(v) for v in pois['poi_lat']]})
+    return shop_poi_tiers(present, guarded=True), query_params, variants
+
+
+def search_name_params(name, avoid_name):
+    '''
+    Query parameters of name and avoid name filters. In trigram name matching mode the patterns that can be rewritten
+    are LIKE patterns, the others remain regular expressions. In candidate name matching mode the names are not
+    evaluated, OSM objects are looked up in the poi_osm_candidate table by the search names of their POI common.
+    :return: Tuple of parameter dictionary and set of name filter variants in use (like name_like)
+    '''
+    query_params = {}
+    variants = set()
+    mode = config.get_matcher_name_matching()
+    for key, value in (('name', name), ('avoid_name', avoid_name)):
+        if value is None or value == '':
+            continue
+        patterns = rewrite_search_name(value) if mode == 'trigram' else None
+        if mode == 'candidate':
+            query_params.update({'{}_candidate'.format(key): value})
+            variants.add('{}_candidate'.format(key))
+        elif patterns is not None:
+            query_params.update({'{}_like'.format(key): patterns})
+            variants.add('{}_like'.format(key))
+        else:
+            query_params.update({key: '.*{}.*'.format(value)})
+    return query_params, variants
+
+
+def positional_query(query_text):
+    '''
+    Convert named (:name) parameters of a query to PostgreSQL positional ($1) parameters
+    :param query_text: SQL text with named parameters
+    :return: Tuple of SQL text and list of parameter names in order of their position
+    '''
+    params = []
+
+    def position(match):
+        if match.group(1) not in params:
+            params.append(match.group(1))
+        return '${}'.format(params.index(match.group(1)) + 1)
+
+    return re.sub(r'(?<![:\w]):(\w+)', position, query_text), params
+
+
+def search_distances(name, distance_perfect=None, distance_safe=None, distance_unsafe=None):
+    '''
+    Fill POI common search distances with configured defaults when they are not specified
+    :return: Tuple of perfect, safe and unsafe search distance
+    '''
+    # If we have PO common defined unsafe search radius distance, then use it (or use defaults specified above)
+    if distance_unsafe is None or distance_unsafe == '' or math.isnan(distance_unsafe):
+        distance_unsafe = config.get_geo_default_poi_unsafe_distance()
+    if distance_safe is None or distance_safe == '' or math.isnan(distance_safe):
+        distance_safe = config.get_geo_default_poi_distance()
+    if name is not None and name != '':
+        # If we have PO common defined safe search radius distance, then use it (or use defaults specified above)
+        if distance_perfect is None or distance_perfect != '' or math.isnan(distance_perfect):
+            distance_perfect = config.get_geo_default_poi_perfect_distance()
+    elif distance_perfect is None or distance_perfect == '' or math.isnan(distance_perfect):
+        distance_perfect = config.get_geo_default_poi_perfect_distance()
+    return distance_perfect, distance_safe, distance_unsafe
+
+
+def is_query_canceled(error):
+    '''
+    Check whether a database error is a cancelled query, like the ones exceeding statement_timeout
+    '''
+    return isinstance(getattr(error, 'orig', error), psycopg2.extensions.QueryCanceledError)
+
+
+def clean_value(value):
+    '''
+    Convert missing values (None, NaN) of a dataframe cell to None
+    '''
+    if value is None or (isinstance(value, float) and isnan(value)):
+        return None
+    return value
+
+
 class POIBase:
     """Represents the full database.
 
@@ -25,7 +430,7 @@ class POIBase:
 
     """
 
-    def __init__(self, db_connection, retry_counter=100, retry_sleep=30):
+    def __init__(self, db_connection, retry_counter=100, retry_sleep=30, pool_size=None, create_tables=True):
         reco = 0  # Actual retry counter
         self.db_retry_counter = retry_counter
         self.db_retry_sleep = retry_sleep
@@ -35,8 +440,12 @@ class POIBase:
             self.db_connection = 'sqlite:///{}'.format(self.db_connection)
         if self.db_connection.startswith('sqlite'):
             self.db_filename = self.db_connection
+        # Bounded connection pool: connections of all processes must fit in the connection limit of the server
+        pool_args = {'pool_size': pool_size, 'max_overflow': 0} \
+            if pool_size is not None and self.db_filename is None else {}
         try:
-            self.engine = sqlalchemy.create_engine(self.db_connection, client_encoding='utf8', echo=False)
+            self.engine = sqlalchemy.create_engine(self.db_connection, client_encoding='utf8', echo=False,
+                                                   **pool_args)
         except psycopg2.OperationalError as e:
             logging.error('Database error: %s', e)
             if self.retry_counter >= reco:
@@ -45,10 +454,15 @@ class POIBase:
                 logging.error('Cannot connect to the database. It will retry within %s seconds. [%s/%s]',
                               self.db_retry_sleep, reco, self.db_retry_counter)
                 time.sleep(self.db_retry_sleep)
-                self.engine = sqlalchemy.create_engine(self.db_connection, echo=False)
+                self.engine = sqlalchemy.create_engine(self.db_connection, echo=False, **pool_args)
                 self.db_retry_counter += 1
         self.Session = sqlalchemy.orm.sessionmaker(bind=self.engine)
-        Base.metadata.create_all(self.engine)
+        if create_tables:
+            Base.metadata.create_all(self.engine)
+        self.query_templates = {}
+        self.query_template_stats = {'shapes': 0, 'prepares': 0, 'executions': 0, 'reuses': 0, 'timeouts': 0}
+        # Query templates run by the last query_osm_shop_poi_gpd() call, timed out ones are marked
+        self.last_query_shape = []
 
     @property
     def pool(self):
@@ -120,6 +534,59 @@ class POIBase:
         else:
             return None
 
+    def query_osm_cache_pd(self, object_type, osm_ids):
+        '''
+        Load cached OSM objects of one type
+        :param object_type: OSM_object_type of the objects
+        :param osm_ids: List of OSM API ids (relations are positive)
+        :return: DataFrame of poi_osm_cache rows, the first cached row of every osm_id
+        '''
+        query = sqlalchemy.text('SELECT * FROM poi_osm_cache WHERE osm_object_type = :object_type AND '
+                                'osm_id = ANY(CAST(:osm_ids AS bigint[])) ORDER BY poc_id')
+        data = pd.read_sql(query, self.engine, params={'object_type': object_type.name,
+                                                       'osm_ids': [int(i) for i in osm_ids]})
+        return data.drop_duplicates(subset=['osm_id'])
+
+    def query_osm_cache_all_pd(self):
+        '''
+        Load all cached OSM objects
+        :return: DataFrame of poi_osm_cache rows, the first cached row of every object
+        '''
+        query = sqlalchemy.text('SELECT * FROM poi_osm_cache ORDER BY poc_id')
+        data = pd.read_sql(query, self.engine)
+        return data.drop_duplicates(subset=['osm_object_type', 'osm_id'])
+
+    def add_osm_cache(self, rows):
+        '''
+        Store OSM objects downloaded from the OSM API in one transaction, previously cached rows of the same objects
+        are replaced
+        :param rows: List of dictionaries with POI_OSM_cache columns
+        '''
+        if not rows:
+            return
+        table = POI_OSM_cache.__table__
+        with self.engine.begin() as conn:
+            for object_type in {r['osm_object_type'] for r in rows}:
+                conn.execute(table.delete().where(sqlalchemy.and_(
+                    table.c.osm_object_type == object_type,
+                    table.c.osm_id.in_([r['osm_id'] for r in rows if r['osm_object_type'] == object_type]))))
+            conn.execute(table.insert(), rows)
+
+    def query_osm_versions_pd(self, object_type, osm_ids):
+        '''
+        Load the versions of OSM objects in the planet tables (imported with --extra-attributes)
+        :param object_type: OSM_object_type of the objects
+        :param osm_ids: List of OSM API ids (relations are positive)
+        :return: DataFrame of osm_id (API id) and osm_version, objects missing from the planet tables (like untagged
+          nodes) are missing
+        '''
+        sources = PLANET_OBJECT_SOURCES[object_type.name]
+        query = sqlalchemy.text('SELECT {0} * osm_id AS osm_id, max(osm_version) AS osm_version FROM ({1}) AS o '
+                                'GROUP BY osm_id'.format(sources[0][1], ' UNION ALL '.join(
+                                    'SELECT osm_id, osm_version FROM {} WHERE osm_id = ANY(CAST(:osm_ids AS bigint[]))'
+                                    .format(t) for t, sign in sources)))
+        return pd.read_sql(query, self.engine, params={'osm_ids': [sources[0][1] * int(i) for i in osm_ids]})
+
     def query_ways_nodes(self, way_id):
         if way_id > 0:
             query = sqlalchemy.text('select nodes from planet_osm_ways where id = :way_id limit 1')
@@ -133,10 +600,38 @@ class POIBase:
         data = pd.read_sql(query, self.engine, params={'relation_id': int(abs(relation_id))})
         return data.values.tolist()[0][0]
 
+    def query_ways_nodes_batch(self, way_ids):
+        '''
+        Load node lists of OSM ways with one query
+        :param way_ids: List of way osm_id
+        :return: Dictionary of node lists keyed by way osm_id
+        '''
+        way_ids = sorted({int(i) for i in way_ids if i is not None and i > 0})
+        if not way_ids:
+            return {}
+        query = sqlalchemy.text('SELECT id, nodes FROM planet_osm_ways WHERE id = ANY(CAST(:way_ids AS bigint[]))')
+        data = pd.read_sql(query, self.engine, params={'way_ids': way_ids})
+        return dict(zip(data['id'], data['nodes']))
+
+    def query_relation_nodes_batch(self, relation_ids):
+        '''
+        Load member lists of OSM relations with one query
+        :param relation_ids: List of relation osm_id (negative like in planet_osm_polygon)
+        :return: Dictionary of member lists keyed by relation osm_id as it was given
+        '''
+        relation_ids = {int(i) for i in relation_ids if i is not None}
+        if not relation_ids:
+            return {}
+        query = sqlalchemy.text(
+            'SELECT id, members FROM planet_osm_rels WHERE id = ANY(CAST(:relation_ids AS bigint[]))')
+        data = pd.read_sql(query, self.engine, params={'relation_ids': sorted({abs(i) for i in relation_ids})})
+        members = dict(zip(data['id'], data['members']))
+        return {i: members[abs(i)] for i in relation_ids if abs(i) in members}
+
     def query_osm_shop_poi_gpd(self, lon: float, lat: float, ptype: str = 'shop', name: str = '', avoid_name: str = '', street_name: str = '',
                                housenumber: str = '', conscriptionnumber: str = '', city: str = '',
                                distance_perfect: int = None, distance_safe: int = None, distance_unsafe: int = None,
-                               with_metadata: bool = True):
+                               with_metadata: bool = True, tier_groups=None):
         '''
         Search for POI in OpenStreetMap database based on POI type and geom within preconfigured distance
         :param lon:
@@ -152,372 +647,487 @@ class POIBase:
         :param distance_safe:
         :param distance_unsafe:
         :parm with_metadata:
+        :param tier_groups: Tier groups in cascade order (default CASCADE_TIER_GROUPS), see libs/tier_planner.py
         :return:
         '''
         buffer = 10
-        query_arr = []
-        query_params = {}
-        query_type, distance = poitypes.getPOITypes(ptype)
-        # If we have PO common defined unsafe search radius distance, then use it (or use defaults specified above)
-        if distance_unsafe is None or distance_unsafe == '' or math.isnan(distance_unsafe):
-            distance_unsafe = config.get_geo_default_poi_unsafe_distance()
-        query_params.update({'distance_unsafe': distance_unsafe})
-        if distance_safe is None or distance_safe == '' or math.isnan(distance_safe):
-            distance_safe = config.get_geo_default_poi_distance()
-        query_params.update({'distance_safe': distance_safe})
+        present, query_params, variants = shop_poi_params(name, avoid_name, street_name, housenumber,
+                                                          conscriptionnumber, city, distance_perfect, distance_safe,
+                                                          distance_unsafe)
+        distance_perfect, distance_safe, distance_unsafe = (query_params['distance_perfect'],
+                                                            query_params['distance_safe'],
+                                                            query_params['distance_unsafe'])
         if lon is not None and lon != '':
             query_params.update({'lon': lon})
         if lat is not None and lat != '':
             query_params.update({'lat': lat})
         query_params.update({'buffer': buffer})
-        # Do not match with other specified names and brands
-        if name is not None and name != '':
-            query_name = ' AND (LOWER(TEXT(name)) ~* LOWER(TEXT(:name)) OR LOWER(TEXT(brand)) ~* LOWER(TEXT(:name)))'
-            query_params.update({'name': '.*{}.*'.format(name)})
-            # If we have PO common defined safe search radius distance, then use it (or use defaults specified above)
-            if distance_perfect is None or distance_perfect != '' or math.isnan(distance_perfect):
-                distance_perfect = config.get_geo_default_poi_perfect_distance()
-            query_params.update({'distance_perfect': distance_perfect})
-        else:
-            query_name = '' 
-        # Do not match with other specified names and brands
-        if avoid_name is not None and avoid_name != '':
-            query_avoid_name = ' AND (LOWER(TEXT(name)) !~* LOWER(TEXT(:avoid_name)) AND LOWER(TEXT(brand)) !~* LOWER(TEXT(:avoid_name)))'
-            query_params.update({'avoid_name': '.*{}.*'.format(avoid_name)})
-        else:
-            query_avoid_name = '' 
-        if with_metadata is True:
-            metadata_fields = ' osm_user, osm_uid, osm_version, osm_changeset, osm_timestamp, '
-        else:
-            metadata_fields = ''
-        if street_name is not None and street_name != '':
-            street_query = ' AND LOWER(TEXT("addr:street")) = LOWER(TEXT(:street_name))'
-            query_params.update({'street_name': street_name})
-        else:
-            street_query = ''
-        if housenumber is not None and housenumber != '':
-            housenumber_query = ' AND LOWER(TEXT("addr:housenumber")) = LOWER(TEXT(:housenumber))'
-            query_params.update({'housenumber': housenumber})
-        else:
-            housenumber_query = ''
-        if conscriptionnumber is not None and conscriptionnumber != '':
-            conscriptionnumber_query = ' AND LOWER(TEXT("addr:conscriptionnumber")) = LOWER(TEXT(:conscriptionnumber))'
-            query_params.update({'conscriptionnaumber': conscriptionnaumber})
-        else:
-            conscriptionnumber_query = ''
-        if city is not None and city != '':
-            city_query = ' AND LOWER(TEXT("addr:city")) = LOWER(TEXT(:city))'
-            query_params.update({'city': city})
-        else:
-            city_query = ''
         logging.debug('%s %s: %s, %s (NOT %s), %s %s %s (%s) [%s, %s, %s]', lon, lat, ptype, name, avoid_name, city,
                       street_name, housenumber, conscriptionnumber, distance_perfect, distance_safe, distance_unsafe)
-        # Looking for way (building)
-        if query_name is not None and query_name != '' and city_query is not None and city_query != '' and \
-                conscriptionnumber_query is not None and conscriptionnumber_query != '':
-            query_text = '''
-            --- WITH NAME, WITH CONSCRIPTINNUMBER, WITH CITY
-            --- The way selector with conscriptionnumber and city
-            SELECT name, osm_id, {metadata_fields} 965 AS priority, 'way' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   '0' as distance, way, ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon
-            WHERE ({query_type}) AND osm_id > 0 {query_name} {conscriptionnumber_query} {city_query}
-            UNION ALL
-            --- The node selector with conscriptionnumber and city
-            SELECT name, osm_id, {metadata_fields} 965 AS priority, 'node' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   '0' as distance, way, ST_AsEWKT(way) as way_ewkt,
-                   ST_X(planet_osm_point.way) as lon,
-                   ST_Y(planet_osm_point.way) as lat
-            FROM planet_osm_point
-            WHERE ({query_type}) AND osm_id > 0 {query_name} {conscriptionnumber_query} {city_query}
-            UNION ALL
-            --- The relation selector with conscriptionnumber and city
-            SELECT name, osm_id, {metadata_fields} 965 AS priority, 'relation' AS node, shop, amenity,
-                   "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
-                   "addr:conscriptionnumber", '0' as distance, way, ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon
-            WHERE ({query_type}) AND osm_id < 0 {query_name} {conscriptionnumber_query} {city_query}
-            '''
-            query = sqlalchemy.text(query_text.format(query_type=query_type, query_name=query_name,
-                                                      metadata_fields=metadata_fields,
-                                                      conscriptionnumber_query=conscriptionnumber_query,
-                                                      city_query=city_query))
-            logging.debug(str(query))
-            data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way', params=query_params)
-            '''perf_query = sqlalchemy.text('EXPLAIN ' + query_text.format(query_type=query_type, query_name=query_name,
-                                                      metadata_fields=metadata_fields,
-                                                      conscriptionnumber_query=conscriptionnumber_query,
-                                                      city_query=city_query))
-            perf = gpd.GeoDataFrame.from_postgis(perf_query, self.engine, geom_col='way', params=query_params)
-            logging.debug(perf)
-            '''
-            if not data.empty:
-                logging.debug(data.to_string())
-                return data.iloc[[0]]
-        if query_name is not None and query_name != '' and city_query is not None and city_query != '' and \
-                street_query is not None and street_query != '' and \
-                housenumber_query is not None and housenumber_query != '':
-            query_text = '''
-            --- WITH NAME, WITH CITY, WITH STREETNAME, WITH HOUSENUMBER
-            --- The way selector with city, street name and housenumber
-            SELECT name, osm_id, {metadata_fields} 940 AS priority, 'way' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   '0' as distance, way, ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon
-            WHERE ({query_type}) AND osm_id > 0 {query_name} {city_query} {street_query} {housenumber_query}
-            UNION ALL
-            --- The node selector with street name and housenumber
-            SELECT name, osm_id, {metadata_fields} 940 AS priority, 'node' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   '0' as distance, way, ST_AsEWKT(way) as way_ewkt,
-                   ST_X(planet_osm_point.way) as lon,
-                   ST_Y(planet_osm_point.way) as lat
-            FROM planet_osm_point
-            WHERE ({query_type}) AND osm_id > 0 {query_name} {city_query} {street_query} {housenumber_query}
-            UNION ALL
-            --- The relation selector with street name and housenumber
-            SELECT name, osm_id, {metadata_fields} 940 AS priority, 'relation' AS node, shop, amenity,
-                   "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
-                   "addr:conscriptionnumber", '0' as distance, way, ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon
-            WHERE ({query_type}) AND osm_id < 0 {query_name} {city_query} {street_query} {housenumber_query}
-            '''
-            query = sqlalchemy.text(query_text.format(query_type=query_type, query_name=query_name,
-                                                      metadata_fields=metadata_fields,
-                                                      street_query=street_query,
-                                                      city_query=city_query,
-                                                      housenumber_query=housenumber_query))
-            logging.debug(str(query))
-            data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way', params=query_params)
-            '''
-            perf_query = sqlalchemy.text('EXPLAIN ' + query_text.format(query_type=query_type, query_name=query_name,
-                                                      metadata_fields=metadata_fields,
-                                                      street_query=street_query,
-                                                      city_query=city_query,
-                                                      housenumber_query=housenumber_query))
-            perf = gpd.GeoDataFrame.from_postgis(perf_query, self.engine, geom_col='way', params=query_params)
-            logging.debug(perf)
-            '''
-            if not data.empty:
+        # In single statement mode all tiers are in one group, so the cascade costs one round trip
+        if config.get_matcher_single_statement():
+            groups = (CASCADE_TIER_ORDER,)
+        else:
+            groups = tier_groups if tier_groups is not None else CASCADE_TIER_GROUPS
+        self.last_query_shape = []
+        for group in groups:
+            template = self.shop_poi_query_template(ptype, present, with_metadata, group, variants)
+            if template is None:
+                continue
+            data = self.query_tier_group_gpd(template, query_params, ptype, present, with_metadata, variants)
+            if data is not None and not data.empty:
                 logging.debug(data.to_string())
                 return data.iloc[[0]]
-        if street_query is not None and street_query != '':
-            # Using street name for query
-            if housenumber_query is not None and housenumber_query != '':
-                query_arr.append('''
-                --- WITH NAME, WITH STREETNAME, WITH HOUSENUMBER
-                --- The way selector with street name and with housenumber
-                SELECT name, osm_id, {metadata_fields} 950 AS priority, 'way' AS node, shop, amenity, "addr:housename",
-                       "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                       ST_DistanceSphere(way, point.geom) as distance, way,
-                       ST_AsEWKT(way) as way_ewkt,
-                       ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                       ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-                FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-                WHERE ({query_type}) AND osm_id > 0 {query_name} {street_query} {housenumber_query}
-                    AND ST_DistanceSphere(way, point.geom) < :distance_perfect
-                UNION ALL
-                --- The node selector with street name and with housenumber
-                SELECT name, osm_id, {metadata_fields} 950 AS priority, 'node' AS node, shop, amenity, "addr:housename",
-                       "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                       ST_DistanceSphere(way, point.geom) as distance, way,
-                       ST_AsEWKT(way) as way_ewkt,
-                       ST_X(planet_osm_point.way) as lon,
-                       ST_Y(planet_osm_point.way) as lat
-                FROM planet_osm_point, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-                WHERE ({query_type}) AND osm_id > 0 {query_name} {street_query} {housenumber_query}
-                    AND ST_DistanceSphere(way, point.geom) < :distance_perfect
-                UNION ALL
-                --- The relation selector with street name and with housenumber
-                SELECT name, osm_id, {metadata_fields} 950 AS priority, 'relation' AS node, shop, amenity,
-                       "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
-                       "addr:conscriptionnumber", ST_DistanceSphere(way, point.geom) as distance, way,
-                       ST_AsEWKT(way) as way_ewkt,
-                       ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                       ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-                FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-                WHERE ({query_type}) AND osm_id < 0 {query_name} {street_query} {housenumber_query}
-                    AND ST_DistanceSphere(way, point.geom) < :distance_perfect
-                ''')
-            query_arr.append('''
-            --- WITH NAME, WITH STREETNAME, NO HOUSENUMBER
-            --- The way selector with street name and without housenumber
-            SELECT name, osm_id, {metadata_fields} 970 AS priority, 'way' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   ST_DistanceSphere(way, point.geom) as distance, way,
-                   ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-            WHERE (({query_type}) AND osm_id > 0 {query_name} {street_query})
-                AND ST_DistanceSphere(way, point.geom) < :distance_safe
-            UNION ALL
-            --- The node selector with street name and without housenumber
-            SELECT name, osm_id, {metadata_fields} 970 AS priority, 'node' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   ST_DistanceSphere(way, point.geom) as distance, way,
-                   ST_AsEWKT(way) as way_ewkt,
-                   ST_X(planet_osm_point.way) as lon,
-                   ST_Y(planet_osm_point.way) as lat
-            FROM planet_osm_point, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-            WHERE (({query_type}) AND osm_id > 0 {query_name} {street_query})
-                AND ST_DistanceSphere(way, point.geom) < :distance_safe
-            UNION ALL
-            --- The relation selector with street name and without housenumber
-            SELECT name, osm_id, {metadata_fields} 970 AS priority, 'relation' AS node, shop, amenity,
-                   "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
-                   "addr:conscriptionnumber", ST_DistanceSphere(way, point.geom) as distance, way,
-                   ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-            WHERE (({query_type}) AND osm_id < 0 {query_name} {street_query})
-                AND ST_DistanceSphere(way, point.geom) < :distance_safe
-            ''')
-        else:
-            if housenumber_query is not None and housenumber_query != '':
-                query_arr.append('''
-                --- WITH NAME, NO STREETNAME, WITH HOUSENUMBER
-                --- The way selector without street name and with housenumber
-                SELECT name, osm_id, {metadata_fields} 970 AS priority, 'way' AS node, shop, amenity, "addr:housename",
-                       "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                       ST_DistanceSphere(way, point.geom) as distance, way,
-                       ST_AsEWKT(way) as way_ewkt,
-                       ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                       ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-                FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-                WHERE (({query_type}) AND osm_id > 0 {query_name} {housenumber_query})
-                    AND ST_DistanceSphere(way, point.geom) < :distance_safe
-                UNION ALL
-                --- The node selector without street name and with housenumber
-                SELECT name, osm_id, {metadata_fields} 970 AS priority, 'node' AS node, shop, amenity, "addr:housename",
-                       "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                       ST_DistanceSphere(way, point.geom) as distance, way,
-                       ST_AsEWKT(way) as way_ewkt,
-                       ST_X(planet_osm_point.way) as lon,
-                       ST_Y(planet_osm_point.way) as lat
-                FROM planet_osm_point, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-                WHERE (({query_type}) AND osm_id > 0 {query_name} {housenumber_query})
-                    AND ST_DistanceSphere(way, point.geom) < :distance_safe
-                UNION ALL
-                --- The relation selector without street name and with housenumber
-                SELECT name, osm_id, {metadata_fields} 970 AS priority, 'relation' AS node, shop, amenity,
-                       "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
-                       "addr:conscriptionnumber",
-                       ST_DistanceSphere(way, point.geom) as distance, way,
-                       ST_AsEWKT(way) as way_ewkt,
-                       ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                       ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-                FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-                WHERE ({query_type}) AND osm_id < 0 {query_name} {housenumber_query}
-                    AND ST_DistanceSphere(way, point.geom) < :distance_safe
-                ''')
-        # Trying without street name and house number in case when the street name and/or the house not matching at all
-        query_arr.append('''
-        --- WITH NAME, NO STREETNAME, NO HOUSENUMBER
-        --- The way selector without street name and without housenumber
-        SELECT name, osm_id, {metadata_fields} 980 AS priority, 'way' AS node, shop, amenity, "addr:housename",
-               "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-               ST_DistanceSphere(way, point.geom) as distance, way,
-               ST_AsEWKT(way) as way_ewkt,
-               ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-               ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-        FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-        WHERE (({query_type}) AND osm_id > 0 {query_name} )
-            AND ST_DistanceSphere(way, point.geom) < :distance_safe
-        UNION ALL
-        --- The node selector without street name and without housenumber
-        SELECT name, osm_id, {metadata_fields} 980 AS priority, 'node' AS node, shop, amenity, "addr:housename",
-               "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-               ST_DistanceSphere(way, point.geom) as distance, way,
-               ST_AsEWKT(way) as way_ewkt,
-               ST_X(planet_osm_point.way) as lon,
-               ST_Y(planet_osm_point.way) as lat
-        FROM planet_osm_point, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-        WHERE (({query_type}) AND osm_id > 0 {query_name} )
-            AND ST_DistanceSphere(way, point.geom) < :distance_safe
-        UNION ALL
-        --- The relation selector without street name and without housenumber
-        SELECT name, osm_id, {metadata_fields} 980 AS priority, 'relation' AS node, shop, amenity,
-               "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
-               "addr:conscriptionnumber",
-               ST_DistanceSphere(way, point.geom) as distance, way,
-               ST_AsEWKT(way) as way_ewkt,
-               ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-               ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-        FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-        WHERE (({query_type}) AND osm_id < 0 {query_name} )
-            AND ST_DistanceSphere(way, point.geom) < :distance_safe
-        ''')
-        query_arr.append('''
-            --- NO NAME, NO STREETNAME, NO HOUSENUMBER
-            --- The way selector without name and street name
-            SELECT name, osm_id, {metadata_fields} 990 AS priority, 'way' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   ST_DistanceSphere(way, point.geom) as distance, way,
-                   ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-            WHERE (({query_type}) AND osm_id > 0 {query_avoid_name} )
-                AND ST_DistanceSphere(way, point.geom) < :distance_unsafe
-            UNION ALL
-            --- The node selector without name and street name
-            SELECT name, osm_id, {metadata_fields} 990 AS priority, 'node' AS node, shop, amenity, "addr:housename",
-                   "addr:housenumber", "addr:postcode", "addr:city", "addr:street", "addr:conscriptionnumber",
-                   ST_DistanceSphere(way, point.geom) as distance, way,
-                   ST_AsEWKT(way) as way_ewkt,
-                   ST_X(planet_osm_point.way) as lon,
-                   ST_Y(planet_osm_point.way) as lat
-            FROM planet_osm_point, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-            WHERE (({query_type}) AND osm_id > 0 {query_avoid_name} )
-                AND ST_DistanceSphere(way, point.geom) < :distance_unsafe
-            UNION ALL
-            --- The relation selector without name street name
-            SELECT name, osm_id, {metadata_fields} 990 AS priority, 'relation' AS node, shop, amenity,
-                   "addr:housename", "addr:housenumber", "addr:postcode", "addr:city", "addr:street",
-                   "addr:conscriptionnumber",
-                   ST_DistanceSphere(way, point.geom) as distance, way,
-                   ST_AsEWKT(way) as way_ewkt,
-                   ST_X(ST_PointOnSurface(planet_osm_polygon.way)) as lon,
-                   ST_Y(ST_PointOnSurface(planet_osm_polygon.way)) as lat
-            FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-            WHERE (({query_type}) AND osm_id < 0 {query_avoid_name} )
-                AND ST_DistanceSphere(way, point.geom) < :distance_unsafe
-        ''')
-        query_text = 'UNION ALL'.join(query_arr) + 'ORDER BY priority ASC, distance ASC;'
-        query = sqlalchemy.text(query_text.format(query_type=query_type, query_name=query_name,
-                                                  query_avoid_name=query_avoid_name,
-                                                  metadata_fields=metadata_fields,
-                                                  street_query=street_query,
-                                                  city_query=city_query,
-                                                  housenumber_query=housenumber_query))
+        return None
+
+    def query_tier_group_gpd(self, template, query_params, ptype, present, with_metadata, variants=()):
+        '''
+        Run the query of a tier group within its statement timeout budget (matcher.statement.timeout for every tier
+        of the group). When the group times out its tiers are queried one by one, so the cheaper tiers still
+        give their candidates. A single tier that times out is skipped.
+        :param template: QueryTemplate of the tier group, see shop_poi_query_template()
+        :param query_params: Dictionary of query parameters
+        :param ptype: POI type, see poitypes.getPOITypes()
+        :param present: Set of filter names that have value
+        :param with_metadata: Query OpenStreetMap metadata information
+        :param variants: Name filter variants used instead of regular expression
+        :return: GeoDataFrame of candidates in cascade order or None when every tier has timed out
+        '''
+        timeout = config.get_matcher_statement_timeout() * len(template.tiers)
+        try:
+            data = self.query_template_gpd(template, query_params, timeout)
+            self.last_query_shape.append('{}{}'.format(template.name, template.tiers))
+            return data
+        except sqlalchemy.exc.OperationalError as e:
+            if not is_query_canceled(e):
+                raise
+            self.query_template_stats['timeouts'] += 1
+            self.last_query_shape.append('{}{} timeout'.format(template.name, template.tiers))
+            logging.warning('Query %s of priority tiers %s has exceeded %s ms at %s %s.', template.name,
+                            template.tiers, timeout, query_params.get('lon'), query_params.get('lat'))
+        if len(template.tiers) == 1:
+            return None
+        for tier in template.tiers:
+            data = self.query_tier_group_gpd(self.shop_poi_query_template(ptype, present, with_metadata, (tier,),
+                                                                          variants),
+                                             query_params, ptype, present, with_metadata, variants)
+            if data is not None and not data.empty:
+                return data
+        return None
+
+    def shop_poi_query_template(self, ptype, present, with_metadata, group, variants=()):
+        '''
+        Get the query of a tier group of query_osm_shop_poi_gpd. The SQL is generated only once for every
+        combination of POI type, present filters and metadata.
+        :param ptype: POI type, see poitypes.getPOITypes()
+        :param present: Set of filter names that have value
+        :param with_metadata: Query OpenStreetMap metadata information
+        :param group: Priorities of the tier group, see CASCADE_TIER_GROUPS
+        :param variants: Name filter variants used instead of regular expression
+        :return: QueryTemplate or None when the group has no usable tier
+        '''
+        key = (ptype, tuple(sorted(present)), with_metadata, group, tuple(sorted(variants)))
+        if key not in self.query_templates:
+            query_type, distance = poitypes.getPOITypes(ptype)
+            group_tiers = [t for t in shop_poi_tiers(present) if t.priority in group]
+            if group_tiers:
+                query_text = shop_poi_group_query(group_tiers, query_type, with_metadata,
+                                                  single=group == CASCADE_TIER_ORDER, variants=variants)
+                positional_text, params = positional_query(query_text)
+                self.query_templates[key] = QueryTemplate('opm_shop_poi_{}'.format(len(self.query_templates)),
+                                                          query_text, positional_text, params,
+                                                          tuple(t.priority for t in group_tiers))
+                self.query_template_stats['shapes'] += 1
+            else:
+                self.query_templates[key] = None
+        return self.query_templates[key]
+
+    def query_template_gpd(self, template, query_params, timeout=None):
+        '''
+        Run a query template. When it is enabled the query is a server side prepared statement: it is prepared
+        once on every database connection and later only executed.
+        :param template: QueryTemplate to run
+        :param query_params: Dictionary of query parameters
+        :param timeout: Statement timeout in milliseconds, the server cancels the query after it
+        :return: GeoDataFrame of query result
+        '''
+        with self.engine.connect() as conn, conn.begin():
+            if timeout:
+                # Local to the transaction, the pooled connection keeps its own setting
+                conn.execute(sqlalchemy.text("SELECT set_config('statement_timeout', :timeout, true)"),
+                             {'timeout': str(int(timeout))})
+            if not config.get_matcher_prepared_statements():
+                query = sqlalchemy.text(template.text)
+                logging.debug(str(query))
+                return gpd.GeoDataFrame.from_postgis(query, conn, geom_col='way', params=query_params)
+            params = {p: query_params.get(p) for p in template.params}
+            # Prepared statements belong to the database session, so they are registered on the DBAPI connection
+            prepared = conn.connection.info.setdefault('opm_prepared_statements', set())
+            if template.name not in prepared:
+                logging.debug('Preparing statement %s: %s', template.name, template.positional_text)
+                # The DBAPI cursor runs the text as it is: $n placeholders, no bind parameter parsing
+                cursor = conn.connection.cursor()
+                try:
+                    cursor.execute('PREPARE {} ({}) AS {}'.format(
+                        template.name, ', '.join(QUERY_PARAMETER_TYPES.get(p, 'text') for p in template.params),
+                        template.positional_text))
+                finally:
+                    cursor.close()
+                prepared.add(template.name)
+                self.query_template_stats['prepares'] += 1
+            else:
+                self.query_template_stats['reuses'] += 1
+            self.query_template_stats['executions'] += 1
+            query = sqlalchemy.text('EXECUTE {} ({})'.format(template.name,
+                                                             ', '.join(':{}'.format(p) for p in template.params)))
+            return gpd.GeoDataFrame.from_postgis(query, conn, geom_col='way', params=params)
+
+    def log_query_template_stats(self):
+        logging.info('Matcher query templates: %s shapes, %s prepares, %s executions (%s reused), %s timeouts.',
+                     self.query_template_stats['shapes'], self.query_template_stats['prepares'],
+                     self.query_template_stats['executions'], self.query_template_stats['reuses'],
+                     self.query_template_stats['timeouts'])
+
+    def query_osm_shop_poi_gpd_batch(self, pois, ptype: str = 'shop', name: str = '', avoid_name: str = '',
+                                     distance_perfect: int = None, distance_safe: int = None,
+                                     distance_unsafe: int = None, with_metadata: bool = True):
+        '''
+        Search for the best OSM POI of many POIs of the same type with one query. Every priority tier of
+        query_osm_shop_poi_gpd is resolved in a LATERAL subquery, so the result is the same as running
+        the cascade POI by POI.
+        :param pois: DataFrame with pa_id, poi_lon, poi_lat, poi_addr_street, poi_addr_housenumber,
+          poi_conscriptionnumber and poi_city columns
+        :param ptype:
+        :param name:
+        :param avoid_name:
+        :param distance_perfect:
+        :param distance_safe:
+        :param distance_unsafe:
+        :parm with_metadata:
+        :return: GeoDataFrame with one best candidate row per pa_id, POIs without match are missing
+        '''
+        query_type, distance = poitypes.getPOITypes(ptype)
+        tiers, query_params, variants = shop_poi_batch_params(pois, name, avoid_name, distance_perfect, distance_safe,
+                                                              distance_unsafe)
+        query_text = '''
+            SELECT poi.pa_id, candidate.*
+            FROM (SELECT pa_id, street_name, housenumber, conscriptionnumber, city,
+                         ST_SetSRID(ST_MakePoint(lon, lat), 4326) AS geom
+                  FROM unnest(CAST(:pa_id AS bigint[]), CAST(:lon AS float8[]), CAST(:lat AS float8[]),
+                              CAST(:street_name AS text[]), CAST(:housenumber AS text[]),
+                              CAST(:conscriptionnumber AS text[]), CAST(:city AS text[]))
+                    AS poi_input(pa_id, lon, lat, street_name, housenumber, conscriptionnumber, city)) AS poi
+            CROSS JOIN LATERAL (
+              {tiers}
+              ORDER BY {tier_order}, distance ASC LIMIT 1) AS candidate
+            '''.format(tiers='UNION ALL'.join(shop_poi_tier_query(t, query_type, with_metadata, batch=True,
+                                                                  variants=variants)
+                                               for t in tiers), tier_order=TIER_ORDER_SQL)
+        query = sqlalchemy.text(query_text)
         logging.debug(str(query))
         data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way', params=query_params)
+        logging.debug(data.to_string())
+        return data
+
+    def query_osm_shop_poi_top_gpd(self, lon: float, lat: float, ptype: str = 'shop', distance: float = None,
+                                   limit: int = 10, with_metadata: bool = True):
         '''
-        perf_query = sqlalchemy.text('EXPLAIN ' + query_text.format(query_type=query_type, query_name=query_name,
-                                                  metadata_fields=metadata_fields,
-                                                  street_query=street_query,
-                                                  city_query=city_query,
-                                                  housenumber_query=housenumber_query))
-        perf = gpd.GeoDataFrame.from_postgis(perf_query, self.engine, geom_col='way', params=query_params)
-        logging.debug(perf)
-        '''
-        if not data.empty:
-            logging.debug(data.to_string())
-            return data.iloc[[0]]
-        else:
-            return None
+        Load the nearest OSM objects of a POI type within a radius with one query, they are the candidates of the
+        scoring matcher (see libs/candidate_scoring.py)
+        :param lon: Longitude of the POI
+        :param lat: Latitude of the POI
+        :param ptype: POI type, see poitypes.getPOITypes()
+        :param distance: Search radius in meter
+        :param limit: Maximal number of candidates
+        :parm with_metadata: Query OpenStreetMap metadata information
+        :return: GeoDataFrame of OSM objects ordered by distance
+        '''
+        query_type, default_distance = poitypes.getPOITypes(ptype)
+        point = 'ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)'
+        query = sqlalchemy.text('''
+            SELECT candidates.*, ST_DistanceSphere(candidates.way, {point}) AS distance
+            FROM ({candidates}) AS candidates
+            ORDER BY distance ASC LIMIT :limit'''.format(
+            point=point, candidates=shop_poi_candidates_query(
+                query_type, with_metadata, 'AND {}'.format(distance_within_sql('way', point, ':distance')))))
+        return gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way',
+                                             params={'lon': float(lon), 'lat': float(lat),
+                                                     'distance': float(distance if distance is not None
+                                                                       else default_distance),
+                                                     'limit': int(limit)})
+
+    def query_osm_poi_type_gpd(self, ptype: str = 'shop', with_metadata: bool = True):
+        '''
+        Load all OSM objects (nodes, ways and relations) of a POI type, this is the source of the in-memory
+        candidate index (see libs/candidate_index.py)
+        :param ptype: POI type, see poitypes.getPOITypes()
+        :parm with_metadata: Query OpenStreetMap metadata information
+        :return: GeoDataFrame of OSM objects
+        '''
+        query_type, distance = poitypes.getPOITypes(ptype)
+        query = sqlalchemy.text(shop_poi_candidates_query(query_type, with_metadata))
+        logging.debug(str(query))
+        data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way')
+        logging.info('Loaded %s OSM objects of %s POI type.', len(data), ptype)
+        return data
+
+    def query_osm_poi_type_bbox_gpd(self, ptype: str, xmin, ymin, xmax, ymax, with_metadata: bool = True):
+        '''
+        Load OSM objects of a POI type whose bounding box intersects a bounding box, this is the source of the
+        tile cache (see libs/tile_cache.py)
+        :param ptype: POI type, see poitypes.getPOITypes()
+        :param xmin: Minimal longitude of the bounding box
+        :param ymin: Minimal latitude of the bounding box
+        :param xmax: Maximal longitude of the bounding box
+        :param ymax: Maximal latitude of the bounding box
+        :parm with_metadata: Query OpenStreetMap metadata information
+        :return: GeoDataFrame of OSM objects
+        '''
+        query_type, distance = poitypes.getPOITypes(ptype)
+        query = sqlalchemy.text(shop_poi_candidates_query(query_type, with_metadata,
+                                                          'AND way && ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, 4326)'))
+        return gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way',
+                                             params={'xmin': float(xmin), 'ymin': float(ymin), 'xmax': float(xmax),
+                                                     'ymax': float(ymax)})
+
+    def query_osm_poi_type_city_gpd(self, ptype: str, city: str, with_metadata: bool = True):
+        '''
+        Load OSM objects of a POI type with the given city in their address, these are the candidates of the
+        address based priority tiers in the tile cache (see libs/tile_cache.py)
+        :param ptype: POI type, see poitypes.getPOITypes()
+        :param city: Name of the city
+        :parm with_metadata: Query OpenStreetMap metadata information
+        :return: GeoDataFrame of OSM objects
+        '''
+        query_type, distance = poitypes.getPOITypes(ptype)
+        query = sqlalchemy.text(shop_poi_candidates_query(query_type, with_metadata,
+                                                          'AND LOWER(TEXT("addr:city")) = LOWER(TEXT(:city))'))
+        return gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way', params={'city': city})
+
+    def query_osm_named_objects_pd(self, ptypes):
+        '''
+        Load name and brand of OSM objects of POI types, this is the source of the reverse classification of
+        OSM objects (see libs/name_classifier.py)
+        :param ptypes: List of POI types, see poitypes.getPOITypes()
+        :return: DataFrame of osm_id, node, name and brand of OSM objects with name or brand
+        '''
+        query_type = ' OR '.join('({})'.format(poitypes.getPOITypes(p)[0]) for p in dict.fromkeys(ptypes))
+        selectors = []
+        for node, table, id_filter, position in SHOP_POI_SOURCES:
+            selectors.append('''
+            SELECT osm_id, '{node}' AS node, name, brand
+            FROM {table}
+            WHERE ({query_type}) AND {id_filter} AND (name IS NOT NULL OR brand IS NOT NULL)
+            '''.format(node=node, table=table, query_type=query_type, id_filter=id_filter))
+        query = sqlalchemy.text('UNION ALL'.join(selectors))
+        logging.debug(str(query))
+        return pd.read_sql(query, self.engine)
+
+    def replace_poi_osm_candidates(self, candidates):
+        '''
+        Replace the content of poi_osm_candidate table
+        :param candidates: List of dictionaries with POI_OSM_candidate columns
+        '''
+        with self.engine.begin() as conn:
+            conn.execute(POI_OSM_candidate.__table__.delete())
+            if candidates:
+                conn.execute(POI_OSM_candidate.__table__.insert(), candidates)
+
+    def query_osm_objects_gpd(self, osm_ids, with_metadata: bool = True):
+        '''
+        Load OSM objects (as matcher candidates) by their osm_id
+        :param osm_ids: List of osm_id of nodes, ways and relations (relations are negative)
+        :parm with_metadata: Query OpenStreetMap metadata information
+        :return: GeoDataFrame of OSM objects
+        '''
+        query = sqlalchemy.text(shop_poi_candidates_query('TRUE', with_metadata,
+                                                          'AND osm_id = ANY(CAST(:osm_ids AS bigint[]))'))
+        return gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way',
+                                             params={'osm_ids': [int(i) for i in osm_ids]})
+
+    def query_osm_postcode_boundaries_gpd(self):
+        '''
+        Load all postal code boundaries, this is the source of the in-memory postcode resolver
+        (see libs/postcode_resolver.py)
+        :return: GeoDataFrame of postal code boundaries ordered by name
+        '''
+        query = sqlalchemy.text('''
+            SELECT name, way
+            FROM planet_osm_polygon
+            WHERE boundary='postal_code' AND name IS NOT NULL
+            ORDER BY name''')
+        data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way')
+        logging.info('Loaded %s postal code boundaries.', len(data))
+        return data
+
+    def query_osm_changed_gpd(self, since, with_metadata: bool = True):
+        '''
+        Load OSM objects (as matcher candidates) that are changed since a timestamp
+        :param since: OSM objects with newer osm_timestamp are loaded, all objects are loaded when it is None
+        :parm with_metadata: Query OpenStreetMap metadata information
+        :return: GeoDataFrame of OSM objects
+        '''
+        query = sqlalchemy.text(shop_poi_candidates_query('TRUE', with_metadata,
+                                                          'AND (CAST(:since AS timestamptz) IS NULL OR '
+                                                          'osm_timestamp > CAST(:since AS timestamptz))'))
+        return gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way',
+                                             params={'since': None if since is None or pd.isnull(since) else
+                                                     pd.Timestamp(since).to_pydatetime()})
+
+    def query_planet_objects_pd(self, object_type, osm_ids):
+        '''
+        Load OSM objects from the planet tables in one query: tagged nodes from planet_osm_point (hstore tags column),
+        ways and relations from the middle tables with the metadata of their planet_osm_polygon/line rows
+        :param object_type: OSM_object_type of the objects
+        :param osm_ids: List of OSM API ids (relations are positive)
+        :return: DataFrame of osm_id (API id), tags, members (node ids of ways, members of relations), metadata
+          columns and osm_lat, osm_lon of nodes, objects missing from the planet tables are missing
+        '''
+        osm_ids = sorted({abs(int(i)) for i in osm_ids})
+        metadata = ', '.join(PLANET_METADATA_COLUMNS)
+        if object_type.name == 'node':
+            query = sqlalchemy.text('''
+                SELECT DISTINCT ON (osm_id) osm_id, hstore_to_json(tags) AS tags, NULL AS members, {metadata},
+                       ST_Y(way) AS osm_lat, ST_X(way) AS osm_lon
+                FROM planet_osm_point
+                WHERE osm_id = ANY(CAST(:osm_ids AS bigint[]))
+                ORDER BY osm_id'''.format(metadata=metadata))
+            return pd.read_sql(query, self.engine, params={'osm_ids': osm_ids})
+        sources = PLANET_OBJECT_SOURCES[object_type.name]
+        sign = sources[0][1]
+        middle, members = ('planet_osm_ways', 'nodes') if object_type.name == 'way' else ('planet_osm_rels', 'members')
+        query = sqlalchemy.text('''
+            SELECT m.id AS osm_id, m.tags, m.{members} AS members, {o_metadata}, NULL AS osm_lat, NULL AS osm_lon
+            FROM {middle} AS m
+            LEFT JOIN (SELECT DISTINCT ON (osm_id) {sign} * osm_id AS osm_id, {metadata}
+                       FROM ({objects}) AS p
+                       ORDER BY osm_id) AS o ON o.osm_id = m.id
+            WHERE m.id = ANY(CAST(:osm_ids AS bigint[]))'''.format(
+            members=members, middle=middle, sign=sign, metadata=metadata,
+            o_metadata=', '.join('o.{}'.format(c) for c in PLANET_METADATA_COLUMNS),
+            objects=' UNION ALL '.join('SELECT osm_id, {} FROM {} WHERE osm_id = ANY(CAST(:planet_ids AS bigint[]))'
+                                       .format(metadata, t) for t, s in sources)))
+        return pd.read_sql(query, self.engine, params={'osm_ids': osm_ids,
+                                                      'planet_ids': [sign * i for i in osm_ids]})
+
+    def query_planet_nodes_pd(self, osm_ids):
+        '''
+        Load the coordinates of (untagged) nodes from planet_osm_nodes of the slim import in one query
+        :param osm_ids: List of node ids
+        :return: DataFrame of osm_id, osm_lat and osm_lon
+        '''
+        query = sqlalchemy.text('SELECT id AS osm_id, lat / 1e7 AS osm_lat, lon / 1e7 AS osm_lon FROM planet_osm_nodes '
+                                'WHERE id = ANY(CAST(:osm_ids AS bigint[]))')
+        return pd.read_sql(query, self.engine, params={'osm_ids': sorted({int(i) for i in osm_ids})})
+
+    def query_planet_timestamp(self):
+        '''
+        Timestamp of the imported OSM snapshot: the newest object timestamp in the planet tables
+        '''
+        query = sqlalchemy.text('SELECT max(osm_timestamp) AS osm_snapshot FROM planet_osm_point')
+        return pd.read_sql(query, self.engine)['osm_snapshot'].values[0]
+
+    def query_poi_osm_matches(self, poi_hashes):
+        '''
+        Load stored match decisions of POIs
+        :param poi_hashes: List of poi_hash
+        :return: DataFrame of match decisions
+        '''
+        query = sqlalchemy.text('''
+            SELECT poi_hash, poi_search_hash, poi_osm_id, poi_osm_object_type, poi_osm_tier, poi_osm_distance,
+                   poi_osm_version, ST_X(geom_hint) AS geom_hint_x, ST_Y(geom_hint) AS geom_hint_y, osm_snapshot,
+                   poi_osm_updated
+            FROM poi_osm
+            WHERE poi_hash = ANY(CAST(:poi_hashes AS text[]))''')
+        return pd.read_sql(query, self.engine, params={'poi_hashes': list(poi_hashes)})
+
+    def query_poi_osm_snapshot(self, poi_hashes):
+        '''
+        The oldest OSM snapshot of stored match decisions of POIs
+        :param poi_hashes: List of poi_hash
+        :return: Timestamp or None when there is no stored decision
+        '''
+        query = sqlalchemy.text('''
+            SELECT min(osm_snapshot) AS osm_snapshot
+            FROM poi_osm
+            WHERE poi_hash = ANY(CAST(:poi_hashes AS text[]))''')
+        snapshot = pd.read_sql(query, self.engine, params={'poi_hashes': list(poi_hashes)})['osm_snapshot'].values[0]
+        return None if pd.isnull(snapshot) else pd.Timestamp(snapshot)
+
+    def poi_osm_schema_current(self):
+        '''
+        Check that poi_osm table has the columns of match decisions and the unique index of poi_hash
+        :return: False when the table has to be migrated with migrate_poi_osm()
+        '''
+        columns = pd.read_sql(sqlalchemy.text(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'poi_osm'"), self.engine)
+        unique = pd.read_sql(sqlalchemy.text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'poi_osm' AND indexdef LIKE 'CREATE UNIQUE INDEX%' "
+            "AND indexdef LIKE '%(poi_hash)'"), self.engine)
+        return set(POI_osm.__table__.columns.keys()) <= set(columns['column_name']) and len(unique) > 0
+
+    def migrate_poi_osm(self):
+        '''
+        Migrate poi_osm table of an earlier version in one transaction, see POI_OSM_MIGRATION
+        '''
+        with self.engine.begin() as conn:
+            for statement in POI_OSM_MIGRATION:
+                conn.execute(sqlalchemy.text(statement))
+        logging.info('Migrated poi_osm table.')
+
+    def upsert_poi_osm_matches(self, matches):
+        '''
+        Store match decisions of POIs, the previous decision of a poi_hash is replaced
+        :param matches: List of dictionaries with POI_osm columns
+        '''
+        if not matches:
+            return
+        statement = insert(POI_osm.__table__).values(matches)
+        statement = statement.on_conflict_do_update(
+            index_elements=['poi_hash'],
+            set_={c: getattr(statement.excluded, c) for c in matches[0].keys() if c != 'poi_hash'})
+        with self.engine.begin() as conn:
+            conn.execute(statement)
+
+    def query_poi_tier_stats(self):
+        '''
+        Load the priority tier statistics of matches
+        :return: DataFrame of poi_code, poi_osm_tier and hits
+        '''
+        query = sqlalchemy.text('SELECT poi_code, poi_osm_tier, hits FROM poi_tier_stat')
+        return pd.read_sql(query, self.engine)
+
+    def add_poi_tier_stats(self, stats):
+        '''
+        Add the priority tier hits of a matcher run to the statistics
+        :param stats: List of dictionaries with poi_code, poi_osm_tier and hits
+        '''
+        if not stats:
+            return
+        statement = insert(POI_tier_stat.__table__).values(stats)
+        statement = statement.on_conflict_do_update(
+            index_elements=['poi_code', 'poi_osm_tier'],
+            set_={'hits': POI_tier_stat.__table__.c.hits + statement.excluded.hits})
+        with self.engine.begin() as conn:
+            conn.execute(statement)
+
+    def query_osm_address_buildings_gpd(self, addresses):
+        '''
+        Load buildings with the given addresses, this is the source of the building index of new POI relocation
+        (see libs/building_index.py)
+        :param addresses: List of (street name, housenumber) tuples
+        :return: GeoDataFrame of buildings
+        '''
+        addresses = sorted({(str(s).lower(), str(h).lower()) for s, h in addresses})
+        query = sqlalchemy.text('''
+            SELECT osm_id, "addr:street", "addr:housenumber", way
+            FROM planet_osm_polygon
+            WHERE building <> '' AND osm_id > 0
+                AND (LOWER(TEXT("addr:street")), LOWER(TEXT("addr:housenumber"))) IN
+                    (SELECT * FROM unnest(CAST(:streets AS text[]), CAST(:housenumbers AS text[])))''')
+        return gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way',
+                                             params={'streets': [a[0] for a in addresses],
+                                                     'housenumbers': [a[1] for a in addresses]})
 
     def query_osm_building_poi_gpd(self, lon, lat, city, postcode, street_name='', housenumber='',
                                    in_building_percentage=0.50, distance=60):
@@ -559,9 +1169,10 @@ class POIBase:
                 ST_PointOnSurface(way) in_building, ST_AsEWKT(way) as way_ewkt,
                 ST_AsEWKT(ST_PointOnSurface(way)) in_building_ewkt
             FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
-            WHERE building <> '' AND osm_id > 0 AND ST_DistanceSphere(way, point.geom) < :distance
+            WHERE building <> '' AND osm_id > 0 AND {distance_query}
                 {street_query} {housenumber_query}
-            ORDER BY distance ASC LIMIT 1'''.format(street_query=street_query, housenumber_query=housenumber_query))
+            ORDER BY distance ASC LIMIT 1'''.format(distance_query=distance_within_sql('way', 'point.geom', ':distance'),
+                                                   street_query=street_query, housenumber_query=housenumber_query))
         data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way', params={'lon': lon, 'lat': lat,
                                                                                          'distance': distance,
                                                                                          'buffer': buffer,
@@ -580,10 +1191,10 @@ class POIBase:
             SELECT * FROM
               (SELECT osm_id, way, ST_DistanceSphere(way, point.geom) as distance
               FROM planet_osm_polygon, (SELECT ST_SetSRID(ST_MakePoint(:lon, :lat), 4326) as geom) point
-              WHERE (water IS NOT NULL OR waterway IS NOT NULL)
+              WHERE (water IS NOT NULL OR waterway IS NOT NULL) AND {distance_query}
               ORDER BY distance ASC LIMIT 1) AS geo
             WHERE geo.distance < :distance
-              ''')
+              '''.format(distance_query=distance_within_sql('way', 'point.geom', ':distance')))
             data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way', params={'lon': lon, 'lat': lat,
                                                                                              'distance': distance})
             return data
@@ -623,10 +1234,11 @@ class POIBase:
                     ST_DistanceSphere(way, point.geom) as distance, way, ST_AsEWKT(way) as way_ewkt
                   FROM planet_osm_line, (SELECT ST_SetSRID(ST_MakePoint(:lon,:lat), 4326) as geom) point
                   WHERE "highway" is not NULL
-                    AND {name_query}
+                    AND {name_query} AND {distance_query}
                   ORDER BY distance ASC LIMIT 1) AS geo
                 WHERE geo.distance < :distance
-                '''.format(metadata_fields=metadata_fields, name_query=name_query))
+                '''.format(metadata_fields=metadata_fields, name_query=name_query,
+                           distance_query=distance_within_sql('way', 'point.geom', ':distance')))
             data = gpd.GeoDataFrame.from_postgis(query, self.engine, geom_col='way', params={'lon': lon, 'lat': lat,
                                                                                              'distance': distance,
                                                                                              'name': '{}'.format(name)})
@@ -635,3 +1247,63 @@ class POIBase:
         except Exception as err:
             logging.error(err)
             logging.exception('Exception occurred')
+
+
+def database_url():
+    '''
+    SQLAlchemy database url of the POI database from the configuration
+    '''
+    return '{}://{}:{}@{}:{}/{}'.format(config.get_database_type(), config.get_database_writer_username(),
+                                        config.get_database_writer_password(), config.get_database_writer_host(),
+                                        config.get_database_writer_port(), config.get_database_poi_database())
+
+
+def worker_processes(max_connections=None):
+    '''
+    Number of worker processes: one per CPU core, but not more than the connection limit of the database server allows
+    beside the reserved connections and the main process
+    :param max_connections: Connection limit of the database server, default is db.max.connections
+    :return: Number of worker processes, at least 1
+    '''
+    max_connections = config.get_database_max_connections() if max_connections is None else max_connections
+    shared = max_connections - RESERVED_CONNECTIONS - MIN_POOL_SIZE
+    return max(1, min(multiprocessing.cpu_count(), shared // MIN_POOL_SIZE))
+
+
+def worker_pool_size(processes, max_connections=None):
+    '''
+    Connection pool size of a worker process: the worker processes share the connection limit of the database server
+    :param processes: Number of worker processes
+    :param max_connections: Connection limit of the database server, default is db.max.connections
+    :return: Number of connections of a worker process, at least MIN_POOL_SIZE
+    '''
+    max_connections = config.get_database_max_connections() if max_connections is None else max_connections
+    shared = max_connections - RESERVED_CONNECTIONS - MIN_POOL_SIZE
+    return max(MIN_POOL_SIZE, shared // max(1, processes))
+
+
+def get_poi_base(db_connection=None, pool_size=MIN_POOL_SIZE, create_tables=True):
+    '''
+    Get the POIBase of this process: its engine, connection pool and session factory are created only once per
+    process and they are reused by every stage that runs in the process
+    :param db_connection: Database url, default is database_url()
+    :param pool_size: Connection pool size when the POIBase is created
+    :param create_tables: Create the missing tables when the POIBase is created
+    :return: POIBase instance
+    '''
+    key = (os.getpid(), db_connection or database_url())
+    if key not in __databases:
+        __databases[key] = POIBase(key[1], pool_size=pool_size, create_tables=create_tables)
+    return __databases[key]
+
+
+def init_worker(pool_size=MIN_POOL_SIZE):
+    '''
+    Initializer of worker process pools: creates the POIBase of the worker process. Engines inherited from the
+    parent process are dropped without closing their connections, those still belong to the parent process.
+    :param pool_size: Connection pool size of the worker, see worker_pool_size()
+    '''
+    for key in [k for k in __databases if k[0] != os.getpid()]:
+        __databases.pop(key).engine.dispose(close=False)
+    # Tables are created by the main process before it starts the workers
+    get_poi_base(pool_size=pool_size, create_tables=False)
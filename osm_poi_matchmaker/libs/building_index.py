@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import numpy as np
+    import pandas as pd
+    import geopandas as gpd
+    from shapely.geometry import Point, LineString
+    from osm_poi_matchmaker.dao.poi_base import clean_value
+    from osm_poi_matchmaker.libs.gis import METERS_PER_DEGREE, distance_sphere_geometry
+    from osm_poi_matchmaker.libs.candidate_index import lower_values
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+def address_key(street_name, housenumber):
+    '''
+    Key of an address in the building index, same as comparison of LOWER(TEXT()) values in SQL
+    :return: Tuple of lowercase street name and housenumber or None when the address is not complete
+    '''
+    street_name, housenumber = clean_value(street_name), clean_value(housenumber)
+    if street_name is None or street_name == '' or housenumber is None or housenumber == '':
+        return None
+    return str(street_name).lower(), str(housenumber).lower()
+
+
+def first_line(geometry):
+    # Line of ST_GeometryN(geometry, 1), None when the intersection is not a line
+    if geometry is None or geometry.is_empty:
+        return None
+    if hasattr(geometry, 'geoms'):
+        geometry = geometry.geoms[0] if len(geometry.geoms) else None
+    return geometry if geometry is not None and geometry.geom_type == 'LineString' and geometry.length > 0 else None
+
+
+class BuildingIndex:
+    '''
+    Buildings with address keyed by their street name and housenumber. It relocates new POIs like
+    POIBase.query_osm_building_poi_gpd() but for all new POIs at once.
+
+    :param buildings: GeoDataFrame loaded by POIBase.query_osm_address_buildings_gpd()
+    '''
+
+    def __init__(self, buildings):
+        self.__buildings = buildings.reset_index(drop=True)
+        self.__keys = {}
+        for position, key in enumerate(zip(lower_values(self.__buildings['addr:street']),
+                                           lower_values(self.__buildings['addr:housenumber']))):
+            if key[0] is not None and key[1] is not None:
+                self.__keys.setdefault(key, []).append(position)
+        # Bounding boxes are the spatial filter of buildings with the same address
+        self.__bounds = self.__buildings.geometry.bounds.fillna(0).values
+
+    def __len__(self):
+        return len(self.__buildings)
+
+    def __candidates(self, pois, distance):
+        # Pairs of POI index and building position: same address and within distance
+        poi_index, positions = [], []
+        for index, street_name, housenumber in zip(pois.index, pois['street_name'], pois['housenumber']):
+            for position in self.__keys.get(address_key(street_name, housenumber), []):
+                poi_index.append(index)
+                positions.append(position)
+        if not positions:
+            return pd.DataFrame({'poi': [], 'building': [], 'distance': []})
+        positions = np.array(positions, dtype=int)
+        lon = pois.loc[poi_index, 'lon'].values.astype(float)
+        lat = pois.loc[poi_index, 'lat'].values.astype(float)
+        bounds = self.__bounds[positions]
+        # Distance from bounding box is never more than the distance from the building
+        dx = np.maximum.reduce([bounds[:, 0] - lon, lon - bounds[:, 2], np.zeros(len(lon))]) * \
+            np.cos(np.radians(lat)) * METERS_PER_DEGREE
+        dy = np.maximum.reduce([bounds[:, 1] - lat, lat - bounds[:, 3], np.zeros(len(lat))]) * METERS_PER_DEGREE
+        near = np.hypot(dx, dy) < distance * 1.01 + 1
+        pairs = pd.DataFrame({'poi': np.array(poi_index, dtype=object)[near], 'building': positions[near]})
+        pairs['distance'] = [distance_sphere_geometry(self.__buildings.geometry.iat[b], x, y) for b, x, y in
+                             zip(pairs['building'], lon[near], lat[near])]
+        return pairs[pairs['distance'] < distance]
+
+    def relocate(self, pois, distance=60):
+        '''
+        Move POIs into the nearest building with the same address. The new location is on the line between the
+        point on surface of the building and the POI, inside of the building.
+        :param pois: DataFrame of POIs with lon, lat, street_name, housenumber and in_building_percentage columns
+        :param distance: Look buildings around the POIs within this radius (specified in meter)
+        :return: DataFrame of relocated POIs (indexed like pois) with lat, lon, osm_id and distance columns
+        '''
+        pairs = self.__candidates(pois, distance)
+        if pairs.empty:
+            return pd.DataFrame(columns=['lat', 'lon', 'osm_id', 'distance'])
+        # The nearest building of every POI
+        nearest = pairs.loc[pairs.groupby('poi', sort=False)['distance'].idxmin()].set_index('poi')
+        buildings = gpd.GeoSeries(self.__buildings.geometry.values[nearest['building'].values], index=nearest.index)
+        in_building = buildings.representative_point()
+        lines = gpd.GeoSeries([LineString([p, Point(x, y)]) for p, x, y in
+                               zip(in_building, pois.loc[nearest.index, 'lon'], pois.loc[nearest.index, 'lat'])],
+                              index=nearest.index)
+        inside = [first_line(g) for g in buildings.intersection(lines)]
+        # The POI is on the point on surface of its building, there is no line to interpolate
+        inside = gpd.GeoSeries([g for g in inside if g is not None],
+                               index=[i for i, g in zip(nearest.index, inside) if g is not None])
+        points = inside.interpolate(pois.loc[inside.index, 'in_building_percentage'].astype(float), normalized=True)
+        return pd.DataFrame({'lat': points.y, 'lon': points.x,
+                             'osm_id': self.__buildings['osm_id'].values[nearest.loc[points.index, 'building'].values],
+                             'distance': nearest.loc[points.index, 'distance'].values}, index=points.index)
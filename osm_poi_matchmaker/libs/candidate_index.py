@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import re
+    import numpy as np
+    from scipy.spatial import cKDTree
+    from osm_poi_matchmaker.dao.poi_base import shop_poi_tiers, search_distances, clean_value
+    from osm_poi_matchmaker.libs.gis import sphere_xyz, chord_length, distance_sphere, distance_sphere_geometry
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+# Search fields of the matcher and the OSM columns they are compared with
+ADDRESS_FIELDS = {'street_name': 'addr:street', 'housenumber': 'addr:housenumber',
+                  'conscriptionnumber': 'addr:conscriptionnumber', 'city': 'addr:city'}
+
+# Candidate indexes of this process keyed by POI type
+__indexes = {}
+
+
+def lower_values(values):
+    '''
+    Lowercase text values of a column, missing values (SQL NULL) are kept as None
+    '''
+    return np.array([None if clean_value(v) is None else str(v).lower() for v in values], dtype=object)
+
+
+class CandidateIndex:
+    '''
+    In-memory spatial index of all OSM objects of a POI type. It gives the same answer as
+    POIBase.query_osm_shop_poi_gpd() without querying the database POI by POI.
+
+    :param candidates: GeoDataFrame loaded by POIBase.query_osm_poi_type_gpd()
+    '''
+
+    def __init__(self, candidates):
+        self.__candidates = candidates.reset_index(drop=True)
+        self.__names = {'name': lower_values(self.__candidates['name']),
+                        'brand': lower_values(self.__candidates['brand'])}
+        self.__has_name = np.array([n is not None and b is not None for n, b in
+                                    zip(self.__names['name'], self.__names['brand'])], dtype=bool)
+        self.__address = {k: lower_values(self.__candidates[c]) for k, c in ADDRESS_FIELDS.items()}
+        self.__regex_masks = {}
+        self.__geometries = self.__candidates.geometry.values
+        self.__is_point = np.array([g is not None and g.geom_type == 'Point' for g in self.__geometries], dtype=bool)
+        bounds = self.__candidates.geometry.bounds.fillna(0).values
+        # Coordinates of points, for other geometries it is a corner of their bounding box
+        self.__x, self.__y = bounds[:, 0], bounds[:, 1]
+        center_lon, center_lat = (bounds[:, 0] + bounds[:, 2]) / 2, (bounds[:, 1] + bounds[:, 3]) / 2
+        # Half diagonal of the largest bounding box: a geometry is not farther than this from its center
+        self.__max_extent = max(np.max(distance_sphere(center_lon, center_lat, bounds[:, 0], bounds[:, 1]), initial=0),
+                                np.max(distance_sphere(center_lon, center_lat, bounds[:, 2], bounds[:, 1]), initial=0))
+        self.__tree = cKDTree(sphere_xyz(center_lon, center_lat)) if len(bounds) else None
+
+    def __len__(self):
+        return len(self.__candidates)
+
+    def __regex_mask(self, pattern, field):
+        # Regular expression matches are cached: all POIs of a POI common use the same search name
+        if (pattern, field) not in self.__regex_masks:
+            regex = re.compile('.*{}.*'.format(pattern).lower(), re.IGNORECASE)
+            self.__regex_masks[(pattern, field)] = np.array(
+                [v is not None and regex.search(v) is not None for v in self.__names[field]], dtype=bool)
+        return self.__regex_masks[(pattern, field)]
+
+    def __filter_mask(self, filters, values):
+        # Same logic as SHOP_POI_FILTERS, a comparison with NULL is never true
+        mask = np.ones(len(self.__candidates), dtype=bool)
+        for f in filters:
+            if f == 'name':
+                mask &= self.__regex_mask(values[f], 'name') | self.__regex_mask(values[f], 'brand')
+            elif f == 'avoid_name':
+                # Not matching a NULL name or brand is NULL in SQL too
+                mask &= self.__has_name & ~self.__regex_mask(values[f], 'name') & ~self.__regex_mask(values[f], 'brand')
+            else:
+                mask &= self.__address[f] == values[f]
+        return mask
+
+    def nearby(self, lon, lat, distance):
+        '''
+        Find OSM objects within distance of a coordinate
+        :param lon: Longitude of the coordinate
+        :param lat: Latitude of the coordinate
+        :param distance: Search radius in meter
+        :return: Tuple of candidate positions and their distances in meter
+        '''
+        if self.__tree is None:
+            return np.array([], dtype=int), np.array([], dtype=float)
+        positions = np.array(sorted(self.__tree.query_ball_point(
+            sphere_xyz([lon], [lat])[0], float(chord_length(distance + self.__max_extent + 1)))), dtype=int)
+        distances = np.empty(len(positions), dtype=float)
+        points = self.__is_point[positions]
+        distances[points] = distance_sphere(self.__x[positions[points]], self.__y[positions[points]], lon, lat)
+        for j in np.flatnonzero(~points):
+            distances[j] = distance_sphere_geometry(self.__geometries[positions[j]], lon, lat)
+        within = distances < distance
+        return positions[within], distances[within]
+
+    def match(self, lon, lat, name='', avoid_name='', street_name='', housenumber='', conscriptionnumber='',
+              city='', distance_perfect=None, distance_safe=None, distance_unsafe=None, priorities=None):
+        '''
+        Search for the best OSM POI, parameters and result are the same as of POIBase.query_osm_shop_poi_gpd()
+        :param priorities: Check only these priority tiers (the cascade order is kept)
+        :return: One row GeoDataFrame or None when there is no match
+        '''
+        filters = {'name': name, 'avoid_name': avoid_name, 'street_name': street_name, 'housenumber': housenumber,
+                   'conscriptionnumber': conscriptionnumber, 'city': city}
+        values = {}
+        for key, value in filters.items():
+            value = clean_value(value)
+            if value is not None and value != '':
+                values[key] = str(value) if key in ('name', 'avoid_name') else str(value).lower()
+        distance_perfect, distance_safe, distance_unsafe = search_distances(name, distance_perfect, distance_safe,
+                                                                            distance_unsafe)
+        limits = {'distance_perfect': float(distance_perfect), 'distance_safe': float(distance_safe),
+                  'distance_unsafe': float(distance_unsafe)}
+        tiers = [t for t in shop_poi_tiers(set(values)) if priorities is None or t.priority in priorities]
+        near = None
+        for tier in tiers:
+            mask = self.__filter_mask(tier.filters, values)
+            if tier.distance is None:
+                hits = np.flatnonzero(mask)
+                if len(hits):
+                    return self.__result(hits[0], tier.priority, 0)
+            else:
+                if near is None:
+                    # All distance based tiers are resolved from the same neighbourhood
+                    near = self.nearby(lon, lat, max(limits[t.distance] for t in tiers if t.distance is not None))
+                positions, distances = near
+                hits = mask[positions] & (distances < limits[tier.distance])
+                if hits.any():
+                    best = np.flatnonzero(hits)[np.argmin(distances[hits])]
+                    return self.__result(positions[best], tier.priority, distances[best])
+        return None
+
+    def __result(self, position, priority, distance):
+        result = self.__candidates.iloc[[position]].drop(columns=['brand'])
+        result['priority'] = priority
+        result['distance'] = distance
+        return result
+
+
+def get_candidate_index(db, ptype):
+    '''
+    Get the candidate index of a POI type, it is loaded from the database only once per process
+    :param db: POIBase instance
+    :param ptype: POI type, see poitypes.getPOITypes()
+    :return: CandidateIndex
+    '''
+    if ptype not in __indexes:
+        __indexes[ptype] = CandidateIndex(db.query_osm_poi_type_gpd(ptype))
+        logging.info('Candidate index of %s POI type contains %s OSM objects.', ptype, len(__indexes[ptype]))
+    return __indexes[ptype]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import re
+    import numpy as np
+    from osm_poi_matchmaker.dao.poi_base import search_distances, clean_value
+    from osm_poi_matchmaker.libs.candidate_index import lower_values, ADDRESS_FIELDS
+    from osm_poi_matchmaker.utils import config
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+# Weights of the score components. Distance gives its full weight at the POI and nothing at the search radius.
+SCORE_WEIGHTS = {'name': 4.0, 'brand': 2.0, 'street_name': 1.0, 'housenumber': 1.0, 'conscriptionnumber': 1.0,
+                 'city': 0.5, 'distance': 2.0}
+
+
+def regex_mask(pattern, values):
+    '''
+    Match search name regular expression like ~* in SQL, missing values never match
+    :param pattern: Regular expression
+    :param values: Lowercase values, see lower_values()
+    :return: Boolean array
+    '''
+    regex = re.compile('.*{}.*'.format(pattern), re.IGNORECASE)
+    return np.array([v is not None and regex.search(v) is not None for v in values], dtype=bool)
+
+
+def score_candidates(candidates, name='', avoid_name='', street_name='', housenumber='', conscriptionnumber='',
+                     city='', distance=None):
+    '''
+    Score the matcher candidates of a POI
+    :param candidates: GeoDataFrame of candidates with distance column, see POIBase.query_osm_shop_poi_top_gpd()
+    :param name: Search name (regular expression) of the POI
+    :param avoid_name: Candidates with this name (regular expression) are excluded
+    :param street_name: Street name of the POI
+    :param housenumber: House number of the POI
+    :param conscriptionnumber: Conscription number of the POI
+    :param city: City of the POI
+    :param distance: Search radius in meter
+    :return: Array of scores, excluded candidates have -inf score
+    '''
+    scores = np.zeros(len(candidates), dtype=float)
+    if not len(candidates):
+        return scores
+    names = lower_values(candidates['name'])
+    brands = lower_values(candidates['brand']) if 'brand' in candidates else np.full(len(candidates), None)
+    name, avoid_name = clean_value(name), clean_value(avoid_name)
+    if name is not None and name != '':
+        scores += SCORE_WEIGHTS['name'] * regex_mask(name, names)
+        scores += SCORE_WEIGHTS['brand'] * regex_mask(name, brands)
+    if avoid_name is not None and avoid_name != '':
+        scores[regex_mask(avoid_name, names) | regex_mask(avoid_name, brands)] = -np.inf
+    values = {'street_name': street_name, 'housenumber': housenumber, 'conscriptionnumber': conscriptionnumber,
+              'city': city}
+    for field, value in values.items():
+        value = clean_value(value)
+        if value is not None and value != '':
+            scores += SCORE_WEIGHTS[field] * (lower_values(candidates[ADDRESS_FIELDS[field]]) == str(value).lower())
+    if distance:
+        scores += SCORE_WEIGHTS['distance'] * np.clip(1 - candidates['distance'].values.astype(float) / distance, 0, 1)
+    return scores
+
+
+def best_candidate(candidates, name='', avoid_name='', street_name='', housenumber='', conscriptionnumber='',
+                   city='', distance_perfect=None, distance_safe=None, distance_unsafe=None, min_score=None):
+    '''
+    Select the best scoring candidate of a POI, parameters are the same as of POIBase.query_osm_shop_poi_gpd().
+    Like in the cascade, candidates farther than the unsafe search distance are accepted only with matching name.
+    :param min_score: Candidates with lower score are not accepted, default is matcher.score.min
+    :return: One row GeoDataFrame with score and runner-up (runner_up_osm_id, runner_up_node, runner_up_score)
+      columns or None when there is no candidate
+    '''
+    min_score = config.get_matcher_score_min() if min_score is None else min_score
+    distances = [float(d) for d in search_distances(name, distance_perfect, distance_safe, distance_unsafe)]
+    scores = score_candidates(candidates, name, avoid_name, street_name, housenumber, conscriptionnumber, city,
+                              max(distances))
+    if len(candidates):
+        name = clean_value(name)
+        named = regex_mask(name, lower_values(candidates['name'])) if name is not None and name != '' \
+            else np.zeros(len(candidates), dtype=bool)
+        if name is not None and name != '' and 'brand' in candidates:
+            named |= regex_mask(name, lower_values(candidates['brand']))
+        far = candidates['distance'].values.astype(float) > distances[2]
+        scores[(far & ~named) | (scores < min_score)] = -np.inf
+    # Stable sort keeps the nearer candidate first on equal score
+    order = [p for p in np.argsort(-scores, kind='mergesort') if np.isfinite(scores[p])]
+    if not order:
+        return None
+    result = candidates.iloc[[order[0]]].drop(columns=['brand'], errors='ignore')
+    result['score'] = scores[order[0]]
+    result['runner_up_osm_id'] = candidates['osm_id'].values[order[1]] if len(order) > 1 else None
+    result['runner_up_node'] = candidates['node'].values[order[1]] if len(order) > 1 else None
+    result['runner_up_score'] = scores[order[1]] if len(order) > 1 else None
+    return result
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import os
+    import glob
+    import hashlib
+    import pickle
+    import time
+    import numpy as np
+    import pandas as pd
+    from osm_poi_matchmaker.utils import config
+    from osm_poi_matchmaker.dao.poi_base import SPHERE_DEGREE_LENGTH
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+CHECKPOINT_DIRECTORY = 'checkpoint'
+CHECKPOINT_EXTENSION = '.pickle'
+
+
+def checkpoint_directory():
+    '''
+    Directory of matched chunks, it is inside of the output directory
+    '''
+    return os.path.join(config.get_directory_output(), CHECKPOINT_DIRECTORY)
+
+
+def split_chunks(data, size):
+    '''
+    Split POI dataset into chunks with the same size. The split does not depend on the number of processors
+    so the chunks of an interrupted run can be found again.
+    :param data: POI dataset
+    :param size: Number of POIs in a chunk
+    :return: List of DataFrames
+    '''
+    size = max(1, size)
+    return [data.iloc[i:i + size] for i in range(0, len(data), size)]
+
+
+def morton_key(x, y):
+    '''
+    Z-order curve position of grid cells: nearby cells have nearby positions
+    :param x: Array of non-negative column numbers
+    :param y: Array of non-negative row numbers
+    :return: Array of positions
+    '''
+    key = np.zeros(len(x), dtype=np.uint64)
+    x, y = np.asarray(x, dtype=np.uint64), np.asarray(y, dtype=np.uint64)
+    for bit in range(32):
+        key |= ((x >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+        key |= ((y >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+    return key
+
+
+def split_spatial_chunks(data, size, cell_size=None):
+    '''
+    Split POI dataset into spatially coherent chunks with the same size: POIs are ordered by their grid cell along
+    a Z-order curve, so a chunk covers few neighbouring cells and every chunk costs about the same. The split does
+    not depend on the number of processors so the chunks of an interrupted run can be found again.
+    :param data: POI dataset with poi_lon, poi_lat and poi_common_id columns
+    :param size: Number of POIs in a chunk
+    :param cell_size: Size of grid cells in meter, default is matcher.chunk.cell.size
+    :return: List of DataFrames
+    '''
+    cell_degree = (cell_size or config.get_matcher_chunk_cell_size()) / SPHERE_DEGREE_LENGTH
+    lon = pd.to_numeric(data['poi_lon'], errors='coerce').values.astype(float)
+    lat = pd.to_numeric(data['poi_lat'], errors='coerce').values.astype(float)
+    located = ~(np.isnan(lon) | np.isnan(lat))
+    x = np.floor((np.where(located, lon, 0) + 180) / cell_degree).astype(np.int64)
+    y = np.floor((np.where(located, lat, 0) + 90) / cell_degree).astype(np.int64)
+    # POIs without coordinates are the last ones, POIs of a provider in the same cell stay together, ties are
+    # ordered by address ID
+    order = np.lexsort((data['pa_id'].values, data['poi_common_id'].values, morton_key(x, y), ~located))
+    return split_chunks(data.iloc[order], size)
+
+
+def chunk_key(chunk):
+    '''
+    Identifier of a chunk, it depends on the address IDs of the POIs in the chunk
+    '''
+    digest = hashlib.sha1()
+    for pa_id in chunk['pa_id'].values:
+        digest.update('{};'.format(pa_id).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def checkpoint_file(directory, key):
+    return os.path.join(directory, '{}{}'.format(key, CHECKPOINT_EXTENSION))
+
+
+def save_chunk(directory, key, data):
+    '''
+    Save a matched chunk. The file is written with a temporary name and renamed when it is complete
+    so a killed process cannot leave a broken checkpoint behind.
+    :param directory: Checkpoint directory
+    :param key: Chunk identifier, see chunk_key()
+    :param data: Matched chunk
+    '''
+    os.makedirs(directory, exist_ok=True)
+    file_name = checkpoint_file(directory, key)
+    temp_name = '{}.{}.tmp'.format(file_name, os.getpid())
+    with open(temp_name, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_name, file_name)
+
+
+def load_chunk(directory, key):
+    '''
+    Load a matched chunk
+    :return: Matched chunk or None when it has no usable checkpoint
+    '''
+    file_name = checkpoint_file(directory, key)
+    if not os.path.exists(file_name):
+        return None
+    try:
+        with open(file_name, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logging.warning('Cannot load checkpoint %s, chunk is matched again: %s', file_name, e)
+        return None
+
+
+def clear_checkpoints(directory):
+    '''
+    Remove all checkpoints (and temporary files of unfinished writes) from checkpoint directory
+    '''
+    for file_name in glob.glob(os.path.join(directory, '*{}*'.format(CHECKPOINT_EXTENSION))):
+        os.remove(file_name)
+
+
+class CheckpointWorker:
+    '''
+    Matcher function for multiprocessing pools that saves its result as checkpoint before it is returned
+    :param to_do: Matcher function that processes (data, comm_data, ...) tuples
+    :param with_stats: Also return the worker statistics (process ID, elapsed seconds and number of POIs)
+    '''
+
+    def __init__(self, to_do, with_stats=False):
+        self.to_do = to_do
+        self.with_stats = with_stats
+
+    def __call__(self, args):
+        # args: (checkpoint directory, chunk key, data, comm_data, ...), returns (chunk key, result)
+        directory, key = args[:2]
+        started = time.perf_counter()
+        result = self.to_do(tuple(args[2:]))
+        if result is not None:
+            save_chunk(directory, key, result)
+        if self.with_stats:
+            return key, result, (os.getpid(), time.perf_counter() - started, len(args[2]))
+        return key, result
+
+
+class WorkerStats:
+    '''
+    Throughput of the worker processes of a pool
+    '''
+
+    def __init__(self):
+        self.__workers = {}
+
+    def add(self, stats):
+        '''
+        Add the statistics of a processed chunk
+        :param stats: Tuple of process ID, elapsed seconds and number of POIs, see CheckpointWorker
+        '''
+        pid, elapsed, pois = stats
+        worker = self.__workers.setdefault(pid, {'chunks': 0, 'pois': 0, 'seconds': 0.0})
+        worker['chunks'] += 1
+        worker['pois'] += pois
+        worker['seconds'] += elapsed
+        logging.info('Worker %s matched %s POIs in %.1f s (%.1f POI/s).', pid, pois, elapsed,
+                     pois / elapsed if elapsed > 0 else 0)
+
+    def log_stats(self):
+        for pid, worker in sorted(self.__workers.items()):
+            logging.info('Worker %s: %s chunks, %s POIs in %.1f s (%.1f POI/s).', pid, worker['chunks'],
+                         worker['pois'], worker['seconds'],
+                         worker['pois'] / worker['seconds'] if worker['seconds'] > 0 else 0)
@@ -12,8 +12,9 @@ try:
     from osm_poi_matchmaker.libs.address import clean_url
     from osm_poi_matchmaker.libs.osm import relationer, timestamp_now
     from osm_poi_matchmaker.libs.compare_strings import compare_strings
-    from sqlalchemy.orm import scoped_session, sessionmaker
-    from osm_poi_matchmaker.dao.poi_base import POIBase
+    from osm_poi_matchmaker.dao.poi_base import get_poi_base
+    from osm_poi_matchmaker.libs.osm_cache import get_osm_cache
+    from osm_poi_matchmaker.libs.live_tags import LiveTagFetcher, SOURCE_PLANET
     from lxml import etree
     import lxml
 except ImportError as err:
@@ -156,6 +157,112 @@ def add_osm_way(osm_id: int, node_data: dict) -> dict:
     return osm_data
 
 
+def list_osm_way(osm_id: int, way_data: dict) -> dict:
+    """Generate OpenStreetMap way header information of an unmodified way as dictionary
+
+    Args:
+        osm_id (int): OpenStreetMap ID
+        way_data (dict): Cached way (poi_osm_cache row)
+
+    Returns:
+        dict: Attributes of the way element
+    """
+    osm_data = list_osm_node(osm_id, way_data, 'osm')
+    del osm_data['lat'], osm_data['lon']
+    return osm_data
+
+
+def preload_osm_cache(osm_cache, df, db=None):
+    """Load the cached nodes of matched ways and the cached members of matched relations in bulk
+
+    Args:
+        osm_cache: OSMCache instance
+        df: Matched POIs with osm_node and osm_nodes columns
+        db: POIBase instance, objects missing from the cache are loaded from the planet tables with planet source
+            of live tags (untagged nodes are not stored in poi_osm_cache)
+    """
+    if 'osm_node' not in df or 'osm_nodes' not in df:
+        return
+    node_ids, way_ids = [], []
+    for osm_node, nodes in zip(df['osm_node'], df['osm_nodes']):
+        if not isinstance(nodes, (list, tuple)):
+            continue
+        if osm_node == OSM_object_type.way:
+            node_ids.extend(nodes)
+        elif osm_node == OSM_object_type.relation:
+            try:
+                for member in relationer(nodes):
+                    if member.get('type') == 'way':
+                        way_ids.append(int(member.get('ref')))
+                    elif member.get('type') == 'node':
+                        node_ids.append(int(member.get('ref')))
+            except (TypeError, ValueError, IndexError) as e:
+                logging.warning('Invalid relation members %s: %s', nodes, e)
+    osm_cache.load(OSM_object_type.way, way_ids)
+    for way_id in way_ids:
+        way = osm_cache.get(way_id, OSM_object_type.way)
+        if way is not None:
+            node_ids.extend(way.get('osm_nodes') or [])
+    osm_cache.load(OSM_object_type.node, node_ids)
+    if db is None or config.get_matcher_live_tags_source() != SOURCE_PLANET:
+        return
+    fetcher = LiveTagFetcher(db, cache=osm_cache, validate=False, source=SOURCE_PLANET, refresh=False)
+    for object_type, osm_ids in ((OSM_object_type.way, way_ids), (OSM_object_type.node, node_ids)):
+        for osm_id in osm_ids:
+            if osm_cache.get(osm_id, object_type) is None:
+                fetcher.add(osm_id, object_type)
+    fetcher.fetch()
+
+
+def add_cached_nodes(osm_xml_data, osm_cache, node_ids, added_nodes: set):
+    """Add unmodified nodes from poi_osm_cache to the OSM XML, every node is added only once
+
+    Args:
+        osm_xml_data: Root element of the OSM XML
+        osm_cache: OSMCache instance
+        node_ids (list): OpenStreetMap IDs of nodes
+        added_nodes (set): IDs of nodes already in the OSM XML
+    """
+    for n in node_ids:
+        if n in added_nodes:
+            continue
+        added_nodes.add(n)
+        way_node = osm_cache.get(n, OSM_object_type.node)
+        if way_node is not None:
+            node_data = etree.SubElement(osm_xml_data, 'node', list_osm_node(n, way_node, 'osm'))
+            if way_node.get('osm_live_tags') is not None and way_node.get('osm_live_tags') != '':
+                for k, v in sorted(way_node.get('osm_live_tags').items()):
+                    etree.SubElement(node_data, 'tag', k=k, v='{}'.format(v))
+
+
+def add_cached_members(osm_xml_data, osm_cache, members: list, added_nodes: set, added_ways: set):
+    """Add unmodified member nodes and ways (with their nodes) of a relation from poi_osm_cache to the OSM XML
+
+    Args:
+        osm_xml_data: Root element of the OSM XML
+        osm_cache: OSMCache instance
+        members (list): Members of the relation, see relationer()
+        added_nodes (set): IDs of nodes already in the OSM XML
+        added_ways (set): IDs of ways already in the OSM XML
+    """
+    for member in members:
+        ref = int(member.get('ref'))
+        if member.get('type') == 'node':
+            add_cached_nodes(osm_xml_data, osm_cache, [ref], added_nodes)
+        elif member.get('type') == 'way' and ref not in added_ways:
+            added_ways.add(ref)
+            way = osm_cache.get(ref, OSM_object_type.way)
+            if way is None:
+                logging.warning('Member way %s is missing from the cache.', ref)
+                continue
+            way_data = etree.SubElement(osm_xml_data, 'way', list_osm_way(ref, way))
+            for n in way.get('osm_nodes') or []:
+                etree.SubElement(way_data, 'nd', ref=str(n))
+            for k, v in sorted((way.get('osm_live_tags') or {}).items()):
+                etree.SubElement(way_data, 'tag', k=k, v='{}'.format(v))
+            add_cached_nodes(osm_xml_data, osm_cache, way.get('osm_nodes') or [], added_nodes)
+
+
 def add_osm_link_comment(osm_id: int, osm_type) -> str:
     """Create OpenStreetMap osm.org link from OSM object
 
@@ -180,19 +287,18 @@ def generate_osm_xml(df, session=None):
     Returns:
         [type]: [description]
     """
-    db = POIBase('{}://{}:{}@{}:{}/{}'.format(config.get_database_type(), config.get_database_writer_username(),
-                                              config.get_database_writer_password(),
-                                              config.get_database_writer_host(),
-                                              config.get_database_writer_port(),
-                                              config.get_database_poi_database()))
-    pgsql_pool = db.pool
-    session_factory = sessionmaker(pgsql_pool)
-    Session = scoped_session(session_factory)
-    session = Session()
+    db = get_poi_base()
+    # Cached nodes and relation members are loaded together instead of one query per node
+    osm_cache = get_osm_cache(db)
+    try:
+        preload_osm_cache(osm_cache, df, db)
+    except Exception as e:
+        logging.warning('Preloading cached OSM objects has failed: %s', e)
     osm_xml_data = etree.Element('osm', version='0.6', generator='JOSM')
     default_osm_id = -1
     current_osm_id = default_osm_id
-    added_nodes = []
+    added_nodes = set()
+    added_ways = set()
     try:
         for index, row in df.iterrows():
             tags = {}
@@ -214,21 +320,9 @@ def generate_osm_xml(df, session=None):
                     node_data = []
                     for n in row.get('osm_nodes'):
                         data = etree.SubElement(main_data, 'nd', ref=str(n))
-                    if session is not None:
-                        # Go through the list except the last value (which is same as the first)
-                        for n in row.get('osm_nodes'):
-                            # Add nodes only when it is not already added.
-                            if n not in added_nodes:
-                                added_nodes.append(n)
-                                way_node = db.query_from_cache(n, OSM_object_type.node)
-                                if way_node is not None:
-                                    node_data = etree.SubElement(osm_xml_data, 'node',
-                                                                 list_osm_node(n, way_node, 'osm'))
-                                    if node_data.get('osm_live_tags') is not None and \
-                                       node_data.get('osm_live_tags') != '':
-                                        node_osm_live_tags = node_data.get('osm_live_tags')
-                                        for k, v in sorted(node_osm_live_tags).items():
-                                            xml_node_tags = etree.SubElement(node_data, 'tag', k=k, v='{}'.format(v))
+                    added_ways.add(current_osm_id)
+                    # Add nodes only when it is not already added.
+                    add_cached_nodes(osm_xml_data, osm_cache, row.get('osm_nodes'), added_nodes)
                 except TypeError as e:
                     logging.warning('Missing nodes on this way: %s.', row.get('osm_id'))
                     logging.exception('Exception occurred')
@@ -240,6 +334,8 @@ def generate_osm_xml(df, session=None):
                     for i in relations:
                         data = etree.SubElement(main_data, 'member', type=i.get('type'), ref=i.get('ref'),
                                                 role=i.get('role'))
+                    # Members are cached by the full object download of the relation
+                    add_cached_members(osm_xml_data, osm_cache, relations, added_nodes, added_ways)
                 except TypeError as e:
                     logging.warning('Missing nodes on this relation: %s.', row['osm_id'])
                     logging.exception('Exception occurred')
@@ -256,6 +352,12 @@ def generate_osm_xml(df, session=None):
                     else:
                         comment = etree.Comment(' OSM <-> POI distance: Non exist')
                     osm_xml_data.append(comment)
+                if row.get('osm_score') is not None and not (isinstance(row.get('osm_score'), float) and
+                                                             math.isnan(row.get('osm_score'))):
+                    comment = etree.Comment(' Match score: {}; runner-up: {} {} score {} '.format(
+                        row.get('osm_score'), row.get('osm_runner_up_node'), row.get('osm_runner_up_id'),
+                        row.get('osm_runner_up_score')))
+                    osm_xml_data.append(comment)
                 if 'poi_good' in row and 'poi_bad' in row:
                     comment = etree.Comment(' Checker good: {}; bad {}'.format(row.get('poi_good'), row.get('poi_bad')))
                     osm_xml_data.append(comment)
@@ -416,10 +518,6 @@ def generate_osm_xml(df, session=None):
                 osm_xml_data.append(comment)
             except Exception as e:
                 logging.exception('Exception occurred')
-            try:
-                osm_xml_data.append(xml_node_tags)
-            except UnboundLocalError as e:
-                logging.debug('Unbound local error extra node tags')
             try:
                 osm_xml_data.append(main_data)
                 # Next deafult OSM id is one more less for non existing objects
@@ -433,5 +531,5 @@ def generate_osm_xml(df, session=None):
     except Exception as e:
         logging.error(e)
         logging.exception('Exception occurred')
-
+    osm_cache.log_stats()
     return lxml.etree.tostring(osm_xml_data, pretty_print=True, xml_declaration=True, encoding="UTF-8")
@@ -3,13 +3,20 @@
 try:
     import logging
     import sys
+    import numpy as np
     from scipy.spatial import distance
+    from shapely.affinity import affine_transform
+    from shapely.geometry import Point
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
     logging.exception('Exception occurred')
 
     sys.exit(128)
 
+# Radius of the sphere used by PostGIS ST_DistanceSphere() in meter
+EARTH_RADIUS = 6370986
+METERS_PER_DEGREE = EARTH_RADIUS * np.pi / 180
+
 
 def closest_point(point, points):
     # Find closest point from a list of points
@@ -40,3 +47,34 @@ def finding_closest(data1, data2):
     logging.info('Selecting matching name')
     data2['stop_name'] = [match_value(data1, 'point', x, 'stop_name') for x in data2['closest']]
     return data2
+
+
+def sphere_xyz(lon, lat):
+    # Convert coordinates to points of the unit sphere, euclidean distance of them is the chord length
+    lon, lat = np.radians(np.asarray(lon, dtype=float)), np.radians(np.asarray(lat, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def chord_length(meters):
+    # Chord length on the unit sphere that belongs to a great circle distance specified in meter
+    return 2 * np.sin(np.minimum(np.asarray(meters, dtype=float) / EARTH_RADIUS, np.pi) / 2)
+
+
+def distance_sphere(lon1, lat1, lon2, lat2):
+    # Great circle distance in meter between coordinates (like ST_DistanceSphere() of points)
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def distance_sphere_geometry(geom, lon, lat):
+    # Distance in meter between a geometry and a coordinate (like ST_DistanceSphere()). Non point geometries are
+    # projected to a local plane around the coordinate, that is accurate within the POI search distances.
+    if geom is None:
+        return np.inf
+    if geom.geom_type == 'Point':
+        return float(distance_sphere(geom.x, geom.y, lon, lat))
+    scale = np.cos(np.radians(lat))
+    local = affine_transform(geom, [scale * METERS_PER_DEGREE, 0, 0, METERS_PER_DEGREE,
+                                    -lon * scale * METERS_PER_DEGREE, -lat * METERS_PER_DEGREE])
+    return local.distance(Point(0, 0))
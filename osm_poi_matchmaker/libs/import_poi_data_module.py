@@ -6,8 +6,7 @@ try:
     import logging
     import sys
     import os
-    from sqlalchemy.orm import scoped_session, sessionmaker
-    from osm_poi_matchmaker.dao.poi_base import POIBase
+    from osm_poi_matchmaker.dao.poi_base import get_poi_base
     from osm_poi_matchmaker.utils import config, dataproviders_loader
     from osm_poi_matchmaker.dao.data_handlers import insert_type, get_or_create
 except ImportError as err:
@@ -23,16 +22,10 @@ def import_poi_data_module(module: str):
     Args:
         module (str): Name of module to run
     """    
+    session = None
     try:
-        db = POIBase('{}://{}:{}@{}:{}/{}'.format(config.get_database_type(), config.get_database_writer_username(),
-                                                  config.get_database_writer_password(),
-                                                  config.get_database_writer_host(),
-                                                  config.get_database_writer_port(),
-                                                  config.get_database_poi_database()))
-        pgsql_pool = db.pool
-        session_factory = sessionmaker(pgsql_pool)
-        Session = scoped_session(session_factory)
-        session = Session()
+        db = get_poi_base()
+        session = db.session
         module = module.strip()
         logging.info('Processing %s module ...', module)
         if module == 'hu_kh_bank':
@@ -70,3 +63,7 @@ def import_poi_data_module(module: str):
     except Exception as err:
         logging.error(err)
         logging.exception('Exception occurred')
+    finally:
+        # The engine of the process is shared, its connection goes back to the pool
+        if session is not None:
+            session.close()
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import time
+    import pandas as pd
+    from osmapi import OsmApi, ApiError
+    from osm_poi_matchmaker.dao.poi_base import clean_value, PLANET_METADATA_COLUMNS
+    from osm_poi_matchmaker.dao.data_structure import OSM_object_type
+    from osm_poi_matchmaker.utils import config
+    from osm_poi_matchmaker.libs.osm_cache import get_osm_cache
+    from osm_poi_matchmaker.libs.osm import relationer
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+RETRY = 3
+
+# Multi-object calls of the OSM API by object type: osmapi method names (CamelCase before osmapi 4) and the path of
+# the call, its URL is /api/0.6/<path>?<path>=<id>,<id>,...
+MULTI_OBJECT_CALLS = {OSM_object_type.node: ('NodesGet', 'nodes_get', 'nodes'),
+                      OSM_object_type.way: ('WaysGet', 'ways_get', 'ways'),
+                      OSM_object_type.relation: ('RelationsGet', 'relations_get', 'relations')}
+# Full object calls (/api/0.6/<type>/<id>/full): the object with its nodes (and the members of relations)
+FULL_OBJECT_CALLS = {OSM_object_type.way: ('WayFull', 'way_full'),
+                     OSM_object_type.relation: ('RelationFull', 'relation_full')}
+# Ways and relations are downloaded first, nodes that did not arrive with them are downloaded at the end
+DOWNLOAD_ORDER = (OSM_object_type.way, OSM_object_type.relation, OSM_object_type.node)
+# Relations are loaded from the planet tables first, then their member ways, then all nodes
+PLANET_ORDER = (OSM_object_type.relation, OSM_object_type.way, OSM_object_type.node)
+# Not null metadata columns of poi_osm_cache
+CACHE_METADATA_COLUMNS = ('osm_version', 'osm_changeset', 'osm_timestamp')
+# Sources of live tags
+SOURCE_API = 'api'
+SOURCE_PLANET = 'planet'
+
+
+def api_method(api, *names):
+    '''
+    Get a method of the OSM API client by the first name it has
+    '''
+    for name in names:
+        method = getattr(api, name, None)
+        if method is not None:
+            return method
+    raise AttributeError('OSM API client has none of {} methods'.format(', '.join(names)))
+
+
+def id_batches(osm_ids, path, max_url_length):
+    '''
+    Split object ids into batches of multi-object calls whose URL fits in the length limit
+    :param osm_ids: List of OSM API ids
+    :param path: Path of the multi-object call, see MULTI_OBJECT_CALLS
+    :param max_url_length: Maximal length of the URL path and query
+    :return: Generator of id lists, an id longer than the limit gets a batch alone
+    '''
+    base_length = len('/api/0.6/{0}?{0}='.format(path))
+    batch, length = [], base_length
+    for osm_id in osm_ids:
+        size = len(str(osm_id)) + (1 if batch else 0)
+        if batch and length + size > max_url_length:
+            yield batch
+            batch, length, size = [], base_length, len(str(osm_id))
+        batch.append(osm_id)
+        length += size
+    if batch:
+        yield batch
+
+
+def cache_row(object_type, element):
+    '''
+    POI_OSM_cache row of an OSM object downloaded from the OSM API
+    :param object_type: OSM_object_type of the object
+    :param element: Dictionary of the object returned by osmapi
+    :return: Dictionary of POI_OSM_cache columns, the nodes of ways and the members of relations are in osm_nodes
+    '''
+    return {'osm_id': int(element.get('id')),
+            'osm_live_tags': element.get('tag'),
+            'osm_version': element.get('version'),
+            'osm_user': element.get('user'),
+            'osm_user_id': element.get('uid'),
+            'osm_changeset': element.get('changeset'),
+            'osm_timestamp': element.get('timestamp'),
+            'osm_object_type': object_type,
+            'osm_lat': element.get('lat'),
+            'osm_lon': element.get('lon'),
+            'osm_nodes': element.get('nd') if object_type == OSM_object_type.way else element.get('member')}
+
+
+def planet_row(object_type, record):
+    '''
+    POI_OSM_cache row of an OSM object loaded from the planet tables, see POIBase.query_planet_objects_pd()
+    :param object_type: OSM_object_type of the object
+    :param record: Dictionary of the query row
+    :return: Dictionary of POI_OSM_cache columns in the format of cache_row()
+    '''
+    tags = record.get('tags')
+    # Tags of the middle tables are text arrays of keys and values
+    if isinstance(tags, (list, tuple)):
+        tags = dict(zip(tags[0::2], tags[1::2]))
+    # Metadata is in the hstore column too when the import had --extra-attributes
+    tags = {k: v for k, v in (tags or {}).items() if k not in PLANET_METADATA_COLUMNS}
+    metadata = {c: None if record.get(c) is None or pd.isnull(record.get(c)) else record.get(c)
+                for c in PLANET_METADATA_COLUMNS + ('osm_lat', 'osm_lon')}
+    members = record.get('members')
+    if members is None or object_type == OSM_object_type.node:
+        nodes = None
+    elif object_type == OSM_object_type.way:
+        nodes = [int(n) for n in members]
+    else:
+        nodes = [{'type': m['type'], 'ref': int(m['ref']), 'role': m['role']} for m in relationer(members)]
+    return {'osm_id': int(record.get('osm_id')),
+            'osm_live_tags': tags,
+            'osm_version': int(metadata['osm_version']) if metadata['osm_version'] is not None else None,
+            'osm_user': metadata['osm_user'],
+            'osm_user_id': int(metadata['osm_uid']) if metadata['osm_uid'] is not None else None,
+            'osm_changeset': int(metadata['osm_changeset']) if metadata['osm_changeset'] is not None else None,
+            'osm_timestamp': metadata['osm_timestamp'],
+            'osm_object_type': object_type,
+            'osm_lat': metadata['osm_lat'],
+            'osm_lon': metadata['osm_lon'],
+            'osm_nodes': nodes}
+
+
+class LiveTagFetcher:
+    '''
+    Live tags of the matched OSM objects of a matcher chunk. Objects are collected during matching, then the ones
+    missing from poi_osm_cache are downloaded and stored in poi_osm_cache in bulk. Ways and relations are downloaded
+    by full object calls with all their nodes (and members) in one response, nodes by multi-object calls. Without
+    full object calls ways and relations are downloaded by multi-object calls too, then the nodes of the ways.
+    With planet source the objects are loaded from the planet tables in bulk instead, the OSM API is used only for
+    objects missing from the planet snapshot when refresh is enabled.
+
+    :param db: POIBase instance
+    :param api: OSM API client (osmapi.OsmApi), default uses matcher.live.tags.api
+    :param max_url_length: URL length limit of multi-object calls, default is matcher.live.tags.url.length
+    :param full: Use full object calls for ways and relations, default is matcher.live.tags.full
+    :param cache: OSMCache of poi_osm_cache reads, default is the cache of the process
+    :param validate: Download cached objects again when the planet tables have a newer version, default is
+      matcher.osm.cache.validate
+    :param source: SOURCE_API or SOURCE_PLANET, default is matcher.live.tags.source
+    :param refresh: Download objects missing from the planet tables with planet source, default is
+      matcher.live.tags.refresh
+    '''
+
+    def __init__(self, db, api=None, max_url_length=None, full=None, cache=None, validate=None, source=None,
+                 refresh=None):
+        self.__db = db
+        self.__cache = cache if cache is not None else get_osm_cache(db)
+        self.__api = api if api is not None else OsmApi(api=config.get_matcher_live_tags_api())
+        self.__max_url_length = max_url_length or config.get_matcher_live_tags_url_length()
+        self.__full = config.get_matcher_live_tags_full() if full is None else full
+        self.__validate = config.get_matcher_osm_cache_validate() if validate is None else validate
+        self.__source = config.get_matcher_live_tags_source() if source is None else source
+        self.__refresh = config.get_matcher_live_tags_refresh() if refresh is None else refresh
+        self.__wanted = {t: set() for t in OSM_object_type}
+        # POI_OSM_cache rows keyed by (OSM_object_type, osm_id)
+        self.__objects = {}
+        self.stats = {'objects': 0, 'cached': 0, 'planet': 0, 'downloaded': 0, 'requests': 0, 'missing': 0}
+
+    def __len__(self):
+        return len(self.__objects)
+
+    def add(self, osm_id, object_type):
+        '''
+        Add a matched OSM object to the next fetch()
+        :param osm_id: osm_id of the object, relations may be negative as in the planet tables
+        :param object_type: OSM_object_type of the object
+        '''
+        osm_id = clean_value(osm_id)
+        if osm_id is not None and object_type in self.__wanted:
+            self.__wanted[object_type].add(abs(int(osm_id)))
+
+    def get(self, osm_id, object_type):
+        '''
+        Live tags of a fetched OSM object
+        :return: Dictionary of tags or None when the object is not available
+        '''
+        osm_id = clean_value(osm_id)
+        row = self.__objects.get((object_type, abs(int(osm_id)))) if osm_id is not None else None
+        return row.get('osm_live_tags') if row is not None else None
+
+    def __load_cached(self, object_type, osm_ids):
+        # Objects of poi_osm_cache, the others have to be downloaded
+        self.__cache.load(object_type, osm_ids)
+        if self.__validate:
+            try:
+                self.__cache.validate(object_type, osm_ids)
+            except Exception as e:
+                logging.warning('Validation of cached OSM objects has failed: %s', e)
+                logging.exception('Exception occurred')
+        for osm_id in osm_ids:
+            row = self.__cache.get(osm_id, object_type)
+            if row is not None:
+                self.__objects[(object_type, osm_id)] = row
+                self.stats['cached'] += 1
+        return [i for i in sorted(osm_ids) if (object_type, i) not in self.__objects]
+
+    def __load_planet(self, object_type, osm_ids):
+        # Objects of the planet tables, untagged nodes (like the nodes of ways) have coordinates only
+        data = self.__db.query_planet_objects_pd(object_type, osm_ids)
+        rows = [planet_row(object_type, r) for r in data.to_dict('records')]
+        if object_type == OSM_object_type.node:
+            found = {r['osm_id'] for r in rows}
+            untagged = [i for i in osm_ids if i not in found]
+            if untagged:
+                data = self.__db.query_planet_nodes_pd(untagged)
+                rows.extend(planet_row(object_type, r) for r in data.to_dict('records'))
+        for row in rows:
+            self.__objects[(object_type, row['osm_id'])] = row
+            # Nodes of ways and members of relations are needed by the OSM XML export
+            if object_type == OSM_object_type.way:
+                self.__wanted[OSM_object_type.node].update(row['osm_nodes'] or [])
+            elif object_type == OSM_object_type.relation:
+                for member in row['osm_nodes'] or []:
+                    if member['type'] in ('node', 'way'):
+                        self.__wanted[OSM_object_type[member['type']]].add(member['ref'])
+        self.stats['planet'] += len(rows)
+        return rows
+
+    def __download_batch(self, method, osm_ids):
+        # Response of one multi-object (or full object) call, a batch with missing (or deleted) objects is split to
+        # find them
+        for rtc in range(0, RETRY):
+            try:
+                self.stats['requests'] += 1
+                return method(osm_ids)
+            except ApiError as e:
+                if getattr(e, 'status', None) not in (404, 410):
+                    logging.warning('Download of OSM objects has failed (%s/%s): %s', rtc + 1, RETRY, e)
+                    continue
+                if not isinstance(osm_ids, list) or len(osm_ids) == 1:
+                    logging.warning('OSM object %s is missing from the OSM API.',
+                                    osm_ids[0] if isinstance(osm_ids, list) else osm_ids)
+                    self.stats['missing'] += 1
+                    return {}
+                half = len(osm_ids) // 2
+                elements = self.__download_batch(method, osm_ids[:half])
+                elements.update(self.__download_batch(method, osm_ids[half:]))
+                return elements
+            except Exception as e:
+                logging.warning('Download of OSM objects has failed (%s/%s): %s', rtc + 1, RETRY, e)
+        return {}
+
+    def __download_full(self, object_type, osm_ids):
+        # Objects with all elements of their full object calls, elements that are already known are skipped
+        method = api_method(self.__api, *FULL_OBJECT_CALLS[object_type])
+        rows = []
+        for osm_id in osm_ids:
+            for element in self.__download_batch(method, osm_id):
+                row = cache_row(OSM_object_type[element.get('type')], element.get('data'))
+                key = (row['osm_object_type'], row['osm_id'])
+                if key not in self.__objects:
+                    self.__objects[key] = row
+                    rows.append(row)
+        self.stats['downloaded'] += len(rows)
+        return rows
+
+    def __download(self, object_type, osm_ids):
+        method_names = MULTI_OBJECT_CALLS[object_type]
+        method = api_method(self.__api, *method_names[:2])
+        rows = []
+        for batch in id_batches(osm_ids, method_names[2], self.__max_url_length):
+            for element in self.__download_batch(method, batch).values():
+                row = cache_row(object_type, element)
+                self.__objects[(object_type, row['osm_id'])] = row
+                rows.append(row)
+        self.stats['downloaded'] += len(rows)
+        return rows
+
+    def __uncached(self, rows):
+        # Elements of full object calls may be in poi_osm_cache already (like nodes shared with other ways)
+        result = []
+        for object_type in OSM_object_type:
+            typed = [r for r in rows if r['osm_object_type'] == object_type]
+            if typed:
+                self.__cache.load(object_type, [r['osm_id'] for r in typed])
+                result.extend(r for r in typed if self.__cache.get(r['osm_id'], object_type) is None)
+        return result
+
+    def fetch(self):
+        '''
+        Load the added objects from poi_osm_cache and download (or load from the planet tables) the missing ones
+        :return: Number of downloaded (or planet) objects
+        '''
+        started = time.perf_counter()
+        rows = []
+        planet = self.__source == SOURCE_PLANET
+        for object_type in PLANET_ORDER if planet else DOWNLOAD_ORDER:
+            osm_ids = {i for i in self.__wanted[object_type] if (object_type, i) not in self.__objects}
+            self.__wanted[object_type] = set()
+            if not osm_ids:
+                continue
+            self.stats['objects'] += len(osm_ids)
+            missing = self.__load_cached(object_type, osm_ids)
+            if missing and planet:
+                rows.extend(self.__load_planet(object_type, missing))
+                missing = [i for i in missing if (object_type, i) not in self.__objects]
+                if missing and not self.__refresh:
+                    logging.warning('OSM %s objects are missing from the planet tables: %s', object_type.name, missing)
+                    self.stats['missing'] += len(missing)
+                    continue
+            if not missing:
+                continue
+            if self.__full and object_type in FULL_OBJECT_CALLS:
+                rows.extend(self.__download_full(object_type, missing))
+                continue
+            downloaded = self.__download(object_type, missing)
+            if object_type == OSM_object_type.way:
+                # Nodes of downloaded ways are needed by the OSM XML export
+                for row in downloaded:
+                    for node_id in row['osm_nodes'] or []:
+                        self.__wanted[OSM_object_type.node].add(int(node_id))
+            rows.extend(downloaded)
+        try:
+            stored = self.__uncached(rows)
+            # Planet objects without metadata (like untagged nodes) are kept in memory only
+            self.__db.add_osm_cache([r for r in stored if all(r.get(c) is not None for c in CACHE_METADATA_COLUMNS)])
+            self.__cache.put(stored)
+        except Exception as e:
+            logging.warning('Storing downloaded OSM objects in the cache has failed: %s', e)
+            logging.exception('Exception occurred')
+        logging.info('Live tags of %s OSM objects: %s cached, %s from planet, %s downloaded by %s requests, %s missing '
+                     'in %.3f s.', self.stats['objects'], self.stats['cached'], self.stats['planet'],
+                     self.stats['downloaded'], self.stats['requests'], self.stats['missing'],
+                     time.perf_counter() - started)
+        return len(rows)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import re
+    from osm_poi_matchmaker.dao.poi_base import clean_value
+    from osm_poi_matchmaker.dao.data_structure import OSM_object_type
+    from osm_poi_matchmaker.libs.candidate_index import lower_values
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+class NameClassifier:
+    '''
+    Combined matcher of the search names (and avoid names) of all POI commons. Every OSM name is evaluated only once:
+    distinct names are memoised and names that match none of the search names are dropped by one combined regular
+    expression.
+
+    :param comm_data: POI common dataframe with poi_code, poi_search_name and poi_search_avoid_name columns
+    '''
+
+    def __init__(self, comm_data):
+        # POI codes keyed by (pattern, avoid) pairs
+        self.__codes = {}
+        for code, name, avoid_name in zip(comm_data['poi_code'], comm_data['poi_search_name'],
+                                          comm_data['poi_search_avoid_name']):
+            for pattern, avoid in ((name, False), (avoid_name, True)):
+                pattern = clean_value(pattern)
+                if pattern is not None and pattern != '':
+                    self.__codes.setdefault((str(pattern), avoid), []).append(code)
+        self.__keys = []
+        self.__regexes = []
+        for key in self.__codes:
+            # Case insensitive match of lowercase pattern, like ~* LOWER(TEXT(:name)) in SQL
+            try:
+                self.__regexes.append(re.compile(key[0].lower(), re.IGNORECASE))
+                self.__keys.append(key)
+            except re.error as e:
+                logging.warning('Search name %s of POI codes %s is not a valid regular expression: %s', key[0],
+                                self.__codes[key], e)
+        try:
+            self.__combined = re.compile('|'.join('(?:{})'.format(r.pattern) for r in self.__regexes),
+                                         re.IGNORECASE) if self.__regexes else None
+        except re.error:
+            # Patterns that are valid alone but not together (like inline flags) are checked one by one
+            self.__combined = re.compile('') if self.__regexes else None
+        self.__memo = {}
+        self.stats = {'names': 0, 'distinct': 0, 'matched': 0}
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __matches(self, text):
+        # Positions of matching patterns of a lowercase name
+        if text is None:
+            return ()
+        self.stats['names'] += 1
+        if text not in self.__memo:
+            self.stats['distinct'] += 1
+            if self.__combined is None or self.__combined.search(text) is None:
+                self.__memo[text] = ()
+            else:
+                self.__memo[text] = tuple(p for p, r in enumerate(self.__regexes) if r.search(text) is not None)
+                self.stats['matched'] += 1 if self.__memo[text] else 0
+        return self.__memo[text]
+
+    def classify(self, objects):
+        '''
+        Tag OSM objects with the POI codes they could match
+        :param objects: DataFrame of OSM objects with osm_id, node, name and brand columns, see
+          POIBase.query_osm_named_objects_pd()
+        :return: List of dictionaries with POI_OSM_candidate columns, poi_avoid is True when the name or brand
+          matches the avoid name of the POI code
+        '''
+        candidates = []
+        for osm_id, node, name, brand in zip(objects['osm_id'], objects['node'], lower_values(objects['name']),
+                                             lower_values(objects['brand'])):
+            positions = set(self.__matches(name)) | set(self.__matches(brand))
+            for position in sorted(positions):
+                pattern, avoid = self.__keys[position]
+                for code in self.__codes[(pattern, avoid)]:
+                    candidates.append({'osm_id': int(osm_id), 'osm_object_type': OSM_object_type[node],
+                                       'poi_code': code, 'poi_avoid': avoid})
+        return candidates
+
+    def log_stats(self):
+        logging.info('Name classifier: %s patterns, %s names, %s distinct names, %s matching names.',
+                     len(self), self.stats['names'], self.stats['distinct'], self.stats['matched'])
+
+
+def build_poi_osm_candidates(db, comm_data):
+    '''
+    Reverse classification of OSM objects: tag every OSM object of the POI types in use with the POI codes whose
+    search name it matches and store them in the poi_osm_candidate table. In candidate name matching mode the matcher
+    only checks these tags instead of evaluating the search names again POI by POI.
+    :param db: POIBase instance
+    :param comm_data: POI common dataframe
+    :return: Number of stored candidate tags
+    '''
+    classifier = NameClassifier(comm_data)
+    objects = db.query_osm_named_objects_pd(comm_data['poi_type'])
+    candidates = classifier.classify(objects)
+    db.replace_poi_osm_candidates(candidates)
+    logging.info('Tagged %s named OSM objects with %s candidate POI codes.', len(objects), len(candidates))
+    classifier.log_stats()
+    return len(candidates)
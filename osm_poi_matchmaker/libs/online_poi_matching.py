@@ -5,63 +5,136 @@ __author__ = 'kami911'
 try:
     import logging
     import sys
+    import datetime
+    import hashlib
+    import time
+    import numpy as np
     import pandas as pd
-    from sqlalchemy.orm import scoped_session, sessionmaker
-    from osmapi import OsmApi
-    from osm_poi_matchmaker.dao.poi_base import POIBase
+    from osm_poi_matchmaker.dao.poi_base import get_poi_base, clean_value, search_distances
     from osm_poi_matchmaker.utils import config
-    from osm_poi_matchmaker.dao.data_structure import OSM_object_type, POI_OSM_cache
+    from osm_poi_matchmaker.utils.timing import SlowestItems
+    from osm_poi_matchmaker.dao.data_structure import OSM_object_type
     from osm_poi_matchmaker.libs.osm import query_postcode_osm_external
-    from osm_poi_matchmaker.dao.data_handlers import get_or_create_cache
+    from osm_poi_matchmaker.libs.candidate_index import get_candidate_index
+    from osm_poi_matchmaker.libs.postcode_resolver import get_postcode_resolver
+    from osm_poi_matchmaker.libs.building_index import BuildingIndex, address_key
+    from osm_poi_matchmaker.libs.tile_cache import TileCache
+    from osm_poi_matchmaker.libs.candidate_scoring import best_candidate
+    from osm_poi_matchmaker.libs.tier_planner import TierStats, load_tier_plans
+    from osm_poi_matchmaker.libs.live_tags import LiveTagFetcher
+    from osm_poi_matchmaker.libs.osm_cache import get_osm_cache
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
     logging.exception('Exception occurred')
 
     sys.exit(128)
 
-RETRY = 3
+# poi_osm schema check of this process
+__memo_schema = {}
+
+# Columns written by the matcher: they are collected POI by POI in lists and assigned to the dataframe at the end
+MATCH_COLUMNS = ['poi_lat', 'poi_lon', 'poi_postcode', 'poi_new', 'poi_distance', 'osm_id', 'osm_node', 'osm_version',
+                 'osm_changeset', 'osm_timestamp', 'osm_nodes', 'osm_live_tags', 'osm_score', 'osm_runner_up_id',
+                 'osm_runner_up_node', 'osm_runner_up_score']
 
 
 def online_poi_matching(args):
-    data, comm_data = args
+    # Optional third argument: OSMChanges of incremental mode
+    data, comm_data, changes = args if len(args) > 2 else tuple(args) + (None,)
+    session = None
     try:
-        db = POIBase('{}://{}:{}@{}:{}/{}'.format(config.get_database_type(), config.get_database_writer_username(),
-                                                  config.get_database_writer_password(),
-                                                  config.get_database_writer_host(),
-                                                  config.get_database_writer_port(),
-                                                  config.get_database_poi_database()))
-        pgsql_pool = db.pool
-        session_factory = sessionmaker(pgsql_pool)
-        Session = scoped_session(session_factory)
-        session = Session()
-        osm_live_query = OsmApi()
-        for i, row in data.iterrows():
-            # for i, row in data[data['poi_code'].str.contains('posta')].iterrows():
+        db = get_poi_base()
+        session = db.session
+        live_tags = LiveTagFetcher(db)
+        poi_types = dict(zip(comm_data['pc_id'], comm_data['poi_type']))
+        try:
+            postcode_resolver = get_postcode_resolver(db)
+        except Exception as e:
+            # Postcodes are queried POI by POI
+            logging.warning('Loading postal code boundaries has failed: %s', e)
+            postcode_resolver = None
+        memo = config.get_matcher_memo() and memo_schema_current(db)
+        memo_matches, memo_matched = memo_poi_matching(db, data, comm_data, changes) if memo \
+            else ({}, set())
+        # Only the changed POIs are matched again
+        changed_data = data[~data['pa_id'].isin(memo_matched)] if memo_matched else data
+        if config.get_matcher_mode() == 'batch':
+            batch_matches, batch_matched = batch_poi_matching(db, changed_data, comm_data)
+        elif config.get_matcher_mode() == 'index':
+            batch_matches, batch_matched = index_poi_matching(db, changed_data, comm_data)
+        else:
+            batch_matches, batch_matched = {}, set()
+        batch_matches.update(memo_matches)
+        batch_matched.update(memo_matched)
+        # POI by POI queries are answered from cached tiles
+        shop_poi_source = TileCache(db) if config.get_matcher_tile_cache() else db
+        # Round trips of the cascade are planned by POI code from the tier statistics of previous runs
+        tier_stats = TierStats() if config.get_matcher_tier_stats() else None
+        tier_plans = {}
+        if tier_stats is not None:
+            try:
+                tier_plans = load_tier_plans(db)
+            except Exception as e:
+                logging.warning('Loading tier statistics has failed: %s', e)
+        # The POI by POI lookups with the longest time and their query shapes are reported
+        slowest = SlowestItems(config.get_matcher_slow_report_size())
+        decisions = []
+        new_pois = []
+        members = []
+        live_tag_positions = []
+        # Per POI inputs are plain dictionaries, outputs are column lists
+        records = data.to_dict('records')
+        columns = {c: data[c].tolist() if c in data else [None] * len(records) for c in MATCH_COLUMNS}
+        for i, row in enumerate(records):
             try:
-                # Try to search OSM POI with same type, and name contains poi_search_name within the specified distance
-                osm_query = db.query_osm_shop_poi_gpd(row.get('poi_lon'), row.get('poi_lat'),
-                                                      comm_data.loc[comm_data['pc_id'] == row.get('poi_common_id')][
-                                                          'poi_type'].values[0], row.get('poi_search_name'),
-                                                      row.get('poi_search_avoid_name'),
-                                                      row.get('poi_addr_street'), row.get('poi_addr_housenumber'),
-                                                      row.get('poi_conscriptionnumber'), row.get('poi_city'),
-                                                      row.get('osm_search_distance_perfect'),
-                                                      row.get('osm_search_distance_safe'),
-                                                      row.get('osm_search_distance_unsafe'))
+                if row.get('pa_id') in batch_matched:
+                    # Already resolved by the set based batch matcher or the candidate index
+                    osm_query = batch_matches.get(row.get('pa_id'))
+                elif config.get_matcher_mode() == 'score':
+                    started = time.perf_counter()
+                    osm_query = score_poi_matching(db, row, poi_types.get(row.get('poi_common_id')))
+                    slowest.add(time.perf_counter() - started, (row.get('pa_id'), row.get('poi_code'), 'score'))
+                else:
+                    # Round trips of the cascade planned by POI code, None is the default plan
+                    tier_groups = tier_plans.get(row.get('poi_code'))
+                    started = time.perf_counter()
+                    # Try to search OSM POI with same type, and name contains poi_search_name within the specified distance
+                    osm_query = shop_poi_source.query_osm_shop_poi_gpd(row.get('poi_lon'), row.get('poi_lat'),
+                                                                       poi_types.get(row.get('poi_common_id')),
+                                                                       row.get('poi_search_name'),
+                                                                       row.get('poi_search_avoid_name'),
+                                                                       row.get('poi_addr_street'),
+                                                                       row.get('poi_addr_housenumber'),
+                                                                       row.get('poi_conscriptionnumber'),
+                                                                       row.get('poi_city'),
+                                                                       row.get('osm_search_distance_perfect'),
+                                                                       row.get('osm_search_distance_safe'),
+                                                                       row.get('osm_search_distance_unsafe'),
+                                                                       tier_groups=tier_groups)
+                    slowest.add(time.perf_counter() - started, (row.get('pa_id'), row.get('poi_code'),
+                                                                ', '.join(db.last_query_shape)
+                                                                if shop_poi_source is db else 'tile cache'))
+                if tier_stats is not None and row.get('pa_id') not in memo_matched:
+                    tier_stats.add(row.get('poi_code'), osm_query)
+                # Reused decisions of incremental mode are stored again with the current OSM snapshot
+                if memo and (row.get('pa_id') not in memo_matched or changes is not None):
+                    decisions.append(poi_osm_match(row, poi_types.get(row.get('poi_common_id')), osm_query))
                 # Enrich our data with OSM database POI metadata
                 if osm_query is not None:
                     row['poi_new'] = False
+                    # The matched OSM object as a plain dictionary
+                    osm_data = osm_query.to_dict('records')[0]
                     # Collect additional OSM metadata. Note: this needs style change during osm2pgsql
-                    osm_id = osm_query['osm_id'].values[0] if osm_query.get('osm_id') is not None else None
-                    osm_node = osm_query.get('node').values[0] if osm_query.get('node') is not None else None
+                    osm_id = osm_data.get('osm_id')
+                    osm_node = osm_data.get('node')
                     # Set OSM POI coordinates for all kind of geom
-                    lat = osm_query.get('lat').values[0]
-                    lon = osm_query.get('lon').values[0]
-                    if data.at[i, 'poi_lat'] != lat and data.at[i, 'poi_lon'] != lon:
+                    lat = osm_data.get('lat')
+                    lon = osm_data.get('lon')
+                    if columns['poi_lat'][i] != lat and columns['poi_lon'][i] != lon:
                         logging.info('Using new coodinates %s %s instead of %s %s.',
-                                     lat, lon, data.at[i, 'poi_lat'], data.at[i, 'poi_lon'])
-                        data.at[i, 'poi_lat'] = lat
-                        data.at[i, 'poi_lon'] = lon
+                                     lat, lon, columns['poi_lat'][i], columns['poi_lon'][i])
+                        columns['poi_lat'][i] = lat
+                        columns['poi_lon'][i] = lon
                     if osm_node == 'node':
                         osm_node = OSM_object_type.node
                     elif osm_node == 'way':
@@ -69,193 +142,462 @@ def online_poi_matching(args):
                     elif osm_node == 'relation':
                         osm_node = OSM_object_type.relation
                     else:
-                        logging.warning('Illegal state: %s', osm_query['node'].values[0])
-                    data.at[i, 'osm_id'] = osm_id
-                    data.at[i, 'osm_node'] = osm_node
+                        logging.warning('Illegal state: %s', osm_data.get('node'))
+                    columns['osm_id'][i] = osm_id
+                    columns['osm_node'][i] = osm_node
                     # Refine postcode
                     if row['preserve_original_post_code'] is not True:
                         # Current OSM postcode based on lat,long query.
-                        postcode = query_postcode_osm_external(config.get_geo_prefer_osm_postcode(), session, lon, lat, row.get('poi_postcode'))
+                        postcode = query_postcode_osm_external(config.get_geo_prefer_osm_postcode(), session, lon, lat,
+                                                               row.get('poi_postcode'), postcode_resolver)
                         force_postcode_change = False  # TODO: Has to be a setting in app.conf
                         if force_postcode_change is True:
                             # Force to use datasource postcode
                             if postcode != row.get('poi_postcode'):
                                 logging.info('Changing postcode from %s to %s.', row.get('poi_postcode'), postcode)
-                                data.at[i, 'poi_postcode'] = postcode
+                                columns['poi_postcode'][i] = postcode
                         else:
                             # Try to use smart method for postcode check
-                            ch_posctode = smart_postcode_check(row, osm_query, postcode)
+                            ch_posctode = smart_postcode_check(row, osm_data, postcode)
                             if ch_posctode is not None:
-                                data.at[i, 'poi_postcode'] = ch_posctode
+                                columns['poi_postcode'][i] = ch_posctode
                     else:
                         logging.info('Preserving original postcode %s', row.get('poi_postcode'))
-                    data.at[i, 'osm_version'] = osm_query['osm_version'].values[0] \
-                        if osm_query['osm_version'] is not None else None
-                    data.at[i, 'osm_changeset'] = osm_query['osm_changeset'].values[0] \
-                        if osm_query['osm_changeset'] is not None else None
-                    if osm_query['osm_timestamp'] is not None:
-                        osm_query['osm_timestamp'] = \
-                            data.at[i, 'osm_timestamp'] = pd.to_datetime(str((osm_query['osm_timestamp'].values[0])))
-                    else:
-                        osm_query['osm_timestamp'] = None
-                    data.at[i, 'poi_distance'] = osm_query.get('distance').values[0] if osm_query.get('distance') is not None else None
-                    # For OSM way also query node points
-                    if osm_node == OSM_object_type.way:
-                        logging.info('This is an OSM way looking for id %s nodes.', osm_id)
-                        # Add list of nodes to the dataframe
-                        nodes = db.query_ways_nodes(osm_id)
-                        data.at[i, 'osm_nodes'] = nodes
-                    elif osm_node == OSM_object_type.relation:
-                        logging.info('This is an OSM relation looking for id %s nodes.', osm_id)
-                        # Add list of relation nodes to the dataframe
-                        nodes = db.query_relation_nodes(osm_id)
-                        data.at[i, 'osm_nodes'] = nodes
+                    columns['osm_version'][i] = osm_data.get('osm_version')
+                    columns['osm_changeset'][i] = osm_data.get('osm_changeset')
+                    if osm_data.get('osm_timestamp') is not None:
+                        columns['osm_timestamp'][i] = pd.to_datetime(str(osm_data.get('osm_timestamp')))
+                    columns['poi_distance'][i] = osm_data.get('distance')
+                    # Score and the second best candidate of scoring matcher
+                    columns['osm_score'][i] = osm_data.get('score')
+                    columns['osm_runner_up_id'][i] = osm_data.get('runner_up_osm_id')
+                    columns['osm_runner_up_node'][i] = osm_data.get('runner_up_node')
+                    columns['osm_runner_up_score'][i] = osm_data.get('runner_up_score')
+                    # For OSM way and relation also query node points, they are loaded together after matching
+                    if osm_node in (OSM_object_type.way, OSM_object_type.relation):
+                        members.append((i, osm_node, osm_id))
                     logging.info('Old %s (not %s) type: %s POI within %s m: %s %s, %s %s (%s)',
-                                 data.at[i, 'poi_search_name'], data.at[i, 'poi_search_avoid_name'], 
-                                 data.at[i, 'poi_type'], data.at[i, 'poi_distance'],
-                                 data.at[i, 'poi_postcode'], data.at[i, 'poi_city'], data.at[i, 'poi_addr_street'],
-                                 data.at[i, 'poi_addr_housenumber'], data.at[i, 'poi_conscriptionnumber'])
-                    try:
-                        # Download OSM POI way live tags
-                        if osm_node == OSM_object_type.way:
-                            for rtc in range(0, RETRY):
-                                logging.info('Downloading OSM live tags to this way: %s.', osm_id)
-                                cached_way = db.query_from_cache(osm_id, osm_node)
-                                if cached_way is None:
-                                    live_tags_container = osm_live_query.WayGet(osm_id)
-                                    if live_tags_container is not None:
-                                        data.at[i, 'osm_live_tags'] = live_tags_container.get('tag')
-                                        cache_row = {'osm_id': int(osm_id),
-                                                     'osm_live_tags': live_tags_container.get('tag'),
-                                                     'osm_version': live_tags_container.get('version'),
-                                                     'osm_user': live_tags_container.get('user'),
-                                                     'osm_user_id': live_tags_container.get('uid'),
-                                                     'osm_changeset': live_tags_container.get('changeset'),
-                                                     'osm_timestamp': live_tags_container.get('timestamp'),
-                                                     'osm_object_type': osm_node,
-                                                     'osm_lat': None,
-                                                     'osm_lon': None,
-                                                     'osm_nodes': live_tags_container.get('nd')}
-                                        get_or_create_cache(session, POI_OSM_cache, **cache_row)
-                                        # Downloading referenced nodes of the way
-                                        for way_nodes in live_tags_container['nd']:
-                                            logging.debug('Getting node %s belongs to way %s', way_nodes, osm_id)
-                                            live_tags_node = osm_live_query.NodeGet(way_nodes)
-                                            cache_row = {'osm_id': int(way_nodes),
-                                                         'osm_live_tags': live_tags_node.get('tag'),
-                                                         'osm_version': live_tags_node.get('version'),
-                                                         'osm_user': live_tags_node.get('user'),
-                                                         'osm_user_id': live_tags_node.get('uid'),
-                                                         'osm_changeset': live_tags_node.get('changeset'),
-                                                         'osm_timestamp': live_tags_node.get('timestamp'),
-                                                         'osm_object_type': OSM_object_type.node,
-                                                         'osm_lat': live_tags_node.get('lat'),
-                                                         'osm_lon': live_tags_node.get('lon'),
-                                                         'osm_nodes': None}
-                                            get_or_create_cache(session, POI_OSM_cache, **cache_row)
-                                        break
-                                    else:
-                                        logging.warning('Download of external data has failed.')
-                                else:
-                                    data.at[i, 'osm_live_tags'] = cached_way.get('osm_live_tags')
-                                    break
-                            session.commit()
-                        # Download OSM POI node live tags
-                        elif osm_node == OSM_object_type.node:
-                            for rtc in range(0, RETRY):
-                                logging.info('Downloading OSM live tags to this node: %s.', osm_id)
-                                cached_node = db.query_from_cache(osm_id, osm_node)
-                                if cached_node is None:
-                                    live_tags_container = osm_live_query.NodeGet(osm_id)
-                                    if live_tags_container is not None:
-                                        data.at[i, 'osm_live_tags'] = live_tags_container.get('tag')
-                                        cache_row = {'osm_id': int(osm_id),
-                                                     'osm_live_tags': live_tags_container.get('tag'),
-                                                     'osm_version': live_tags_container.get('version'),
-                                                     'osm_user': live_tags_container.get('user'),
-                                                     'osm_user_id': live_tags_container.get('uid'),
-                                                     'osm_changeset': live_tags_container.get('changeset'),
-                                                     'osm_timestamp': live_tags_container.get('timestamp'),
-                                                     'osm_object_type': osm_node,
-                                                     'osm_lat': live_tags_container.get('lat'),
-                                                     'osm_lon': live_tags_container.get('lon'),
-                                                     'osm_nodes': None}
-                                        get_or_create_cache(session, POI_OSM_cache, **cache_row)
-                                        break
-                                    else:
-                                        logging.warning('Download of external data has failed.')
-                                else:
-                                    data.at[i, 'osm_live_tags'] = cached_node.get('osm_live_tags')
-                                    break
-                            session.commit()
-                        elif osm_node == OSM_object_type.relation:
-                            for rtc in range(0, RETRY):
-                                logging.info('Downloading OSM live tags to this relation: %s.', osm_id)
-                                live_tags_container = osm_live_query.RelationGet(abs(osm_id))
-                                if live_tags_container is not None:
-                                    data.at[i, 'osm_live_tags'] = live_tags_container.get('tag')
-                                    break
-                                else:
-                                    logging.warning('Download of external data has failed.')
-                            session.commit()
-                        else:
-                            logging.warning('Invalid state for live tags.')
-
-                    except Exception as e:
-                        logging.warning('There was an error during OSM request: %s.', e)
-                        logging.exception('Exception occurred')
-                        logging.warning('Live tag is: {}'.format(cached_node.get('osm_live_tags')))
+                                 row.get('poi_search_name'), row.get('poi_search_avoid_name'),
+                                 row.get('poi_type'), columns['poi_distance'][i],
+                                 columns['poi_postcode'][i], row.get('poi_city'), row.get('poi_addr_street'),
+                                 row.get('poi_addr_housenumber'), row.get('poi_conscriptionnumber'))
+                    # Live tags are fetched for the whole chunk after matching
+                    live_tags.add(osm_id, osm_node)
+                    live_tag_positions.append((i, osm_id, osm_node))
                 # This is a new POI
                 else:
                     # This is a new POI - will add fix me tag to the new items.
-                    data.at[i, 'poi_new'] = True
-                    # Get the first character of then name of POI and generate a floating number between 0 and 1
-                    # for a PostGIS function: https://postgis.net/docs/ST_LineInterpolatePoint.html
-                    # If there is more than one POI in a building this will try to do a different location and
-                    # not only on center or not only on edge
-                    ib = row.get('poi_name')
-                    if ib is not None:
-                        ibp = 1 - (((ord(ib[0]) // 16) + 1) / 17)
-                    else:
-                        ibp = 0.50
-                    # Refine postcode
-                    osm_bulding_q = db.query_osm_building_poi_gpd(row.get('poi_lon'), row.get('poi_lat'),
-                                                                  row.get('poi_city'), row.get('poi_postcode'),
-                                                                  row.get('poi_addr_street'),
-                                                                  row.get('poi_addr_housenumber'),
-                                                                  in_building_percentage=ibp)
-                    if osm_bulding_q is not None:
-                        logging.info('Relocating POI coordinates to the building with same address: %s %s, %s %s',
-                                     row.get('poi_lat'), row.get('poi_lon'), osm_bulding_q.get('lat')[0],
-                                     osm_bulding_q.get('lon')[0]),
-                        row['poi_lat'], row['poi_lon'] = osm_bulding_q.get('lat')[0], osm_bulding_q.get('lon')[0]
-                    else:
-                        logging.info(
-                            'The POI is already in its building or there is no building match. \
-                            Keeping POI coordinates as is as.')
-                    if row['preserve_original_post_code'] is not True:
-                        postcode = query_postcode_osm_external(config.get_geo_prefer_osm_postcode(), session,
-                                                               data.at[i, 'poi_lon'], data.at[i, 'poi_lat'],
-                                                               row.get('poi_postcode'))
-                        if postcode != row.get('poi_postcode'):
-                            logging.info('Changing postcode from %s to %s.', row.get('poi_postcode'), postcode)
-                            data.at[i, 'poi_postcode'] = postcode
-                    else:
-                        logging.info('Preserving original postcode %s', row.get('poi_postcode'))
-                    logging.info('New %s (not %s) type: %s POI: %s %s, %s %s (%s)', row.get('poi_search_name'),
-                                 row.get('poi_search_avoid_name'), row.get('poi_type'), row.get('poi_postcode'),
-                                 row.get('poi_city'), row.get('poi_addr_street'),
-                                 row.get('poi_addr_housenumber'), row.get('poi_conscriptionnumber'))
+                    columns['poi_new'][i] = True
+                    # New POIs are relocated into their buildings together after matching
+                    new_pois.append(i)
             except Exception as e:
                 logging.error(e)
                 logging.error(row)
                 logging.exception('Exception occurred')
 
+        try:
+            live_tags.fetch()
+        except Exception as e:
+            logging.error('Fetching live tags of OSM objects has failed: %s', e)
+            logging.exception('Exception occurred')
+        for i, osm_id, osm_node in live_tag_positions:
+            columns['osm_live_tags'][i] = live_tags.get(osm_id, osm_node)
+        osm_members(db, columns, members)
+        building_poi_relocation(db, records, columns, new_pois)
+        # Refine postcode of new POIs at their new location
+        for i in new_pois:
+            row = records[i]
+            try:
+                if row['preserve_original_post_code'] is not True:
+                    postcode = query_postcode_osm_external(config.get_geo_prefer_osm_postcode(), session,
+                                                           columns['poi_lon'][i], columns['poi_lat'][i],
+                                                           row.get('poi_postcode'), postcode_resolver)
+                    if postcode != row.get('poi_postcode'):
+                        logging.info('Changing postcode from %s to %s.', row.get('poi_postcode'), postcode)
+                        columns['poi_postcode'][i] = postcode
+                else:
+                    logging.info('Preserving original postcode %s', row.get('poi_postcode'))
+                logging.info('New %s (not %s) type: %s POI: %s %s, %s %s (%s)', row.get('poi_search_name'),
+                             row.get('poi_search_avoid_name'), row.get('poi_type'), row.get('poi_postcode'),
+                             row.get('poi_city'), row.get('poi_addr_street'),
+                             row.get('poi_addr_housenumber'), row.get('poi_conscriptionnumber'))
+            except Exception as e:
+                logging.error(e)
+                logging.error(row)
+                logging.exception('Exception occurred')
         session.commit()
+        db.log_query_template_stats()
+        for elapsed, (pa_id, poi_code, shape) in slowest.items():
+            logging.info('Slow POI %s of %s: %.3f s (%s).', pa_id, poi_code, elapsed, shape)
+        if shop_poi_source is not db:
+            shop_poi_source.log_stats()
+        if postcode_resolver is not None:
+            postcode_resolver.log_stats()
+        get_osm_cache(db).log_stats()
+        if memo:
+            save_poi_matches(db, decisions)
+        if tier_stats is not None:
+            tier_stats.save(db)
+        for column, values in columns.items():
+            data[column] = result_column(values, data.index, data[column].dtype if column in data else None)
         return data
     except Exception as e:
         logging.error(e)
         logging.exception('Exception occurred')
+    finally:
+        # The engine of the process is shared with later chunks, its connection goes back to the pool
+        if session is not None:
+            session.close()
+
+
+def result_column(values, index, dtype=None):
+    """
+    Column of the matcher output: the original column type is kept only when all values fit in it without
+    conversion (osm_id must not become float), otherwise the column is object like cell by cell writes make it
+    (string postcodes of OSM in an integer column, timezone aware OSM timestamps in a naive datetime column)
+
+    :param values: List of column values
+    :param index: Index of the dataframe
+    :param dtype: Original dtype of the column or None
+    :return: Series
+    """
+    column = pd.Series(values, index=index, dtype=object)
+    if dtype is None or dtype == object:
+        return column
+    present = [v for v in values if clean_value(v) is not None and not (v is pd.NaT)]
+    if pd.api.types.is_bool_dtype(dtype):
+        fits = len(present) == len(values) and all(isinstance(v, (bool, np.bool_)) for v in present)
+    elif pd.api.types.is_integer_dtype(dtype):
+        fits = len(present) == len(values) and all(isinstance(v, (int, np.integer)) and not isinstance(v, bool)
+                                                   for v in present)
+    elif pd.api.types.is_float_dtype(dtype):
+        fits = all(isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)) for v in present)
+    elif pd.api.types.is_datetime64_dtype(dtype):
+        fits = all(isinstance(v, (datetime.datetime, np.datetime64)) and getattr(v, 'tzinfo', None) is None
+                   for v in present)
+    else:
+        fits = False
+    return column.astype(dtype) if fits else column
+
+
+def memo_schema_current(db):
+    """
+    Check once per process that poi_osm table can store match decisions, reuse of decisions is turned off when the
+    table was created by an earlier version and it is not migrated yet
+
+    :param db: POIBase instance
+    :return: True when match decisions can be reused and stored
+    """
+    if 'current' not in __memo_schema:
+        try:
+            __memo_schema['current'] = db.poi_osm_schema_current()
+        except Exception as e:
+            logging.warning('Checking poi_osm table has failed: %s', e)
+            __memo_schema['current'] = False
+        if not __memo_schema['current']:
+            logging.error('poi_osm table is not migrated, match decisions are not reused nor stored (matcher.memo). '
+                          'Run create_db.py --migrate once.')
+    return __memo_schema['current']
+
+
+def poi_search_hash(row, ptype):
+    """
+    Hash of the POI search parameters: a stored match decision is only valid with the same parameters
+
+    :param row: POI record
+    :param ptype: POI type
+    :return: Hexadecimal hash
+    """
+    return hashlib.sha512('{}{}{}{}{}{}'.format(
+        ptype, row.get('poi_search_name'), row.get('poi_search_avoid_name'), row.get('osm_search_distance_perfect'),
+        row.get('osm_search_distance_safe'), row.get('osm_search_distance_unsafe')).encode('utf-8')).hexdigest()
+
+
+def poi_osm_match(row, ptype, osm_query):
+    """
+    Create the match decision of a POI for the poi_osm table
+
+    :param row: POI record
+    :param ptype: POI type
+    :param osm_query: One row GeoDataFrame of matched OSM object or None when there is no match
+    :return: Dictionary of POI_osm columns
+    """
+    osm_data = {k: clean_value(v) for k, v in osm_query.to_dict('records')[0].items()} \
+        if osm_query is not None else {}
+    node = osm_data.get('node')
+    return {'poi_hash': row.get('poi_hash'),
+            'poi_search_hash': poi_search_hash(row, ptype),
+            'poi_osm_id': int(osm_data['osm_id']) if node is not None else None,
+            'poi_osm_object_type': OSM_object_type[node] if node is not None else None,
+            'geom_hint': 'SRID={};{}'.format(config.get_geo_default_projection(), row['poi_geom'].wkt)
+            if row.get('poi_geom') is not None else None,
+            'poi_osm_tier': int(osm_data['priority']) if osm_data.get('priority') is not None else None,
+            'poi_osm_distance': float(osm_data['distance']) if osm_data.get('distance') is not None else None,
+            'poi_osm_version': int(osm_data['osm_version']) if osm_data.get('osm_version') is not None else None}
+
+
+def memo_poi_matching(db, data, comm_data, changes=None):
+    """
+    Reuse the match decisions of previous runs (poi_osm table) for POIs that did not change: same poi_hash, search
+    parameters and coordinates, and the matched OSM object has the same version in the planet tables.
+    "No match" decisions are reused until they are older than matcher.memo.no.match.days.
+    In incremental mode decisions are reused until an OSM object changes around the POI.
+
+    :param db: POIBase instance
+    :param data: POI dataframe
+    :param comm_data: POI common dataframe
+    :param changes: OSMChanges of incremental mode
+    :return: Dictionary of matched OSM POI (one row GeoDataFrames) keyed by pa_id and set of pa_id that were
+      resolved from stored decisions
+    """
+    matches = {}
+    matched = set()
+    poi_types = dict(zip(comm_data['pc_id'], comm_data['poi_type']))
+    try:
+        stored = {d['poi_hash']: d for d in db.query_poi_osm_matches(data['poi_hash'].dropna().unique())
+                  .to_dict('records')}
+        no_match_limit = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=config.get_matcher_memo_no_match_days())
+        pending = {}
+        for row in data.to_dict('records'):
+            decision = stored.get(row.get('poi_hash'))
+            if decision is None or decision['poi_search_hash'] != poi_search_hash(
+                    row, poi_types.get(row.get('poi_common_id'))):
+                continue
+            # geom_hint is the POI geometry of the decision
+            if clean_value(decision['geom_hint_x']) is None or row.get('poi_geom') is None or \
+                    abs(decision['geom_hint_x'] - row['poi_geom'].x) > 1e-6 or \
+                    abs(decision['geom_hint_y'] - row['poi_geom'].y) > 1e-6:
+                continue
+            if changes is not None and changes.affected(
+                    row.get('poi_lon'), row.get('poi_lat'),
+                    max(search_distances(row.get('poi_search_name'), row.get('osm_search_distance_perfect'),
+                                         row.get('osm_search_distance_safe'),
+                                         row.get('osm_search_distance_unsafe'))),
+                    row.get('poi_city'), decision['osm_snapshot']):
+                continue
+            if clean_value(decision['poi_osm_id']) is None:
+                if changes is not None or pd.Timestamp(decision['poi_osm_updated']) >= no_match_limit:
+                    matched.add(row.get('pa_id'))
+            else:
+                pending[row.get('pa_id')] = decision
+        if pending:
+            osm_objects = db.query_osm_objects_gpd({d['poi_osm_id'] for d in pending.values()})
+            positions = {(o, n): p for p, (o, n) in enumerate(zip(osm_objects['osm_id'], osm_objects['node']))}
+            for pa_id, decision in pending.items():
+                position = positions.get((int(decision['poi_osm_id']), decision['poi_osm_object_type']))
+                # The OSM object was deleted or changed since the decision
+                if position is None or clean_value(decision['poi_osm_version']) is None or \
+                        osm_objects['osm_version'].iat[position] != decision['poi_osm_version']:
+                    continue
+                osm_query = osm_objects.iloc[[position]].drop(columns=['brand'])
+                osm_query['priority'] = decision['poi_osm_tier']
+                osm_query['distance'] = decision['poi_osm_distance']
+                matches[pa_id] = osm_query
+                matched.add(pa_id)
+    except Exception as e:
+        # All POIs will be matched again
+        logging.warning('Loading stored match decisions has failed: %s', e)
+        logging.exception('Exception occurred')
+        return {}, set()
+    logging.info('Reused %s stored match decisions (%s matches) of %s POIs.', len(matched), len(matches), len(data))
+    return matches, matched
+
+
+def save_poi_matches(db, decisions):
+    """
+    Store the match decisions of this run in the poi_osm table
+
+    :param db: POIBase instance
+    :param decisions: List of match decisions, see poi_osm_match()
+    """
+    try:
+        snapshot = pd.Timestamp(db.query_planet_timestamp())
+        updated = datetime.datetime.now(datetime.timezone.utc)
+        # One decision per poi_hash
+        unique_decisions = {}
+        for decision in decisions:
+            if decision.get('poi_hash') is not None:
+                decision.update({'osm_snapshot': None if pd.isnull(snapshot) else snapshot.to_pydatetime(),
+                                 'poi_osm_updated': updated})
+                unique_decisions[decision['poi_hash']] = decision
+        db.upsert_poi_osm_matches(list(unique_decisions.values()))
+        logging.info('Stored %s match decisions.', len(unique_decisions))
+    except Exception as e:
+        logging.warning('Storing match decisions has failed: %s', e)
+        logging.exception('Exception occurred')
+
+
+def score_poi_matching(db, row, ptype):
+    """
+    Search OSM POI of a POI by scoring the nearest candidates within its search radius
+
+    :param db: POIBase instance
+    :param row: POI record
+    :param ptype: POI type
+    :return: One row GeoDataFrame of the best candidate (with score and runner-up) or None when there is no match
+    """
+    distances = (row.get('osm_search_distance_perfect'), row.get('osm_search_distance_safe'),
+                 row.get('osm_search_distance_unsafe'))
+    candidates = db.query_osm_shop_poi_top_gpd(row.get('poi_lon'), row.get('poi_lat'), ptype,
+                                               max(search_distances(row.get('poi_search_name'), *distances)),
+                                               config.get_matcher_score_candidates())
+    return best_candidate(candidates, row.get('poi_search_name'), row.get('poi_search_avoid_name'),
+                          row.get('poi_addr_street'), row.get('poi_addr_housenumber'),
+                          row.get('poi_conscriptionnumber'), row.get('poi_city'), *distances)
+
+
+def osm_members(db, columns, members):
+    """
+    Add node lists of matched OSM ways and member lists of matched OSM relations to the matcher output
+
+    :param db: POIBase instance
+    :param columns: Column lists of matcher output, osm_nodes is updated
+    :param members: List of (position, OSM_object_type, osm_id) tuples of matched ways and relations
+    """
+    try:
+        ways = db.query_ways_nodes_batch([o for i, t, o in members if t == OSM_object_type.way])
+        relations = db.query_relation_nodes_batch([o for i, t, o in members if t == OSM_object_type.relation])
+    except Exception as e:
+        logging.error('Loading nodes of OSM ways and relations has failed: %s', e)
+        logging.exception('Exception occurred')
+        return
+    for i, osm_node, osm_id in members:
+        nodes = ways.get(osm_id) if osm_node == OSM_object_type.way else relations.get(osm_id)
+        if nodes is None:
+            logging.warning('There are no nodes of OSM %s %s.', osm_node.name, osm_id)
+        columns['osm_nodes'][i] = nodes
+    logging.info('Loaded nodes of %s OSM ways and %s OSM relations.', len(ways), len(relations))
+
+
+def in_building_percentage(name):
+    """
+    Get the first character of then name of POI and generate a floating number between 0 and 1
+    for a PostGIS function: https://postgis.net/docs/ST_LineInterpolatePoint.html
+    If there is more than one POI in a building this will try to do a different location and
+    not only on center or not only on edge
+
+    :param name: Name of the POI
+    :return: Fraction of the line between the building center and the POI
+    """
+    name = clean_value(name)
+    if name is not None and name != '':
+        return 1 - (((ord(str(name)[0]) // 16) + 1) / 17)
+    else:
+        return 0.50
+
+
+def building_poi_relocation(db, records, columns, positions):
+    """
+    Relocate new POIs into the building with the same address (street name and housenumber) within 60 meter.
+    Buildings of all new POIs are loaded with one query and the new locations are calculated together.
+
+    :param db: POIBase instance
+    :param records: POI records
+    :param columns: Column lists of matcher output, poi_lat and poi_lon of relocated POIs are updated
+    :param positions: Positions of new POIs in records
+    """
+    positions = [i for i in positions if address_key(records[i].get('poi_addr_street'),
+                                                     records[i].get('poi_addr_housenumber')) is not None]
+    relocated = pd.DataFrame(columns=['lat', 'lon'])
+    if positions:
+        pois = pd.DataFrame({'lon': [columns['poi_lon'][i] for i in positions],
+                             'lat': [columns['poi_lat'][i] for i in positions],
+                             'street_name': [records[i].get('poi_addr_street') for i in positions],
+                             'housenumber': [records[i].get('poi_addr_housenumber') for i in positions],
+                             'in_building_percentage': [in_building_percentage(records[i].get('poi_name'))
+                                                        for i in positions]}, index=positions)
+        try:
+            buildings = BuildingIndex(db.query_osm_address_buildings_gpd(zip(pois['street_name'],
+                                                                             pois['housenumber'])))
+            relocated = buildings.relocate(pois.dropna(subset=['lon', 'lat']))
+            logging.info('Relocated %s of %s new POIs with address into buildings.', len(relocated), len(pois))
+        except Exception as e:
+            logging.warning('Relocation of new POIs has failed: %s', e)
+            logging.exception('Exception occurred')
+    for i in positions:
+        if i in relocated.index:
+            logging.info('Relocating POI coordinates to the building with same address: %s %s, %s %s',
+                         columns['poi_lat'][i], columns['poi_lon'][i], relocated.at[i, 'lat'], relocated.at[i, 'lon'])
+            columns['poi_lat'][i], columns['poi_lon'][i] = relocated.at[i, 'lat'], relocated.at[i, 'lon']
+        else:
+            logging.info('The POI is already in its building or there is no building match. '
+                         'Keeping POI coordinates as is as.')
+
+
+def batch_poi_matching(db, data, comm_data):
+    """
+    Search OSM POI of all POIs with set based queries: one query for a chunk of POIs with same poi_common_id
+
+    :param db: POIBase instance
+    :param data: POI dataframe
+    :param comm_data: POI common dataframe
+    :return: Dictionary of matched OSM POI (one row GeoDataFrames) keyed by pa_id and set of pa_id that were
+      processed by the batch matcher
+    """
+    matches = {}
+    matched = set()
+    batch_size = config.get_matcher_batch_size()
+    poi_types = dict(zip(comm_data['pc_id'], comm_data['poi_type']))
+    for common_id, group in data.groupby('poi_common_id', sort=False):
+        first = group.iloc[0]
+        ptype = poi_types.get(common_id)
+        for start in range(0, len(group), batch_size):
+            chunk = group.iloc[start:start + batch_size]
+            try:
+                osm_query = db.query_osm_shop_poi_gpd_batch(chunk, ptype, first.get('poi_search_name'),
+                                                            first.get('poi_search_avoid_name'),
+                                                            first.get('osm_search_distance_perfect'),
+                                                            first.get('osm_search_distance_safe'),
+                                                            first.get('osm_search_distance_unsafe'))
+            except Exception as e:
+                # These POIs will be matched one by one
+                logging.warning('Batch matching of %s POIs has failed: %s', len(chunk), e)
+                logging.exception('Exception occurred')
+                continue
+            for idx in osm_query.index:
+                matches[osm_query.at[idx, 'pa_id']] = osm_query.loc[[idx]].drop(columns=['pa_id'])
+            matched.update(chunk['pa_id'])
+        logging.info('Batch matched %s POIs of poi_common_id %s.', len(group), common_id)
+    return matches, matched
+
+
+def index_poi_matching(db, data, comm_data):
+    """
+    Search OSM POI of all POIs in the in-memory candidate index of their POI type
+
+    :param db: POIBase instance
+    :param data: POI dataframe
+    :param comm_data: POI common dataframe
+    :return: Dictionary of matched OSM POI (one row GeoDataFrames) keyed by pa_id and set of pa_id that were
+      processed by the candidate index
+    """
+    matches = {}
+    matched = set()
+    poi_types = dict(zip(comm_data['pc_id'], comm_data['poi_type']))
+    for common_id, group in data.groupby('poi_common_id', sort=False):
+        ptype = poi_types.get(common_id)
+        try:
+            index = get_candidate_index(db, ptype)
+        except Exception as e:
+            # These POIs will be matched one by one
+            logging.warning('Loading candidate index of %s POI type has failed: %s', ptype, e)
+            logging.exception('Exception occurred')
+            continue
+        for row in group.to_dict('records'):
+            try:
+                osm_query = index.match(row.get('poi_lon'), row.get('poi_lat'), row.get('poi_search_name'),
+                                        row.get('poi_search_avoid_name'), row.get('poi_addr_street'),
+                                        row.get('poi_addr_housenumber'), row.get('poi_conscriptionnumber'),
+                                        row.get('poi_city'), row.get('osm_search_distance_perfect'),
+                                        row.get('osm_search_distance_safe'), row.get('osm_search_distance_unsafe'))
+            except Exception as e:
+                logging.warning('Candidate index matching of POI %s has failed: %s', row.get('pa_id'), e)
+                continue
+            if osm_query is not None:
+                matches[row.get('pa_id')] = osm_query
+            matched.add(row.get('pa_id'))
+        logging.info('Index matched %s POIs of poi_common_id %s.', len(group), common_id)
+    return matches, matched
 
 
 def smart_postcode_check(curr_data, osm_data, pc):
@@ -264,18 +606,22 @@ def smart_postcode_check(curr_data, osm_data, pc):
     changing any other parts of address. Issue #78
 
     When address or conscription number change or postcode is empty.
+
+    :param curr_data: POI record (dictionary or Series)
+    :param osm_data: Matched OSM object (dictionary, Series or one row DataFrame)
+    :param pc: Postcode of the POI location
     """
+    if isinstance(osm_data, pd.DataFrame):
+        osm_data = osm_data.iloc[0]
+    osm_postcode = osm_data.get('addr:postcode')
     # Change postcode when there is no postcode in OSM or the address was changed
-    if pc is not None and pc != '' and osm_data.iloc[0, osm_data.columns.get_loc('addr:postcode')] != pc and \
-            (osm_data.iloc[0, osm_data.columns.get_loc('addr:postcode')] is None or
-             osm_data.iloc[0, osm_data.columns.get_loc('addr:postcode')] == '') or \
-            (curr_data.get('poi_addr_housenumber') != osm_data.iloc[0, osm_data.columns.get_loc('addr:housenumber')] or
-             curr_data.get('poi_addr_street') != osm_data.iloc[0, osm_data.columns.get_loc('addr:street')] or
-             curr_data.get('poi_city') != osm_data.iloc[0, osm_data.columns.get_loc('addr:city')] or
-             curr_data.get('poi_addr_conscriptionnumber') != osm_data.iloc[
-                 0, osm_data.columns.get_loc('addr:conscriptionnumber')]):
+    if pc is not None and pc != '' and osm_postcode != pc and (osm_postcode is None or osm_postcode == '') or \
+            (curr_data.get('poi_addr_housenumber') != osm_data.get('addr:housenumber') or
+             curr_data.get('poi_addr_street') != osm_data.get('addr:street') or
+             curr_data.get('poi_city') != osm_data.get('addr:city') or
+             curr_data.get('poi_addr_conscriptionnumber') != osm_data.get('addr:conscriptionnumber')):
         logging.info('Changing postcode from %s to %s.', curr_data.get('poi_postcode'), pc)
         return pc
     else:
-        logging.debug('The postcode is %s.', osm_data.iloc[0, osm_data.columns.get_loc('addr:postcode')])
-        return osm_data.iloc[0, osm_data.columns.get_loc('addr:postcode')]
+        logging.debug('The postcode is %s.', osm_postcode)
+        return osm_postcode
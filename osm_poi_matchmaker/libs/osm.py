@@ -42,10 +42,11 @@ def query_osm_postcode_gpd(session, lon, lat):
     return int(row['name'].split(' ')[0]) if row['name'].split(' ')[0] is not None else None
 
 
-def query_postcode_osm_external(prefer_osm, session, lon, lat, postcode_ext):
+def query_postcode_osm_external(prefer_osm, session, lon, lat, postcode_ext, resolver=None):
     if prefer_osm is False and postcode_ext is not None:
         return postcode_ext
-    query_postcode = query_osm_postcode_gpd(session, lon, lat)
+    # The in-memory postcode resolver answers without database query
+    query_postcode = resolver.postcode(lon, lat) if resolver is not None else query_osm_postcode_gpd(session, lon, lat)
     if prefer_osm is True and query_postcode is not None:
         return query_postcode
     elif prefer_osm is True and query_postcode is None:
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import time
+    import pandas as pd
+    from osm_poi_matchmaker.dao.data_structure import OSM_object_type
+    from osm_poi_matchmaker.utils import config
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+# OSM object cache of this process
+__cache = {}
+
+
+class OSMCache:
+    '''
+    In memory copy of poi_osm_cache: rows are loaded in bulk (by id list or the whole table) and reads are answered
+    from a dictionary keyed by (OSM_object_type, osm_id). Ids that are not in poi_osm_cache are remembered too, so they
+    are not queried again.
+
+    :param db: POIBase instance
+    '''
+
+    def __init__(self, db):
+        self.__db = db
+        # poi_osm_cache rows keyed by (OSM_object_type, osm_id), None marks objects missing from poi_osm_cache
+        self.__rows = {}
+        # Object types loaded with the whole table
+        self.__complete = set()
+        # Keys of objects compared with the planet tables
+        self.__validated = set()
+        self.stats = {'hits': 0, 'misses': 0, 'loads': 0, 'rows': 0, 'load_time': 0.0, 'stale': 0}
+
+    def __len__(self):
+        return sum(1 for r in self.__rows.values() if r is not None)
+
+    def load(self, object_type, osm_ids):
+        '''
+        Load cached OSM objects of one type that are not in memory yet in one query
+        :param object_type: OSM_object_type of the objects
+        :param osm_ids: List of OSM API ids (relations are positive)
+        '''
+        if object_type in self.__complete:
+            return
+        osm_ids = sorted({int(i) for i in osm_ids if (object_type, int(i)) not in self.__rows})
+        if not osm_ids:
+            return
+        started = time.perf_counter()
+        data = self.__db.query_osm_cache_pd(object_type, osm_ids)
+        for osm_id in osm_ids:
+            self.__rows[(object_type, osm_id)] = None
+        for row in data.to_dict('records'):
+            self.__rows[(object_type, int(row['osm_id']))] = row
+        self.stats['loads'] += 1
+        self.stats['rows'] += len(data)
+        self.stats['load_time'] += time.perf_counter() - started
+
+    def load_all(self):
+        '''
+        Load the whole poi_osm_cache table, later reads do not query the database
+        '''
+        started = time.perf_counter()
+        data = self.__db.query_osm_cache_all_pd()
+        for row in data.to_dict('records'):
+            self.__rows[(OSM_object_type[row['osm_object_type']], int(row['osm_id']))] = row
+        self.__complete.update(OSM_object_type)
+        self.stats['loads'] += 1
+        self.stats['rows'] += len(data)
+        self.stats['load_time'] += time.perf_counter() - started
+
+    def validate(self, object_type, osm_ids):
+        '''
+        Compare the versions of cached OSM objects with their versions in the planet tables in one query, objects
+        that have a newer version in the planet are dropped from memory, so they are downloaded again
+        :param object_type: OSM_object_type of the objects
+        :param osm_ids: List of OSM API ids (relations are positive)
+        :return: List of ids of stale objects
+        '''
+        osm_ids = sorted({int(i) for i in osm_ids if (object_type, int(i)) not in self.__validated and
+                          self.__rows.get((object_type, int(i))) is not None})
+        if not osm_ids:
+            return []
+        started = time.perf_counter()
+        versions = self.__db.query_osm_versions_pd(object_type, osm_ids)
+        self.__validated.update((object_type, i) for i in osm_ids)
+        stale = []
+        for osm_id, version in versions[['osm_id', 'osm_version']].itertuples(index=False):
+            row = self.__rows.get((object_type, int(osm_id)))
+            if row is None or pd.isna(version):
+                continue
+            cached_version = row.get('osm_version')
+            if cached_version is None or pd.isna(cached_version) or int(cached_version) < int(version):
+                self.__rows[(object_type, int(osm_id))] = None
+                stale.append(int(osm_id))
+        self.stats['stale'] += len(stale)
+        self.stats['load_time'] += time.perf_counter() - started
+        if stale:
+            logging.debug('Cached %s objects newer in the planet: %s', object_type.name, stale)
+        return stale
+
+    def get(self, osm_id, object_type):
+        '''
+        Get a cached OSM object, objects that are not loaded yet are queried one by one
+        :param osm_id: OSM API id of the object
+        :param object_type: OSM_object_type of the object
+        :return: Dictionary of poi_osm_cache columns or None when the object is not cached
+        '''
+        key = (object_type, int(osm_id))
+        if key in self.__rows or object_type in self.__complete:
+            self.stats['hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            self.load(object_type, [key[1]])
+        return self.__rows.get(key)
+
+    def put(self, rows):
+        '''
+        Add objects stored in poi_osm_cache
+        :param rows: List of dictionaries with POI_OSM_cache columns
+        '''
+        for row in rows:
+            self.__rows[(row['osm_object_type'], int(row['osm_id']))] = row
+            self.__validated.add((row['osm_object_type'], int(row['osm_id'])))
+
+    def log_stats(self):
+        reads = self.stats['hits'] + self.stats['misses']
+        logging.info('OSM object cache: %s reads, %.1f%% hit rate, %s objects loaded by %s queries in %.3f s, '
+                     '%s stale objects.', reads, 100.0 * self.stats['hits'] / reads if reads else 0,
+                     self.stats['rows'], self.stats['loads'], self.stats['load_time'], self.stats['stale'])
+
+
+def get_osm_cache(db):
+    '''
+    Get the OSM object cache of this process, the whole poi_osm_cache table is loaded at first use when
+    matcher.osm.cache.preload is table
+    :param db: POIBase instance
+    :return: OSMCache
+    '''
+    if 'cache' not in __cache:
+        __cache['cache'] = OSMCache(db)
+        if config.get_matcher_osm_cache_preload() == 'table':
+            __cache['cache'].load_all()
+    return __cache['cache']
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import xml.etree.ElementTree as ET
+    import numpy as np
+    import pandas as pd
+    import geopandas as gpd
+    from shapely.geometry import Point
+    from osm_poi_matchmaker.dao.poi_base import clean_value
+    from osm_poi_matchmaker.libs.candidate_index import CandidateIndex, lower_values
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+OSC_ACTIONS = ('create', 'modify', 'delete')
+OSC_OBJECTS = ('node', 'way', 'relation')
+
+
+def read_osm_change(file_name):
+    '''
+    Read an OSM change file (.osc) of a replication diff
+    :param file_name: Path of the change file
+    :return: Tuple of changed osm_id values as in the planet tables (relations are negative) and the
+      coordinates of changed nodes as list of (lon, lat) tuples
+    '''
+    osm_ids = set()
+    nodes = []
+    action = None
+    for event, element in ET.iterparse(file_name, events=('start', 'end')):
+        if event == 'start':
+            if element.tag in OSC_ACTIONS:
+                action = element.tag
+            continue
+        if element.tag in OSC_OBJECTS and action is not None:
+            osm_id = int(element.get('id'))
+            osm_ids.add(-osm_id if element.tag == 'relation' else osm_id)
+            # Moved nodes change the geometry of their ways too, deleted nodes may have no coordinates
+            if element.tag == 'node' and element.get('lon') is not None and element.get('lat') is not None:
+                nodes.append((float(element.get('lon')), float(element.get('lat'))))
+            element.clear()
+        elif element.tag in OSC_ACTIONS:
+            action = None
+    return osm_ids, nodes
+
+
+class OSMChanges:
+    '''
+    OSM objects changed since the previous matcher run. A stored match decision of a POI is out of date when a
+    changed object is within its osm_search_distance_unsafe radius or has the same city in its address
+    (address based priority tiers have no distance limit).
+
+    :param changes: GeoDataFrame of changed OSM objects with candidate columns (see
+      POIBase.query_osm_objects_gpd()), osm_timestamp is missing for changes of an OSM change file
+    '''
+
+    def __init__(self, changes):
+        self.__changes = changes.reset_index(drop=True)
+        self.__index = CandidateIndex(self.__changes)
+        self.__timestamps = pd.to_datetime(self.__changes['osm_timestamp'], utc=True).values \
+            if 'osm_timestamp' in self.__changes else np.full(len(self.__changes), np.datetime64('NaT'))
+        self.__cities = {}
+        for city, timestamp in zip(lower_values(self.__changes['addr:city']), self.__timestamps):
+            if city is not None:
+                self.__cities.setdefault(city, []).append(timestamp)
+
+    def __len__(self):
+        return len(self.__changes)
+
+    def __newer(self, timestamps, snapshot):
+        # Changes without timestamp (of OSM change file) are always newer
+        if snapshot is None or pd.isnull(snapshot):
+            return len(timestamps) > 0
+        snapshot = pd.Timestamp(snapshot)
+        if snapshot.tzinfo is not None:
+            snapshot = snapshot.tz_convert('UTC').tz_localize(None)
+        timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+        return bool(np.any(np.isnat(timestamps) | (timestamps > snapshot.to_datetime64())))
+
+    def affected(self, lon, lat, distance, city=None, snapshot=None):
+        '''
+        Check whether a POI has to be matched again
+        :param lon: Longitude of the POI
+        :param lat: Latitude of the POI
+        :param distance: Search radius of the POI in meter (osm_search_distance_unsafe)
+        :param city: City of the POI
+        :param snapshot: OSM snapshot of the stored match decision, only newer changes are considered
+        :return: True when an OSM object changed around the POI or in its city
+        '''
+        city = clean_value(city)
+        if city is not None and self.__newer(self.__cities.get(str(city).lower(), []), snapshot):
+            return True
+        if clean_value(lon) is None or clean_value(lat) is None:
+            return True
+        positions, distances = self.__index.nearby(float(lon), float(lat), float(distance))
+        return self.__newer(self.__timestamps[positions], snapshot)
+
+
+def load_osm_changes(db, osc_file=None, since=None):
+    '''
+    Load OSM objects changed since the previous matcher run
+    :param db: POIBase instance
+    :param osc_file: OSM change file of the replication diffs applied since the previous run
+    :param since: OSM snapshot of the previous run, used when there is no change file: objects with newer
+      osm_timestamp in the planet tables are changed
+    :return: OSMChanges
+    '''
+    if osc_file is not None:
+        osm_ids, nodes = read_osm_change(osc_file)
+        changes = db.query_osm_objects_gpd(osm_ids)
+        changes['osm_timestamp'] = pd.NaT
+        if nodes:
+            # Changed nodes without tags are not in the planet tables (way members, deleted nodes)
+            points = gpd.GeoDataFrame({'osm_id': None, 'node': 'node', 'lon': [n[0] for n in nodes],
+                                       'lat': [n[1] for n in nodes], 'way': [Point(n) for n in nodes]},
+                                      geometry='way')
+            changes = pd.concat([changes, points], sort=False, ignore_index=True)
+        changes = gpd.GeoDataFrame(changes, geometry='way')
+        logging.info('OSM change file %s contains %s changed objects.', osc_file, len(osm_ids))
+    else:
+        changes = db.query_osm_changed_gpd(since)
+        logging.info('There are %s changed OSM objects since %s.', len(changes), since)
+    for column in ('name', 'brand', 'addr:street', 'addr:housenumber', 'addr:conscriptionnumber', 'addr:city'):
+        if column not in changes:
+            changes[column] = None
+    return OSMChanges(changes)
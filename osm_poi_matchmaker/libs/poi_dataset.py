@@ -11,7 +11,7 @@ try:
     from osm_poi_matchmaker.libs.address import clean_string, clean_url, clean_branch
     from osm_poi_matchmaker.dao import poi_array_structure
     from osm_poi_matchmaker.utils import config
-    from osm_poi_matchmaker.dao.poi_base import POIBase
+    from osm_poi_matchmaker.dao.poi_base import get_poi_base
     from osm_poi_matchmaker.libs.poi_qc import POIQC
 except ImportError as err:
     logging.error('Error %s import module: %s', module=__name__, error=err)
@@ -32,12 +32,7 @@ class POIDataset:
         """
         """        
         self.insert_data = []
-        self.__db = POIBase(
-            '{}://{}:{}@{}:{}/{}'.format(config.get_database_type(), config.get_database_writer_username(),
-                                         config.get_database_writer_password(),
-                                         config.get_database_writer_host(),
-                                         config.get_database_writer_port(),
-                                         config.get_database_poi_database()))
+        self.__db = get_poi_base()
         self.__code = None
         self.__postcode = None
         self.__city = None
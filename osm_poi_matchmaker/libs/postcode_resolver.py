@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import math
+    from shapely.geometry import Point, box
+    from shapely.prepared import prep
+    from shapely.strtree import STRtree
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+# Size of grid cells in degree (about 75 x 110 meter in Hungary)
+POSTCODE_CELL_SIZE = 0.001
+
+# Postcode resolver of this process
+__resolver = {}
+
+
+def postcode_from_name(name):
+    '''
+    Postcode of a postal code boundary: the first word of its name as integer, same as query_osm_postcode_gpd()
+    :return: Postcode or None when the name does not start with a number
+    '''
+    if name is None:
+        return None
+    try:
+        return int(str(name).split(' ')[0])
+    except ValueError:
+        return None
+
+
+class PostcodeResolver:
+    '''
+    In-memory point in polygon index of postal code boundaries. It gives the same answer as
+    query_osm_postcode_gpd() without querying the database POI by POI.
+
+    :param boundaries: GeoDataFrame loaded by POIBase.query_osm_postcode_boundaries_gpd()
+    :param cell_size: Size of grid cells in degree, lookups are memoised per cell
+    '''
+
+    def __init__(self, boundaries, cell_size=POSTCODE_CELL_SIZE):
+        # The first boundary in name order wins when boundaries overlap, like ORDER BY name LIMIT 1
+        boundaries = boundaries.sort_values('name', kind='mergesort')
+        self.__geometries = [g for g in boundaries.geometry.values if g is not None and not g.is_empty]
+        self.__postcodes = [postcode_from_name(n) for n, g in zip(boundaries['name'], boundaries.geometry.values)
+                            if g is not None and not g.is_empty]
+        self.__prepared = [prep(g) for g in self.__geometries]
+        # STRtree of Shapely 1.x returns geometries, Shapely 2 returns their positions
+        self.__positions = {id(g): p for p, g in enumerate(self.__geometries)}
+        self.__tree = STRtree(self.__geometries) if self.__geometries else None
+        self.__cell_size = cell_size
+        self.__cells = {}
+        self.__stats = {'lookups': 0, 'cells': 0, 'cell_hits': 0}
+
+    def __len__(self):
+        return len(self.__geometries)
+
+    def __query(self, geometry):
+        if self.__tree is None:
+            return []
+        return sorted(int(r) if not hasattr(r, 'geom_type') else self.__positions[id(r)]
+                      for r in self.__tree.query(geometry))
+
+    def __cell(self, key):
+        # A cell is resolved without point in polygon test when the first boundary intersecting it covers it
+        cell = box(key[0] * self.__cell_size, key[1] * self.__cell_size, (key[0] + 1) * self.__cell_size,
+                   (key[1] + 1) * self.__cell_size)
+        positions = [p for p in self.__query(cell) if self.__prepared[p].intersects(cell)]
+        self.__stats['cells'] += 1
+        if not positions:
+            return None, []
+        if self.__prepared[positions[0]].contains_properly(cell):
+            return self.__postcodes[positions[0]], []
+        return None, positions
+
+    def postcode(self, lon, lat):
+        '''
+        Postcode of a coordinate
+        :param lon: Longitude of the coordinate
+        :param lat: Latitude of the coordinate
+        :return: Postcode of the first (in name order) postal code boundary that contains the coordinate or None
+        '''
+        if lat is None or lat == '' or lon == '' or lon is None:
+            return None
+        lon, lat = float(lon), float(lat)
+        if math.isnan(lon) or math.isnan(lat):
+            return None
+        self.__stats['lookups'] += 1
+        key = (math.floor(lon / self.__cell_size), math.floor(lat / self.__cell_size))
+        if key in self.__cells:
+            self.__stats['cell_hits'] += 1
+        else:
+            self.__cells[key] = self.__cell(key)
+        postcode, positions = self.__cells[key]
+        if positions:
+            point = Point(lon, lat)
+            for p in positions:
+                if self.__prepared[p].contains(point):
+                    return self.__postcodes[p]
+        return postcode
+
+    def log_stats(self):
+        logging.info('Postcode resolver: %s lookups, %s grid cells, %s memoised cell hits.',
+                     self.__stats['lookups'], self.__stats['cells'], self.__stats['cell_hits'])
+
+
+def get_postcode_resolver(db):
+    '''
+    Get the postcode resolver, postal code boundaries are loaded from the database only once per process
+    :param db: POIBase instance
+    :return: PostcodeResolver
+    '''
+    if 'resolver' not in __resolver:
+        __resolver['resolver'] = PostcodeResolver(db.query_osm_postcode_boundaries_gpd())
+    return __resolver['resolver']
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    from collections import Counter
+    from osm_poi_matchmaker.dao.poi_base import CASCADE_TIER_GROUPS, clean_value
+    from osm_poi_matchmaker.utils import config
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+# poi_osm_tier of lookups without match in the tier statistics
+NO_MATCH_TIER = 0
+
+
+def plan_tier_groups(hits, min_samples=None, min_hit_percent=None):
+    '''
+    Plan the round trips of the cascade of a POI code from its tier statistics. A round trip of CASCADE_TIER_GROUPS
+    that hits rarely is merged into the next one, so a plan never has more round trips than the default. Groups keep
+    the cascade order and a group returns its candidates in cascade order, therefore the chosen candidate is always
+    the one of the highest priority tier.
+    :param hits: Dictionary of hits keyed by priority tier, NO_MATCH_TIER counts the lookups without match
+    :param min_samples: Minimal number of lookups to plan, default is matcher.tier.min.samples
+    :param min_hit_percent: A round trip with less hits (in percent of lookups) is merged into the next one,
+      default is matcher.tier.min.hit.percent
+    :return: Tuple of tier groups or None when the default CASCADE_TIER_GROUPS has to be used
+    '''
+    min_samples = config.get_matcher_tier_min_samples() if min_samples is None else min_samples
+    min_hit_percent = config.get_matcher_tier_min_hit_percent() if min_hit_percent is None else min_hit_percent
+    lookups = sum(hits.values())
+    if lookups == 0 or lookups < min_samples:
+        return None
+    groups = []
+    group = ()
+    for default_group in CASCADE_TIER_GROUPS:
+        group += default_group
+        if 100.0 * sum(hits.get(t, 0) for t in default_group) / lookups >= min_hit_percent:
+            groups.append(group)
+            group = ()
+    if group:
+        groups.append(group)
+    return tuple(groups)
+
+
+def load_tier_plans(db):
+    '''
+    Plan the cascade round trips of all POI codes with enough statistics
+    :param db: POIBase instance
+    :return: Dictionary of tier groups keyed by poi_code, POI codes with default plan are missing
+    '''
+    stats = {}
+    for code, tier, count in db.query_poi_tier_stats().itertuples(index=False):
+        stats.setdefault(code, {})[int(tier)] = int(count)
+    plans = {}
+    for code, hits in stats.items():
+        groups = plan_tier_groups(hits)
+        if groups is not None and groups != CASCADE_TIER_GROUPS:
+            plans[code] = groups
+            logging.debug('Cascade round trips of %s: %s (%s).', code, groups, hits)
+    logging.info('Planned cascade round trips of %s POI codes from tier statistics.', len(plans))
+    return plans
+
+
+class TierStats:
+    '''
+    Priority tier hits of a matcher run by POI code
+    '''
+
+    def __init__(self):
+        self.__hits = Counter()
+
+    def __len__(self):
+        return sum(self.__hits.values())
+
+    def add(self, poi_code, osm_query):
+        '''
+        Count a match
+        :param poi_code: POI code of the POI
+        :param osm_query: One row GeoDataFrame of the matched OSM object or None when there is no match
+        '''
+        if poi_code is None:
+            return
+        if osm_query is None:
+            self.__hits[(poi_code, NO_MATCH_TIER)] += 1
+        elif 'priority' in osm_query and clean_value(osm_query['priority'].iat[0]) is not None:
+            self.__hits[(poi_code, int(osm_query['priority'].iat[0]))] += 1
+
+    def save(self, db):
+        '''
+        Add the counted hits to the statistics of the database
+        :param db: POIBase instance
+        '''
+        try:
+            db.add_poi_tier_stats([{'poi_code': c, 'poi_osm_tier': t, 'hits': h} for (c, t), h in
+                                   sorted(self.__hits.items())])
+        except Exception as e:
+            logging.warning('Storing tier statistics has failed: %s', e)
+            logging.exception('Exception occurred')
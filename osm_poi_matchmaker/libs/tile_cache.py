@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import logging
+    import sys
+    import math
+    from collections import OrderedDict
+    from osm_poi_matchmaker.dao.poi_base import CASCADE_TIER_ORDER, SPHERE_DEGREE_LENGTH, shop_poi_tiers, \
+        search_distances, clean_value
+    from osm_poi_matchmaker.libs.candidate_index import CandidateIndex
+    from osm_poi_matchmaker.utils import config
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+# Priority tiers without distance limit, they are resolved from the candidates of a city
+ADDRESS_TIERS = (965, 940)
+DISTANCE_TIERS = tuple(p for p in CASCADE_TIER_ORDER if p not in ADDRESS_TIERS)
+
+
+def candidates_memory(candidates):
+    '''
+    Approximate memory use of candidates in bytes: size of the dataframe and of the geometries
+    '''
+    return int(candidates.memory_usage(deep=True).sum()) + \
+        sum(len(g.wkb) for g in candidates.geometry.values if g is not None)
+
+
+class LRUCache:
+    '''
+    Least recently used cache with bounded number of entries
+
+    :param size: Maximal number of entries
+    '''
+
+    def __init__(self, size):
+        self.__size = max(1, size)
+        self.__entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'memory': 0}
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, valid=None):
+        '''
+        Get a cached value
+        :param key: Key of the entry
+        :param valid: Function that checks whether the cached value is usable, unusable value is a miss
+        :return: Cached value or None
+        '''
+        entry = self.__entries.get(key)
+        if entry is None or (valid is not None and not valid(entry[0])):
+            self.stats['misses'] += 1
+            return None
+        self.__entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return entry[0]
+
+    def put(self, key, value, memory=0):
+        if key in self.__entries:
+            self.stats['memory'] -= self.__entries.pop(key)[1]
+        self.__entries[key] = (value, memory)
+        self.stats['memory'] += memory
+        while len(self.__entries) > self.__size:
+            key, entry = self.__entries.popitem(last=False)
+            self.stats['memory'] -= entry[1]
+            self.stats['evictions'] += 1
+
+
+class TileCache:
+    '''
+    Cache of matcher candidates under POIBase.query_osm_shop_poi_gpd(). The first POI of a tile loads all OSM
+    objects of its POI type in the tile plus a margin of the search radius, later POIs of the tile are matched in
+    memory. Address based priority tiers have no distance limit: their candidates are loaded by city.
+
+    :param db: POIBase instance
+    :param tile_size: Size of tiles in meter
+    :param cache_size: Maximal number of cached tiles (and cities)
+    '''
+
+    def __init__(self, db, tile_size=None, cache_size=None):
+        self.__db = db
+        self.__tile_degree = (tile_size or config.get_matcher_tile_size()) / SPHERE_DEGREE_LENGTH
+        cache_size = cache_size or config.get_matcher_tile_cache_size()
+        self.__tiles = LRUCache(cache_size)
+        self.__cities = LRUCache(cache_size)
+
+    def __tile(self, ptype, lon, lat, distance):
+        x, y = math.floor(lon / self.__tile_degree), math.floor(lat / self.__tile_degree)
+        # A tile loaded with smaller margin cannot answer this POI
+        cached = self.__tiles.get((ptype, x, y), lambda c: c[1] >= distance)
+        if cached is not None:
+            return cached[0]
+        margin = max(distance, config.get_geo_default_poi_unsafe_distance())
+        ymin, ymax = y * self.__tile_degree, (y + 1) * self.__tile_degree
+        margin_lat = margin / SPHERE_DEGREE_LENGTH
+        margin_lon = margin / (SPHERE_DEGREE_LENGTH *
+                               math.cos(math.radians(min(max(abs(ymin), abs(ymax)) + margin_lat, 89.9))))
+        candidates = self.__db.query_osm_poi_type_bbox_gpd(ptype, x * self.__tile_degree - margin_lon,
+                                                           ymin - margin_lat, (x + 1) * self.__tile_degree + margin_lon,
+                                                           ymax + margin_lat)
+        index = CandidateIndex(candidates)
+        self.__tiles.put((ptype, x, y), (index, margin), candidates_memory(candidates))
+        return index
+
+    def __city(self, ptype, city):
+        key = (ptype, str(city).lower())
+        index = self.__cities.get(key)
+        if index is None:
+            candidates = self.__db.query_osm_poi_type_city_gpd(ptype, city)
+            index = CandidateIndex(candidates)
+            self.__cities.put(key, index, candidates_memory(candidates))
+        return index
+
+    def query_osm_shop_poi_gpd(self, lon, lat, ptype='shop', name='', avoid_name='', street_name='',
+                               housenumber='', conscriptionnumber='', city='', distance_perfect=None,
+                               distance_safe=None, distance_unsafe=None, tier_groups=None):
+        '''
+        Search for the best OSM POI, parameters and result are the same as of POIBase.query_osm_shop_poi_gpd()
+        :param tier_groups: Tier groups of database queries, tiles are matched in memory
+        :return: One row GeoDataFrame or None when there is no match
+        '''
+        if clean_value(lon) is None or lon == '' or clean_value(lat) is None or lat == '':
+            return self.__db.query_osm_shop_poi_gpd(lon, lat, ptype, name, avoid_name, street_name, housenumber,
+                                                    conscriptionnumber, city, distance_perfect, distance_safe,
+                                                    distance_unsafe, tier_groups=tier_groups)
+        args = (float(lon), float(lat), name, avoid_name, street_name, housenumber, conscriptionnumber, city,
+                distance_perfect, distance_safe, distance_unsafe)
+        filters = {'name': name, 'avoid_name': avoid_name, 'street_name': street_name, 'housenumber': housenumber,
+                   'conscriptionnumber': conscriptionnumber, 'city': city}
+        present = {k for k, v in filters.items() if clean_value(v) is not None and v != ''}
+        if any(t.priority in ADDRESS_TIERS for t in shop_poi_tiers(present)):
+            match = self.__city(ptype, city).match(*args, priorities=ADDRESS_TIERS)
+            if match is not None:
+                return match
+        distance = max(float(d) for d in search_distances(name, distance_perfect, distance_safe, distance_unsafe))
+        return self.__tile(ptype, float(lon), float(lat), distance).match(*args, priorities=DISTANCE_TIERS)
+
+    def log_stats(self):
+        for name, cache in (('Tile', self.__tiles), ('City', self.__cities)):
+            lookups = cache.stats['hits'] + cache.stats['misses']
+            logging.info('%s cache: %s lookups, %.1f%% hit rate, %s evictions, %s cached with %.1f MB.', name,
+                         lookups, 100.0 * cache.stats['hits'] / lookups if lookups else 0, cache.stats['evictions'],
+                         len(cache), cache.stats['memory'] / 1048576)
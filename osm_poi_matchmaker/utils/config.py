@@ -48,6 +48,7 @@ KEY_DATABASE_WRITE_PORT = 'db.write.port'
 KEY_DATABASE_WRITE_USERNAME = 'db.write.username'
 KEY_DATABASE_WRITE_PASSWORD = 'db.write.password'
 KEY_DATABASE_POI_DATABASE = 'db.poi.database'
+KEY_DATABASE_MAX_CONNECTIONS = 'db.max.connections'
 KEY_GEO_DEFAULT_PROJECTION = 'geo.default.projection'
 KEY_GEO_DEFAULT_POI_DISTANCE = 'geo.default.poi.distance'
 KEY_GEO_DEFAULT_POI_UNSAFE_DISTANCE = 'geo.default.poi.unsafe.distance'
@@ -63,6 +64,32 @@ KEY_DOWNLOAD_VERIFY_LINK = 'download.verify.link'
 KEY_DOWNLOAD_USE_CACHED_DATA = 'download.use.cached.data'
 KEY_DATAPROVIDERS_MODULES_AVAILABLE = 'dataproviders.modules.available'
 KEY_DATAPROVIDERS_MODULES_ENABLE = 'dataproviders.modules.enable'
+KEY_MATCHER_MODE = 'matcher.mode'
+KEY_MATCHER_BATCH_SIZE = 'matcher.batch.size'
+KEY_MATCHER_PREPARED_STATEMENTS = 'matcher.prepared.statements'
+KEY_MATCHER_SINGLE_STATEMENT = 'matcher.single.statement'
+KEY_MATCHER_NAME_MATCHING = 'matcher.name.matching'
+KEY_MATCHER_MEMO = 'matcher.memo'
+KEY_MATCHER_MEMO_NO_MATCH_DAYS = 'matcher.memo.no.match.days'
+KEY_MATCHER_CHECKPOINT_CHUNK_SIZE = 'matcher.checkpoint.chunk.size'
+KEY_MATCHER_TILE_CACHE = 'matcher.tile.cache'
+KEY_MATCHER_TILE_SIZE = 'matcher.tile.size'
+KEY_MATCHER_TILE_CACHE_SIZE = 'matcher.tile.cache.size'
+KEY_MATCHER_SCORE_CANDIDATES = 'matcher.score.candidates'
+KEY_MATCHER_SCORE_MIN = 'matcher.score.min'
+KEY_MATCHER_TIER_STATS = 'matcher.tier.stats'
+KEY_MATCHER_TIER_MIN_SAMPLES = 'matcher.tier.min.samples'
+KEY_MATCHER_TIER_MIN_HIT_PERCENT = 'matcher.tier.min.hit.percent'
+KEY_MATCHER_STATEMENT_TIMEOUT = 'matcher.statement.timeout'
+KEY_MATCHER_SLOW_REPORT_SIZE = 'matcher.slow.report.size'
+KEY_MATCHER_CHUNK_CELL_SIZE = 'matcher.chunk.cell.size'
+KEY_MATCHER_LIVE_TAGS_API = 'matcher.live.tags.api'
+KEY_MATCHER_LIVE_TAGS_URL_LENGTH = 'matcher.live.tags.url.length'
+KEY_MATCHER_LIVE_TAGS_FULL = 'matcher.live.tags.full'
+KEY_MATCHER_OSM_CACHE_PRELOAD = 'matcher.osm.cache.preload'
+KEY_MATCHER_OSM_CACHE_VALIDATE = 'matcher.osm.cache.validate'
+KEY_MATCHER_LIVE_TAGS_SOURCE = 'matcher.live.tags.source'
+KEY_MATCHER_LIVE_TAGS_REFRESH = 'matcher.live.tags.refresh'
 
 
 def get_config(key):
@@ -73,15 +100,19 @@ def get_config(key):
 
 
 def get_config_bool(key):
-    return config.getboolean(__mode.name, key)
+    return config.getboolean(__mode.name, key, fallback=None)
 
 
 def get_config_int(key):
-    return config.getint(__mode.name, key)
+    return config.getint(__mode.name, key, fallback=None)
+
+
+def get_config_float(key):
+    return config.getfloat(__mode.name, key, fallback=None)
 
 
 def get_config_string(key):
-    return config.get(__mode.name, key)
+    return config.get(__mode.name, key, fallback=None)
 
 
 def get_config_list(key):
@@ -188,6 +219,17 @@ def get_database_poi_database():
         return 'poi'
 
 
+def get_database_max_connections():
+    setting = get_config_int(KEY_DATABASE_MAX_CONNECTIONS)
+    env_setting = os.environ.get('OPM_DATABASE_MAX_CONNECTIONS')
+    if env_setting is not None:
+        return int(env_setting)
+    if setting is not None:
+        return setting
+    else:
+        return 20
+
+
 def get_geo_default_projection():
     setting = get_config_int(KEY_GEO_DEFAULT_PROJECTION)
     if setting is not None:
@@ -312,3 +354,217 @@ def get_dataproviders_modules_enable():
         return setting
     else:
         return True
+
+
+def get_matcher_mode():
+    setting = get_config_string(KEY_MATCHER_MODE)
+    env_setting = os.environ.get('OPM_MATCHER_MODE')
+    if env_setting is not None:
+        setting = env_setting
+    if setting is not None:
+        return setting.strip()
+    else:
+        return 'cascade'
+
+
+def get_matcher_batch_size():
+    setting = get_config_int(KEY_MATCHER_BATCH_SIZE)
+    if setting is not None:
+        return setting
+    else:
+        return 500
+
+
+def get_matcher_prepared_statements():
+    setting = get_config_bool(KEY_MATCHER_PREPARED_STATEMENTS)
+    if setting is not None:
+        return setting
+    else:
+        return True
+
+
+def get_matcher_single_statement():
+    setting = get_config_bool(KEY_MATCHER_SINGLE_STATEMENT)
+    if setting is not None:
+        return setting
+    else:
+        return False
+
+
+def get_matcher_name_matching():
+    setting = get_config_string(KEY_MATCHER_NAME_MATCHING)
+    env_setting = os.environ.get('OPM_MATCHER_NAME_MATCHING')
+    if env_setting is not None:
+        setting = env_setting
+    if setting is not None:
+        return setting.strip()
+    else:
+        return 'regex'
+
+
+def get_matcher_memo():
+    setting = get_config_bool(KEY_MATCHER_MEMO)
+    if setting is not None:
+        return setting
+    else:
+        return False
+
+
+def get_matcher_memo_no_match_days():
+    setting = get_config_int(KEY_MATCHER_MEMO_NO_MATCH_DAYS)
+    if setting is not None:
+        return setting
+    else:
+        return 7
+
+
+def get_matcher_checkpoint_chunk_size():
+    setting = get_config_int(KEY_MATCHER_CHECKPOINT_CHUNK_SIZE)
+    if setting is not None:
+        return setting
+    else:
+        return 250
+
+
+def get_matcher_tile_cache():
+    setting = get_config_bool(KEY_MATCHER_TILE_CACHE)
+    if setting is not None:
+        return setting
+    else:
+        return False
+
+
+def get_matcher_tile_size():
+    setting = get_config_int(KEY_MATCHER_TILE_SIZE)
+    if setting is not None:
+        return setting
+    else:
+        return 2000
+
+
+def get_matcher_tile_cache_size():
+    setting = get_config_int(KEY_MATCHER_TILE_CACHE_SIZE)
+    if setting is not None:
+        return setting
+    else:
+        return 256
+
+
+def get_matcher_score_candidates():
+    setting = get_config_int(KEY_MATCHER_SCORE_CANDIDATES)
+    if setting is not None:
+        return setting
+    else:
+        return 10
+
+
+def get_matcher_score_min():
+    setting = get_config_float(KEY_MATCHER_SCORE_MIN)
+    if setting is not None:
+        return setting
+    else:
+        return 0.5
+
+
+def get_matcher_tier_stats():
+    setting = get_config_bool(KEY_MATCHER_TIER_STATS)
+    if setting is not None:
+        return setting
+    else:
+        return True
+
+
+def get_matcher_tier_min_samples():
+    setting = get_config_int(KEY_MATCHER_TIER_MIN_SAMPLES)
+    if setting is not None:
+        return setting
+    else:
+        return 100
+
+
+def get_matcher_tier_min_hit_percent():
+    setting = get_config_int(KEY_MATCHER_TIER_MIN_HIT_PERCENT)
+    if setting is not None:
+        return setting
+    else:
+        return 2
+
+
+def get_matcher_statement_timeout():
+    setting = get_config_int(KEY_MATCHER_STATEMENT_TIMEOUT)
+    if setting is not None:
+        return setting
+    else:
+        return 0
+
+
+def get_matcher_slow_report_size():
+    setting = get_config_int(KEY_MATCHER_SLOW_REPORT_SIZE)
+    if setting is not None:
+        return setting
+    else:
+        return 20
+
+
+def get_matcher_chunk_cell_size():
+    setting = get_config_int(KEY_MATCHER_CHUNK_CELL_SIZE)
+    if setting is not None:
+        return setting
+    else:
+        return 5000
+
+
+def get_matcher_live_tags_api():
+    setting = get_config_string(KEY_MATCHER_LIVE_TAGS_API)
+    if setting is not None:
+        return setting
+    else:
+        return 'https://www.openstreetmap.org'
+
+
+def get_matcher_live_tags_url_length():
+    setting = get_config_int(KEY_MATCHER_LIVE_TAGS_URL_LENGTH)
+    if setting is not None:
+        return setting
+    else:
+        return 2000
+
+
+def get_matcher_live_tags_full():
+    setting = get_config_bool(KEY_MATCHER_LIVE_TAGS_FULL)
+    if setting is not None:
+        return setting
+    else:
+        return True
+
+
+def get_matcher_osm_cache_preload():
+    setting = get_config_string(KEY_MATCHER_OSM_CACHE_PRELOAD)
+    if setting is not None:
+        return setting
+    else:
+        return 'ids'
+
+
+def get_matcher_osm_cache_validate():
+    setting = get_config_bool(KEY_MATCHER_OSM_CACHE_VALIDATE)
+    if setting is not None:
+        return setting
+    else:
+        return True
+
+
+def get_matcher_live_tags_source():
+    setting = get_config_string(KEY_MATCHER_LIVE_TAGS_SOURCE)
+    if setting is not None:
+        return setting
+    else:
+        return 'api'
+
+
+def get_matcher_live_tags_refresh():
+    setting = get_config_bool(KEY_MATCHER_LIVE_TAGS_REFRESH)
+    if setting is not None:
+        return setting
+    else:
+        return False
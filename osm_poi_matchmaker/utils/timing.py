@@ -5,6 +5,7 @@ try:
     import sys
     import datetime
     import time
+    import heapq
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
     logging.exception('Exception occurred')
@@ -27,3 +28,34 @@ class Timing:
         return "%d:%02d:%02d.%03d" % \
                reduce(lambda ll, b: divmod(ll[0], b) + ll[1:],
                       [(t * 1000,), 1000, 60, 60])
+
+
+class SlowestItems:
+    '''
+    Keep the slowest items of a run
+
+    :param size: Number of items to keep
+    '''
+
+    def __init__(self, size):
+        self.__size = size
+        self.__heap = []
+        self.__counter = 0
+
+    def add(self, elapsed, item):
+        '''
+        Add an item with its elapsed time in seconds
+        '''
+        # The counter breaks ties, items are never compared
+        self.__counter += 1
+        entry = (elapsed, self.__counter, item)
+        if len(self.__heap) < self.__size:
+            heapq.heappush(self.__heap, entry)
+        elif self.__heap and entry > self.__heap[0]:
+            heapq.heapreplace(self.__heap, entry)
+
+    def items(self):
+        '''
+        :return: List of (elapsed, item) tuples, the slowest first
+        '''
+        return [(e, i) for e, c, i in sorted(self.__heap, reverse=True)]
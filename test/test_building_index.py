@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import pandas as pd
+    import geopandas as gpd
+    from shapely.geometry import Polygon, box
+    from osm_poi_matchmaker.libs.building_index import BuildingIndex
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+class TestBuildingIndex(unittest.TestCase):
+    def setUp(self):
+        # About 75 meter is 0.001 degree of longitude in Budapest
+        self.index = BuildingIndex(gpd.GeoDataFrame({
+            'osm_id': [1, 2, 3],
+            'addr:street': ['Fő utca', 'Fő utca', 'Kossuth utca'],
+            'addr:housenumber': ['1', '1', '2'],
+            'way': [box(19.0, 47.5, 19.0002, 47.5002), box(19.01, 47.5, 19.0102, 47.5002),
+                    Polygon([(19.0, 47.501), (19.0003, 47.501), (19.0, 47.5013)])]}, geometry='way'))
+
+    def test_relocate(self):
+        pois = pd.DataFrame({'lon': [19.0005, 19.0005, 19.0005], 'lat': [47.5001, 47.5001, 47.5],
+                             'street_name': ['FŐ UTCA', 'Fő utca', 'Kossuth utca'],
+                             'housenumber': ['1', '2', '2'], 'in_building_percentage': [0.5, 0.5, 0.5]},
+                            index=[10, 11, 12])
+        relocated = self.index.relocate(pois)
+        # Only the first POI has a building with same address within 60 meter
+        with self.subTest():
+            self.assertEqual([10], relocated.index.tolist())
+        with self.subTest():
+            self.assertEqual(1, relocated.at[10, 'osm_id'])
+        # Half way between the center and the edge of the building towards the POI
+        with self.subTest():
+            self.assertAlmostEqual(19.00015, relocated.at[10, 'lon'], 6)
+        with self.subTest():
+            self.assertAlmostEqual(47.5001, relocated.at[10, 'lat'], 6)
+        with self.subTest():
+            self.assertEqual([10, 12], sorted(self.index.relocate(pois, 200).index.tolist()))
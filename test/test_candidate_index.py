@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import geopandas as gpd
+    from shapely.geometry import Point, Polygon
+    from osm_poi_matchmaker.libs.candidate_index import CandidateIndex
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+def candidate(osm_id, node, geometry, name=None, brand=None, city=None, street=None, housenumber=None,
+              conscriptionnumber=None):
+    return {'name': name, 'brand': brand, 'osm_id': osm_id, 'node': node, 'shop': 'convenience', 'amenity': None,
+            'addr:housename': None, 'addr:housenumber': housenumber, 'addr:postcode': None, 'addr:city': city,
+            'addr:street': street, 'addr:conscriptionnumber': conscriptionnumber, 'way': geometry,
+            'lon': geometry.representative_point().x, 'lat': geometry.representative_point().y}
+
+
+class TestCandidateIndex(unittest.TestCase):
+    def setUp(self):
+        # About 75 meter is 0.001 degree of longitude in Budapest
+        self.index = CandidateIndex(gpd.GeoDataFrame([
+            candidate(1, 'node', Point(19.0010, 47.5), name='Spar', street='Fő utca', housenumber='1'),
+            candidate(2, 'node', Point(19.0005, 47.5), name='Spar Partner', brand='Spar'),
+            candidate(3, 'way', Polygon([(19.0020, 47.4990), (19.0030, 47.4990), (19.0030, 47.5010),
+                                         (19.0020, 47.5010)]), name='Tesco'),
+            candidate(4, 'node', Point(19.2000, 47.5), name='Spar', city='Budapest', street='Kossuth utca',
+                      housenumber='2'),
+            candidate(5, 'node', Point(19.0040, 47.5), name='CBA', brand='CBA'),
+        ], geometry='way'))
+
+    def test_address_tier(self):
+        # Address based tier has no distance limit
+        match = self.index.match(19.0, 47.5, 'spar', '', 'Kossuth utca', '2', '', 'budapest', 50, 100, 200)
+        with self.subTest():
+            self.assertEqual(4, match['osm_id'].values[0])
+        with self.subTest():
+            self.assertEqual(940, match['priority'].values[0])
+
+    def test_distance_tiers(self):
+        match = self.index.match(19.0, 47.5, 'spar', '', 'Fő utca', '1', '', '', 50, 100, 200)
+        with self.subTest():
+            self.assertEqual(1, match['osm_id'].values[0])
+        with self.subTest():
+            self.assertEqual(950, match['priority'].values[0])
+        # Name matches brand too, the nearest one is selected
+        match = self.index.match(19.0, 47.5, 'spar', '', '', '', '', '', 50, 100, 200)
+        with self.subTest():
+            self.assertEqual(2, match['osm_id'].values[0])
+        with self.subTest():
+            self.assertAlmostEqual(37.6, match['distance'].values[0], 1)
+
+    def test_polygon_distance(self):
+        # Distance of a way is measured from its edge not from its center
+        match = self.index.match(19.0, 47.5, 'tesco', '', '', '', '', '', 50, 160, 200)
+        with self.subTest():
+            self.assertEqual(3, match['osm_id'].values[0])
+        with self.subTest():
+            self.assertAlmostEqual(150.2, match['distance'].values[0], 1)
+        with self.subTest():
+            self.assertIsNone(self.index.match(19.0, 47.5, 'tesco', '', '', '', '', '', 50, 140, 30))
+
+    def test_avoid_name(self):
+        # Objects without name or brand are not selected by the unnamed tier
+        match = self.index.match(19.0, 47.5, '', 'spar', '', '', '', '', 50, 30, 400)
+        with self.subTest():
+            self.assertEqual(5, match['osm_id'].values[0])
+        with self.subTest():
+            self.assertEqual(990, match['priority'].values[0])
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import geopandas as gpd
+    from shapely.geometry import Point
+    from osm_poi_matchmaker.libs.candidate_scoring import score_candidates, best_candidate, regex_mask
+    from test.test_candidate_index import candidate
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+def scored(osm_id, distance, **kwargs):
+    row = candidate(osm_id, 'node', Point(19.0, 47.5), **kwargs)
+    row['distance'] = distance
+    return row
+
+
+class TestCandidateScoring(unittest.TestCase):
+    def setUp(self):
+        self.candidates = gpd.GeoDataFrame([
+            scored(1, 10, name='CBA'),
+            scored(2, 80, name='Spar Partner', brand='Spar'),
+            scored(3, 120, name='Spar', street='Fő utca', housenumber='1'),
+            scored(4, 150, name='Tesco'),
+        ], geometry='way')
+
+    def test_score(self):
+        scores = score_candidates(self.candidates, 'spar', 'tesco', 'Fő utca', '1', '', '', 200)
+        with self.subTest():
+            self.assertAlmostEqual(2.0 * 0.95, scores[0])
+        with self.subTest():
+            self.assertAlmostEqual(4.0 + 2.0 + 2.0 * 0.6, scores[1])
+        with self.subTest():
+            self.assertAlmostEqual(4.0 + 1.0 + 1.0 + 2.0 * 0.4, scores[2])
+        with self.subTest():
+            self.assertEqual(float('-inf'), scores[3])
+
+    def test_best_candidate(self):
+        # Matching name and brand of a nearer object outweigh the matching address, the runner-up is reported
+        best = best_candidate(self.candidates, 'spar', 'tesco', 'Fő utca', '1', '', '', 50, 100, 200)
+        with self.subTest():
+            self.assertEqual(2, best['osm_id'].values[0])
+        with self.subTest():
+            self.assertEqual(3, best['runner_up_osm_id'].values[0])
+        with self.subTest():
+            self.assertIsNone(best_candidate(self.candidates.iloc[[3]], 'spar', 'tesco', '', '', '', '', 50, 100, 200))
+
+    def test_unrelated_candidate(self):
+        # Without matching name only candidates within the unsafe distance are accepted
+        best = best_candidate(self.candidates.iloc[[0, 3]], 'spar', '', '', '', '', '', 50, 100, 140)
+        with self.subTest():
+            self.assertEqual(1, best['osm_id'].values[0])
+        with self.subTest():
+            self.assertIsNone(best['runner_up_osm_id'].values[0])
+        with self.subTest():
+            self.assertIsNone(best_candidate(self.candidates.iloc[[3]], 'spar', '', '', '', '', '', 50, 100, 140))
+        # No name, no address and near the search radius
+        with self.subTest():
+            self.assertIsNone(best_candidate(self.candidates.iloc[[3]], '', '', '', '', '', '', 50, 100, 155,
+                                             min_score=0.5))
+
+    def test_regex_mask(self):
+        # Upper case escapes keep their meaning
+        self.assertListEqual([False, True], regex_mask(r'spar\D', ['spar1', 'spar partner']).tolist())
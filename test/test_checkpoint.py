@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import os
+    import tempfile
+    import pandas as pd
+    from osm_poi_matchmaker.libs.checkpoint import split_chunks, split_spatial_chunks, chunk_key, save_chunk, \
+        load_chunk, clear_checkpoints, CheckpointWorker
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+def match_chunk(args):
+    data, comm_data = args
+    data = data.copy()
+    data['osm_id'] = data['pa_id'] * 10
+    return data
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = pd.DataFrame({'pa_id': range(1, 8), 'poi_name': list('abcdefg')})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_split_chunks(self):
+        chunks = split_chunks(self.data, 3)
+        with self.subTest():
+            self.assertEqual([3, 3, 1], [len(c) for c in chunks])
+        # Same POIs give the same keys, so chunks of an interrupted run are found again
+        with self.subTest():
+            self.assertEqual([chunk_key(c) for c in chunks], [chunk_key(c) for c in split_chunks(self.data, 3)])
+        with self.subTest():
+            self.assertEqual(3, len({chunk_key(c) for c in chunks}))
+
+    def test_save_load(self):
+        chunk = split_chunks(self.data, 3)[1]
+        key = chunk_key(chunk)
+        with self.subTest():
+            self.assertIsNone(load_chunk(self.directory.name, key))
+        key, result = CheckpointWorker(match_chunk)((self.directory.name, key, chunk, None))
+        with self.subTest():
+            pd.testing.assert_frame_equal(result, load_chunk(self.directory.name, key))
+        with self.subTest():
+            self.assertEqual([40, 50, 60], result['osm_id'].tolist())
+        clear_checkpoints(self.directory.name)
+        with self.subTest():
+            self.assertEqual([], os.listdir(self.directory.name))
+
+    def test_split_spatial_chunks(self):
+        # Two towns, their POIs are mixed in the dataset, one POI has no coordinates
+        data = pd.DataFrame({'pa_id': range(1, 8), 'poi_common_id': 1,
+                             'poi_lon': [19.04, 21.62, 19.05, 21.63, None, 19.04, 21.62],
+                             'poi_lat': [47.49, 47.53, 47.50, 47.52, None, 47.50, 47.53]})
+        chunks = split_spatial_chunks(data, 3, 5000)
+        with self.subTest():
+            self.assertListEqual([[1, 3, 6], [2, 4, 7], [5]], [sorted(c['pa_id']) for c in chunks])
+        with self.subTest():
+            self.assertEqual([chunk_key(c) for c in chunks],
+                             [chunk_key(c) for c in split_spatial_chunks(data.iloc[::-1], 3, 5000)])
+
+    def test_split_spatial_chunks_provider(self):
+        # POIs of two providers in the same grid cell, the POIs of one provider are not interleaved with the other
+        data = pd.DataFrame({'pa_id': range(1, 7), 'poi_common_id': [2, 1, 2, 1, 2, 1],
+                             'poi_lon': [19.04, 19.04, 19.05, 19.05, 19.04, 19.05],
+                             'poi_lat': [47.49, 47.49, 47.50, 47.50, 47.50, 47.49]})
+        chunks = split_spatial_chunks(data, 3, 5000)
+        with self.subTest():
+            self.assertListEqual([[2, 4, 6], [1, 3, 5]], [list(c['pa_id']) for c in chunks])
+        with self.subTest():
+            self.assertEqual([chunk_key(c) for c in chunks],
+                             [chunk_key(c) for c in split_spatial_chunks(data.iloc[::-1], 3, 5000)])
+
+    def test_worker_stats(self):
+        chunk = split_chunks(self.data, 3)[0]
+        key, result, stats = CheckpointWorker(match_chunk, True)((self.directory.name, chunk_key(chunk), chunk, None))
+        with self.subTest():
+            self.assertEqual(os.getpid(), stats[0])
+        with self.subTest():
+            self.assertEqual(3, stats[2])
@@ -8,11 +8,25 @@ try:
     from test.test_address import TestAddressResolver, TestFullAddressResolver, TestOpeningHoursCleaner, \
         TestOpeningHoursCleaner2, TestPhoneClener, TestPhoneClener_to_str, TestStringCleaner, TestURLCleaner, \
         TestCityCleaner
-    from test.test_online_poi_matching import TestSmartOnlinePOIMatching
+    from test.test_online_poi_matching import TestSmartOnlinePOIMatching, TestResultColumn
     from test.test_opening_hours import TestOpeningHours
     # from test.test_poi_dataset import TestPOIDataset
     from test.test_timing import TestTiming
     from test.test_osm import TestOSMRelationer
+    from test.test_poi_base import TestShopPOITiers, TestShopPOIGroupQuery, TestRewriteSearchName, \
+        TestPositionalQuery, TestQueryTierGroup, TestWorkerPool, TestPOIOSMMigration, \
+        TestBatchCascade
+    from test.test_candidate_index import TestCandidateIndex
+    from test.test_checkpoint import TestCheckpoint
+    from test.test_live_tags import TestLiveTags
+    from test.test_osm_cache import TestOSMCache
+    from test.test_osm_changes import TestOSMChanges
+    from test.test_postcode_resolver import TestPostcodeResolver
+    from test.test_building_index import TestBuildingIndex
+    from test.test_tile_cache import TestTileCache
+    from test.test_candidate_scoring import TestCandidateScoring
+    from test.test_name_classifier import TestNameClassifier
+    from test.test_tier_planner import TestTierPlanner
     from osm_poi_matchmaker.utils import config
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
@@ -33,13 +47,37 @@ def testing_create_db():
     url_cleaner = unittest.TestLoader().loadTestsFromTestCase(TestURLCleaner)
     opening_hours_resolver = unittest.TestLoader().loadTestsFromTestCase(TestOpeningHours)
     smart_online_poi_matching = unittest.TestLoader().loadTestsFromTestCase(TestSmartOnlinePOIMatching)
+    result_column = unittest.TestLoader().loadTestsFromTestCase(TestResultColumn)
     # poi_dataset = unittest.TestLoader().loadTestsFromTestCase(TestPOIDataset)
     timing = unittest.TestLoader().loadTestsFromTestCase(TestTiming)
     osm = unittest.TestLoader().loadTestsFromTestCase(TestOSMRelationer)
+    shop_poi_tiers = unittest.TestLoader().loadTestsFromTestCase(TestShopPOITiers)
+    shop_poi_group_query = unittest.TestLoader().loadTestsFromTestCase(TestShopPOIGroupQuery)
+    rewrite_search_name = unittest.TestLoader().loadTestsFromTestCase(TestRewriteSearchName)
+    positional_query = unittest.TestLoader().loadTestsFromTestCase(TestPositionalQuery)
+    query_tier_group = unittest.TestLoader().loadTestsFromTestCase(TestQueryTierGroup)
+    worker_pool = unittest.TestLoader().loadTestsFromTestCase(TestWorkerPool)
+    poi_osm_migration = unittest.TestLoader().loadTestsFromTestCase(TestPOIOSMMigration)
+    batch_cascade = unittest.TestLoader().loadTestsFromTestCase(TestBatchCascade)
+    live_tags = unittest.TestLoader().loadTestsFromTestCase(TestLiveTags)
+    osm_cache = unittest.TestLoader().loadTestsFromTestCase(TestOSMCache)
+    candidate_index = unittest.TestLoader().loadTestsFromTestCase(TestCandidateIndex)
+    checkpoint = unittest.TestLoader().loadTestsFromTestCase(TestCheckpoint)
+    osm_changes = unittest.TestLoader().loadTestsFromTestCase(TestOSMChanges)
+    postcode_resolver = unittest.TestLoader().loadTestsFromTestCase(TestPostcodeResolver)
+    building_index = unittest.TestLoader().loadTestsFromTestCase(TestBuildingIndex)
+    tile_cache = unittest.TestLoader().loadTestsFromTestCase(TestTileCache)
+    candidate_scoring = unittest.TestLoader().loadTestsFromTestCase(TestCandidateScoring)
+    name_classifier = unittest.TestLoader().loadTestsFromTestCase(TestNameClassifier)
+    tier_planner = unittest.TestLoader().loadTestsFromTestCase(TestTierPlanner)
     suite = unittest.TestSuite(
         [address_resolver, address_full_resolver, opening_hours_cleaner, opening_hours_cleaner2, city_cleaner,
          phone_cleaner, phone_cleaner_to_str, string_cleaner, url_cleaner, opening_hours_resolver,
-         smart_online_poi_matching, timing, osm])
+         smart_online_poi_matching, timing, osm, shop_poi_tiers, shop_poi_group_query,
+         rewrite_search_name, positional_query, candidate_index, checkpoint,
+         osm_changes, postcode_resolver, building_index, tile_cache,
+         candidate_scoring, name_classifier, tier_planner, query_tier_group, worker_pool,
+         live_tags, osm_cache, result_column, poi_osm_migration, batch_cascade])
     return unittest.TextTestRunner(verbosity=2).run(suite)
 
 
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import threading
+    import pandas as pd
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+    from osmapi import OsmApi
+    from osm_poi_matchmaker.dao.data_structure import OSM_object_type
+    from osm_poi_matchmaker.libs.live_tags import LiveTagFetcher, id_batches, SOURCE_PLANET
+    from osm_poi_matchmaker.libs.osm_cache import OSMCache
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+METADATA = 'version="3" changeset="42" timestamp="2021-03-01T10:00:00Z" user="mapper" uid="7" visible="true"'
+
+# OSM XML of the objects of the stand-in OSM API
+OSM_OBJECTS = {
+    ('node', 10): '<node id="10" lat="47.5" lon="19.0" {}><tag k="shop" v="bakery"/></node>'.format(METADATA),
+    ('node', 11): '<node id="11" lat="47.51" lon="19.01" {}/>'.format(METADATA),
+    ('node', 12): '<node id="12" lat="47.52" lon="19.01" {}/>'.format(METADATA),
+    ('node', 13): '<node id="13" lat="47.52" lon="19.02" {}/>'.format(METADATA),
+    ('way', 1): '<way id="1" {}><nd ref="11"/><nd ref="12"/><nd ref="13"/><nd ref="11"/>'
+                '<tag k="shop" v="supermarket"/><tag k="name" v="Spar"/></way>'.format(METADATA),
+    ('relation', 5): '<relation id="5" {}><member type="way" ref="1" role="outer"/>'
+                     '<tag k="type" v="multipolygon"/><tag k="shop" v="mall"/></relation>'.format(METADATA),
+}
+# Elements of the full object calls
+FULL_OBJECTS = {
+    ('way', 1): [('node', 11), ('node', 12), ('node', 13), ('way', 1)],
+    ('relation', 5): [('node', 11), ('node', 12), ('node', 13), ('way', 1), ('relation', 5)],
+}
+
+
+class OSMAPIHandler(BaseHTTPRequestHandler):
+    # Multi-object (/api/0.6/nodes?nodes=1,2) and full object (/api/0.6/way/1/full) calls of the OSM API, missing
+    # objects give 404 like the real API
+    paths = []
+
+    def do_GET(self):
+        OSMAPIHandler.paths.append(self.path)
+        url = urlparse(self.path)
+        parts = url.path.split('/')
+        if parts[-1] == 'full':
+            elements = [OSM_OBJECTS.get(k) for k in FULL_OBJECTS.get((parts[-3], int(parts[-2])), [None])]
+        else:
+            ids = parse_qs(url.query).get(parts[-1], [''])[0].split(',')
+            elements = [OSM_OBJECTS.get((parts[-1][:-1], int(i))) for i in ids]
+        if None in elements:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = '<?xml version="1.0" encoding="UTF-8"?><osm version="0.6">{}</osm>'.format(''.join(elements))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePOIBase:
+    # poi_osm_cache in memory
+
+    def __init__(self, rows=(), versions=None, planet=None):
+        self.rows = list(rows)
+        # Versions of the planet tables keyed by (OSM_object_type, osm_id)
+        self.versions = versions or {}
+        # Planet table rows keyed by (OSM_object_type, osm_id), untagged nodes are in planet_osm_nodes only
+        self.planet = planet or {}
+
+    def query_osm_cache_pd(self, object_type, osm_ids):
+        return pd.DataFrame([r for r in self.rows if r['osm_object_type'] == object_type and r['osm_id'] in osm_ids],
+                            columns=['osm_id', 'osm_object_type', 'osm_live_tags', 'osm_version'])
+
+    def query_osm_versions_pd(self, object_type, osm_ids):
+        return pd.DataFrame([(i, self.versions[(object_type, i)]) for i in osm_ids if (object_type, i) in self.versions],
+                            columns=['osm_id', 'osm_version'])
+
+    def query_planet_objects_pd(self, object_type, osm_ids):
+        return pd.DataFrame([dict(self.planet[(object_type, i)], osm_id=i) for i in osm_ids
+                             if (object_type, i) in self.planet and 'tags' in self.planet[(object_type, i)]],
+                            columns=['osm_id', 'tags', 'members', 'osm_user', 'osm_uid', 'osm_version', 'osm_changeset',
+                                     'osm_timestamp', 'osm_lat', 'osm_lon'])
+
+    def query_planet_nodes_pd(self, osm_ids):
+        return pd.DataFrame([dict(self.planet[(OSM_object_type.node, i)], osm_id=i) for i in osm_ids
+                             if (OSM_object_type.node, i) in self.planet and
+                             'tags' not in self.planet[(OSM_object_type.node, i)]],
+                            columns=['osm_id', 'osm_lat', 'osm_lon'])
+
+    def add_osm_cache(self, rows):
+        keys = {(r['osm_object_type'], r['osm_id']) for r in rows}
+        self.rows = [r for r in self.rows if (r['osm_object_type'], r['osm_id']) not in keys] + list(rows)
+
+
+METADATA_COLUMNS = {'osm_user': 'mapper', 'osm_uid': 7, 'osm_version': 3, 'osm_changeset': 42,
+                    'osm_timestamp': pd.Timestamp('2021-03-01T10:00:00Z')}
+
+# Planet tables of the local import: tags are hstore in planet_osm_point and text arrays in the middle tables
+PLANET_OBJECTS = {
+    (OSM_object_type.node, 10): dict(METADATA_COLUMNS, tags={'shop': 'bakery', 'osm_user': 'mapper'}, members=None,
+                                     osm_lat=47.5, osm_lon=19.0),
+    (OSM_object_type.node, 11): {'osm_lat': 47.51, 'osm_lon': 19.01},
+    (OSM_object_type.node, 13): {'osm_lat': 47.52, 'osm_lon': 19.02},
+    (OSM_object_type.way, 1): dict(METADATA_COLUMNS, tags=['shop', 'supermarket', 'name', 'Spar'],
+                                   members=[11, 12, 13, 11]),
+    (OSM_object_type.relation, 5): dict(METADATA_COLUMNS, tags=['type', 'multipolygon', 'shop', 'mall'],
+                                        members=['w1', 'outer']),
+}
+
+
+def cached_row(db, object_type, osm_id):
+    return next(r for r in db.rows if r['osm_object_type'] == object_type and r['osm_id'] == osm_id)
+
+
+class TestLiveTags(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), OSMAPIHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        OSMAPIHandler.paths = []
+        self.api = OsmApi(api='http://127.0.0.1:{}'.format(self.server.server_port))
+
+    def test_id_batches(self):
+        batches = list(id_batches([1, 22, 333, 4444], 'nodes', len('/api/0.6/nodes?nodes=') + 6))
+        with self.subTest():
+            self.assertListEqual([[1, 22], [333], [4444]], batches)
+        with self.subTest():
+            self.assertListEqual([[1, 22, 333, 4444]], list(id_batches([1, 22, 333, 4444], 'nodes', 2000)))
+
+    def test_fetch(self):
+        db = FakePOIBase([{'osm_id': 10, 'osm_object_type': OSM_object_type.node,
+                           'osm_live_tags': {'shop': 'cached'}}])
+        fetcher = LiveTagFetcher(db, self.api, max_url_length=len('/api/0.6/nodes?nodes=') + 5, full=False,
+                                 cache=OSMCache(db))
+        fetcher.add(1, OSM_object_type.way)
+        fetcher.add(10, OSM_object_type.node)
+        # Relations are negative in the planet tables
+        fetcher.add(-5, OSM_object_type.relation)
+        with self.subTest():
+            self.assertEqual(5, fetcher.fetch())
+        with self.subTest():
+            self.assertDictEqual({'shop': 'supermarket', 'name': 'Spar'}, fetcher.get(1, OSM_object_type.way))
+        with self.subTest():
+            self.assertDictEqual({'shop': 'cached'}, fetcher.get(10, OSM_object_type.node))
+        with self.subTest():
+            self.assertDictEqual({'type': 'multipolygon', 'shop': 'mall'}, fetcher.get(-5, OSM_object_type.relation))
+        with self.subTest():
+            self.assertListEqual(['/api/0.6/ways?ways=1', '/api/0.6/relations?relations=5',
+                                  '/api/0.6/nodes?nodes=11,12', '/api/0.6/nodes?nodes=13'], OSMAPIHandler.paths)
+        with self.subTest():
+            self.assertSetEqual({(OSM_object_type.way, 1), (OSM_object_type.relation, 5), (OSM_object_type.node, 11),
+                                 (OSM_object_type.node, 12), (OSM_object_type.node, 13)},
+                                {(r['osm_object_type'], r['osm_id']) for r in db.rows[1:]})
+        with self.subTest():
+            self.assertListEqual([11, 12, 13, 11], cached_row(db, OSM_object_type.way, 1)['osm_nodes'])
+
+    def test_fetch_full(self):
+        db = FakePOIBase([{'osm_id': 12, 'osm_object_type': OSM_object_type.node, 'osm_live_tags': None}])
+        fetcher = LiveTagFetcher(db, self.api, full=True, cache=OSMCache(db))
+        fetcher.add(1, OSM_object_type.way)
+        fetcher.add(-5, OSM_object_type.relation)
+        fetcher.add(10, OSM_object_type.node)
+        fetcher.fetch()
+        with self.subTest():
+            self.assertListEqual(['/api/0.6/way/1/full', '/api/0.6/relation/5/full', '/api/0.6/nodes?nodes=10'],
+                                 OSMAPIHandler.paths)
+        with self.subTest():
+            self.assertDictEqual({'type': 'multipolygon', 'shop': 'mall'}, fetcher.get(-5, OSM_object_type.relation))
+        # Every element is cached once, node 12 was already in the cache
+        with self.subTest():
+            self.assertCountEqual([(OSM_object_type.node, 12), (OSM_object_type.node, 11), (OSM_object_type.node, 13),
+                                   (OSM_object_type.way, 1), (OSM_object_type.relation, 5),
+                                   (OSM_object_type.node, 10)],
+                                  [(r['osm_object_type'], r['osm_id']) for r in db.rows])
+        with self.subTest():
+            self.assertEqual('way', cached_row(db, OSM_object_type.relation, 5)['osm_nodes'][0]['type'])
+
+    def test_missing(self):
+        db = FakePOIBase()
+        fetcher = LiveTagFetcher(db, self.api, max_url_length=2000, cache=OSMCache(db))
+        for osm_id in (10, 11, 99):
+            fetcher.add(osm_id, OSM_object_type.node)
+        fetcher.fetch()
+        with self.subTest():
+            self.assertIsNone(fetcher.get(99, OSM_object_type.node))
+        with self.subTest():
+            self.assertDictEqual({'shop': 'bakery'}, fetcher.get(10, OSM_object_type.node))
+        with self.subTest():
+            self.assertEqual(1, fetcher.stats['missing'])
+        with self.subTest():
+            self.assertEqual(2, fetcher.stats['downloaded'])
+
+    def test_stale(self):
+        db = FakePOIBase([{'osm_id': 10, 'osm_object_type': OSM_object_type.node, 'osm_live_tags': {'shop': 'old'},
+                           'osm_version': 2},
+                          {'osm_id': 11, 'osm_object_type': OSM_object_type.node, 'osm_live_tags': {'shop': 'new'},
+                           'osm_version': 4}],
+                         {(OSM_object_type.node, 10): 3, (OSM_object_type.node, 11): 3})
+        fetcher = LiveTagFetcher(db, self.api, cache=OSMCache(db), validate=True)
+        fetcher.add(10, OSM_object_type.node)
+        fetcher.add(11, OSM_object_type.node)
+        # Only node 10 has a newer version in the planet
+        with self.subTest():
+            self.assertEqual(1, fetcher.fetch())
+        with self.subTest():
+            self.assertListEqual(['/api/0.6/nodes?nodes=10'], OSMAPIHandler.paths)
+        with self.subTest():
+            self.assertDictEqual({'shop': 'bakery'}, fetcher.get(10, OSM_object_type.node))
+        with self.subTest():
+            self.assertDictEqual({'shop': 'new'}, fetcher.get(11, OSM_object_type.node))
+        with self.subTest():
+            self.assertEqual(2, len(db.rows))
+
+    def test_planet(self):
+        db = FakePOIBase(planet=PLANET_OBJECTS)
+        cache = OSMCache(db)
+        fetcher = LiveTagFetcher(db, self.api, cache=cache, validate=False, source=SOURCE_PLANET, refresh=False)
+        fetcher.add(-5, OSM_object_type.relation)
+        fetcher.add(10, OSM_object_type.node)
+        fetcher.fetch()
+        with self.subTest():
+            self.assertListEqual([], OSMAPIHandler.paths)
+        with self.subTest():
+            self.assertDictEqual({'type': 'multipolygon', 'shop': 'mall'}, fetcher.get(-5, OSM_object_type.relation))
+        with self.subTest():
+            self.assertDictEqual({'shop': 'bakery'}, fetcher.get(10, OSM_object_type.node))
+        with self.subTest():
+            self.assertListEqual([{'type': 'way', 'ref': 1, 'role': 'outer'}],
+                                 cached_row(db, OSM_object_type.relation, 5)['osm_nodes'])
+        with self.subTest():
+            self.assertEqual(3, cached_row(db, OSM_object_type.way, 1)['osm_version'])
+        # Untagged nodes have no metadata, they are kept in memory only
+        with self.subTest():
+            self.assertEqual(47.51, cache.get(11, OSM_object_type.node)['osm_lat'])
+        with self.subTest():
+            self.assertCountEqual([(OSM_object_type.relation, 5), (OSM_object_type.way, 1), (OSM_object_type.node, 10)],
+                                  [(r['osm_object_type'], r['osm_id']) for r in db.rows])
+        # Node 12 is missing from the planet tables
+        with self.subTest():
+            self.assertEqual(1, fetcher.stats['missing'])
+
+    def test_planet_refresh(self):
+        db = FakePOIBase(planet=PLANET_OBJECTS)
+        fetcher = LiveTagFetcher(db, self.api, cache=OSMCache(db), validate=False, source=SOURCE_PLANET, refresh=True)
+        fetcher.add(1, OSM_object_type.way)
+        fetcher.fetch()
+        # Only the node missing from the planet snapshot is downloaded
+        with self.subTest():
+            self.assertListEqual(['/api/0.6/nodes?nodes=12'], OSMAPIHandler.paths)
+        with self.subTest():
+            self.assertEqual(3, fetcher.stats['planet'])
+        with self.subTest():
+            self.assertEqual(1, fetcher.stats['downloaded'])
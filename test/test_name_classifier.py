@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import pandas as pd
+    from osm_poi_matchmaker.dao.data_structure import OSM_object_type
+    from osm_poi_matchmaker.libs.name_classifier import NameClassifier
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+class TestNameClassifier(unittest.TestCase):
+    def setUp(self):
+        self.comm_data = pd.DataFrame({
+            'poi_code': ['huspaint', 'huspasup', 'hutesexp', 'hucibatm', 'hubroken'],
+            'poi_search_name': ['(spar|interspar)', '(spar|interspar)', 'tesco', 'cib', '(unclosed'],
+            'poi_search_avoid_name': [None, None, None, '(otp|k&h)', None]})
+        self.objects = pd.DataFrame({
+            'osm_id': [1, 1, 2, 3, 4, 5],
+            'node': ['node', 'way', 'node', 'way', 'node', 'relation'],
+            'name': ['INTERSPAR', 'Tesco Expressz', None, 'Posta', 'CIB ATM', 'OTP'],
+            'brand': [None, None, 'Spar', None, 'OTP Bank', None]})
+
+    def test_classify(self):
+        classifier = NameClassifier(self.comm_data)
+        candidates = classifier.classify(self.objects)
+        tags = {(c['osm_id'], c['osm_object_type'], c['poi_code'], c['poi_avoid']) for c in candidates}
+        with self.subTest():
+            self.assertEqual(4, len(classifier))
+        with self.subTest():
+            self.assertSetEqual({(1, OSM_object_type.node, 'huspaint', False),
+                                 (1, OSM_object_type.node, 'huspasup', False),
+                                 (1, OSM_object_type.way, 'hutesexp', False),
+                                 (2, OSM_object_type.node, 'huspaint', False),
+                                 (2, OSM_object_type.node, 'huspasup', False),
+                                 # Name matches the search name and brand matches the avoid name
+                                 (4, OSM_object_type.node, 'hucibatm', False),
+                                 (4, OSM_object_type.node, 'hucibatm', True),
+                                 (5, OSM_object_type.relation, 'hucibatm', True)}, tags)
+        with self.subTest():
+            self.assertEqual(len(tags), len(candidates))
+
+    def test_memo(self):
+        classifier = NameClassifier(self.comm_data)
+        classifier.classify(pd.concat([self.objects, self.objects], ignore_index=True))
+        with self.subTest():
+            self.assertEqual(14, classifier.stats['names'])
+        with self.subTest():
+            self.assertEqual(7, classifier.stats['distinct'])
+        with self.subTest():
+            self.assertEqual(6, classifier.stats['matched'])
@@ -5,7 +5,7 @@ try:
     import logging
     import sys
     import pandas as pd
-    from osm_poi_matchmaker.libs.online_poi_matching import smart_postcode_check
+    from osm_poi_matchmaker.libs.online_poi_matching import smart_postcode_check, result_column
     from osm_poi_matchmaker.dao.poi_array_structure import POI_ADDR_COLS, OSM_ADDR_COLS
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
@@ -63,3 +63,29 @@ class TestSmartOnlinePOIMatching(unittest.TestCase):
             postcode = smart_postcode_check(self.addresses[i], self.osm_addresses.iloc[[i]], self.postcodes[i])
             with self.subTest():
                 self.assertEqual(postcode, self.good_codes[i])
+
+
+class TestResultColumn(unittest.TestCase):
+    def setUp(self):
+        self.data = pd.DataFrame({'poi_postcode': [1011, 1012], 'osm_id': [1, 2],
+                                  'osm_timestamp': [pd.Timestamp('2021-03-01 10:00'), pd.Timestamp('2021-03-01 11:00')]})
+
+    def test_result_column(self):
+        # String postcode of OSM and timezone aware timestamp of OSM do not fit in the original columns
+        postcode = result_column([1011, '1013'], self.data.index, self.data['poi_postcode'].dtype)
+        timestamp = result_column([pd.Timestamp('2021-03-01T10:00:00Z'), None], self.data.index,
+                                  self.data['osm_timestamp'].dtype)
+        osm_id = result_column([5, 6], self.data.index, self.data['osm_id'].dtype)
+        with self.subTest():
+            self.assertListEqual([1011, '1013'], postcode.tolist())
+        with self.subTest():
+            self.assertEqual(pd.Timestamp('2021-03-01T10:00:00Z'), timestamp.iat[0])
+        with self.subTest():
+            self.assertEqual('int64', osm_id.dtype)
+        with self.subTest():
+            self.assertListEqual([5, None], result_column([5, None], self.data.index,
+                                                          self.data['osm_id'].dtype).tolist())
+        self.data['poi_postcode'] = postcode
+        self.data['osm_timestamp'] = timestamp
+        with self.subTest():
+            self.assertEqual('1013', self.data['poi_postcode'].iat[1])
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import pandas as pd
+    from osm_poi_matchmaker.dao.data_structure import OSM_object_type
+    from osm_poi_matchmaker.libs.osm_cache import OSMCache
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+class FakePOIBase:
+    # poi_osm_cache table in memory, queries are counted
+
+    def __init__(self, rows, versions=None):
+        self.rows = pd.DataFrame(rows, columns=['osm_id', 'osm_object_type', 'osm_live_tags', 'osm_version'])
+        # Versions of the planet tables keyed by (object type name, osm_id)
+        self.versions = versions or {}
+        self.queries = []
+
+    def query_osm_cache_pd(self, object_type, osm_ids):
+        self.queries.append((object_type, list(osm_ids)))
+        return self.rows[(self.rows['osm_object_type'] == object_type.name) & self.rows['osm_id'].isin(osm_ids)]
+
+    def query_osm_versions_pd(self, object_type, osm_ids):
+        self.queries.append(('versions', object_type, list(osm_ids)))
+        return pd.DataFrame([(i, self.versions[(object_type.name, i)]) for i in osm_ids
+                             if (object_type.name, i) in self.versions], columns=['osm_id', 'osm_version'])
+
+    def query_osm_cache_all_pd(self):
+        self.queries.append('all')
+        return self.rows
+
+
+class TestOSMCache(unittest.TestCase):
+    def setUp(self):
+        self.db = FakePOIBase([(1, 'node', {'shop': 'bakery'}, 3), (2, 'node', None, 1),
+                               (1, 'way', {'building': 'yes'}, 5)], {('node', 1): 4, ('node', 2): 1})
+
+    def test_load(self):
+        cache = OSMCache(self.db)
+        cache.load(OSM_object_type.node, [1, 2, 3])
+        with self.subTest():
+            self.assertDictEqual({'shop': 'bakery'}, cache.get(1, OSM_object_type.node)['osm_live_tags'])
+        # Objects missing from poi_osm_cache are not queried again
+        with self.subTest():
+            self.assertIsNone(cache.get(3, OSM_object_type.node))
+        with self.subTest():
+            self.assertDictEqual({'building': 'yes'}, cache.get(1, OSM_object_type.way)['osm_live_tags'])
+        cache.load(OSM_object_type.node, [2, 3])
+        with self.subTest():
+            self.assertListEqual([(OSM_object_type.node, [1, 2, 3]), (OSM_object_type.way, [1])], self.db.queries)
+        with self.subTest():
+            self.assertEqual(2, cache.stats['hits'])
+        with self.subTest():
+            self.assertEqual(1, cache.stats['misses'])
+        with self.subTest():
+            self.assertEqual(3, len(cache))
+
+    def test_load_all(self):
+        cache = OSMCache(self.db)
+        cache.load_all()
+        with self.subTest():
+            self.assertIsNone(cache.get(5, OSM_object_type.relation))
+        with self.subTest():
+            self.assertIsNotNone(cache.get(1, OSM_object_type.way))
+        with self.subTest():
+            self.assertListEqual(['all'], self.db.queries)
+        with self.subTest():
+            self.assertEqual(0, cache.stats['misses'])
+
+    def test_put(self):
+        cache = OSMCache(self.db)
+        cache.put([{'osm_id': 7, 'osm_object_type': OSM_object_type.relation, 'osm_live_tags': {'type': 'site'}}])
+        with self.subTest():
+            self.assertDictEqual({'type': 'site'}, cache.get(7, OSM_object_type.relation)['osm_live_tags'])
+        with self.subTest():
+            self.assertListEqual([], self.db.queries)
+
+    def test_validate(self):
+        cache = OSMCache(self.db)
+        cache.load(OSM_object_type.node, [1, 2, 3])
+        # Node 1 has a newer version in the planet, node 3 is not cached
+        with self.subTest():
+            self.assertListEqual([1], cache.validate(OSM_object_type.node, [1, 2, 3]))
+        with self.subTest():
+            self.assertListEqual([(OSM_object_type.node, [1, 2, 3]), ('versions', OSM_object_type.node, [1, 2])],
+                                 self.db.queries)
+        with self.subTest():
+            self.assertIsNone(cache.get(1, OSM_object_type.node))
+        with self.subTest():
+            self.assertIsNotNone(cache.get(2, OSM_object_type.node))
+        # Validated objects are not queried again
+        with self.subTest():
+            self.assertListEqual([], cache.validate(OSM_object_type.node, [1, 2]))
+        with self.subTest():
+            self.assertEqual(1, cache.stats['stale'])
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import os
+    import tempfile
+    import pandas as pd
+    import geopandas as gpd
+    from shapely.geometry import Point
+    from osm_poi_matchmaker.libs.osm_changes import read_osm_change, OSMChanges
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+OSM_CHANGE = '''<?xml version="1.0" encoding="UTF-8"?>
+<osmChange version="0.6" generator="osmium">
+  <modify>
+    <node id="10" version="2" lat="47.5" lon="19.001"><tag k="shop" v="convenience"/></node>
+    <way id="20" version="3"><nd ref="10"/><nd ref="11"/></way>
+  </modify>
+  <delete>
+    <node id="11" version="4"/>
+    <relation id="30" version="2"/>
+  </delete>
+</osmChange>
+'''
+
+
+def change(osm_id, lon, lat, timestamp, city=None):
+    return {'name': None, 'brand': None, 'osm_id': osm_id, 'node': 'node', 'shop': 'convenience', 'amenity': None,
+            'addr:housename': None, 'addr:housenumber': None, 'addr:postcode': None, 'addr:city': city,
+            'addr:street': None, 'addr:conscriptionnumber': None, 'way': Point(lon, lat), 'lon': lon, 'lat': lat,
+            'osm_timestamp': pd.Timestamp(timestamp, tz='UTC')}
+
+
+class TestOSMChanges(unittest.TestCase):
+    def setUp(self):
+        self.changes = OSMChanges(gpd.GeoDataFrame([
+            change(1, 19.001, 47.5, '2021-01-02'),
+            change(2, 19.2, 47.5, '2021-01-03', 'Budapest'),
+        ], geometry='way'))
+
+    def test_read_osm_change(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'change.osc')
+            with open(file_name, 'w') as f:
+                f.write(OSM_CHANGE)
+            osm_ids, nodes = read_osm_change(file_name)
+        with self.subTest():
+            self.assertEqual({10, 20, 11, -30}, osm_ids)
+        with self.subTest():
+            self.assertEqual([(19.001, 47.5)], nodes)
+
+    def test_affected(self):
+        # About 75 meter is 0.001 degree of longitude in Budapest
+        with self.subTest():
+            self.assertTrue(self.changes.affected(19.0, 47.5, 100))
+        with self.subTest():
+            self.assertFalse(self.changes.affected(19.0, 47.5, 50))
+        # Only the changes after the snapshot of the stored decision
+        with self.subTest():
+            self.assertFalse(self.changes.affected(19.0, 47.5, 100, snapshot=pd.Timestamp('2021-01-02', tz='UTC')))
+        with self.subTest():
+            self.assertTrue(self.changes.affected(19.0, 47.5, 100, snapshot=pd.Timestamp('2021-01-01', tz='UTC')))
+        # Address based tiers have no distance limit
+        with self.subTest():
+            self.assertTrue(self.changes.affected(19.0, 47.5, 50, 'budapest', pd.Timestamp('2021-01-02', tz='UTC')))
+        with self.subTest():
+            self.assertFalse(self.changes.affected(19.0, 47.5, 50, 'Szeged', pd.Timestamp('2021-01-02', tz='UTC')))
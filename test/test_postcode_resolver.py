@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import geopandas as gpd
+    from shapely.geometry import Polygon, Point, box
+    from osm_poi_matchmaker.libs.postcode_resolver import PostcodeResolver
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+class TestPostcodeResolver(unittest.TestCase):
+    def setUp(self):
+        self.boundaries = gpd.GeoDataFrame({
+            'name': ['1052 Budapest', '1051 Budapest', '1053', 'Budapest'],
+            'way': [box(19.0, 47.0, 19.01, 47.01), box(19.005, 47.0, 19.02, 47.01),
+                    Polygon([(19.0, 47.01), (19.02, 47.01), (19.0, 47.03)]), box(19.05, 47.0, 19.06, 47.01)]},
+            geometry='way')
+        self.resolver = PostcodeResolver(self.boundaries)
+
+    def test_postcode(self):
+        with self.subTest():
+            self.assertEqual(1052, self.resolver.postcode(19.002, 47.005))
+        # Overlapping boundaries: the first one in name order
+        with self.subTest():
+            self.assertEqual(1051, self.resolver.postcode(19.007, 47.005))
+        with self.subTest():
+            self.assertEqual(1053, self.resolver.postcode('19.001', '47.015'))
+        with self.subTest():
+            self.assertIsNone(self.resolver.postcode(19.03, 47.005))
+        with self.subTest():
+            self.assertIsNone(self.resolver.postcode(None, 47.005))
+        # Name is not a postcode
+        with self.subTest():
+            self.assertIsNone(self.resolver.postcode(19.055, 47.005))
+
+    def test_cells(self):
+        # Memoised grid cells give the same answer as point in polygon tests
+        boundaries = self.boundaries.sort_values('name')
+        for i in range(0, 60):
+            for j in range(0, 40):
+                lon, lat = 19.0 + i * 0.00037, 47.0 + j * 0.00077
+                expected = None
+                for name, way in zip(boundaries['name'], boundaries['way']):
+                    if way.contains(Point(lon, lat)):
+                        expected = int(name.split(' ')[0]) if name[0].isdigit() else None
+                        break
+                self.assertEqual(expected, self.resolver.postcode(lon, lat), (lon, lat))
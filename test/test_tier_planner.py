@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    from osm_poi_matchmaker.libs.tier_planner import plan_tier_groups, NO_MATCH_TIER
+    from osm_poi_matchmaker.dao.poi_base import CASCADE_TIER_GROUPS
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+class TestTierPlanner(unittest.TestCase):
+    def setUp(self):
+        self.test_data = [
+            # Parcel lockers: nearly every match is from the name and distance tier
+            {'hits': {980: 950, 990: 5, NO_MATCH_TIER: 45}, 'groups': ((965, 940, 950, 970, 980, 990),)},
+            {'hits': {965: 300, 980: 500, NO_MATCH_TIER: 200}, 'groups': ((965,), (940, 950, 970, 980, 990))},
+            {'hits': {NO_MATCH_TIER: 1000}, 'groups': ((965, 940, 950, 970, 980, 990),)},
+            {'hits': {940: 300, 980: 500, NO_MATCH_TIER: 200}, 'groups': ((965, 940), (950, 970, 980, 990))},
+            {'hits': {980: 10}, 'groups': None},
+        ]
+
+    def test_plan_tier_groups(self):
+        for i in self.test_data:
+            with self.subTest():
+                self.assertEqual(i['groups'], plan_tier_groups(i['hits'], 100, 2))
+
+    def test_cascade_order(self):
+        # Every tier is planned once and in cascade order, so the first group with a hit has the best candidate
+        groups = plan_tier_groups({965: 50, 950: 1, 970: 30, 990: 19}, 100, 2)
+        with self.subTest():
+            self.assertEqual(((965,), (940, 950, 970, 980, 990)), groups)
+        with self.subTest():
+            self.assertEqual((965, 940, 950, 970, 980, 990), sum(groups, ()))
+
+    def test_round_trips(self):
+        # Tiers that hit often are not split into more round trips than the default
+        groups = plan_tier_groups({965: 5, 940: 5, 950: 30, 970: 30, 980: 20, 990: 5, NO_MATCH_TIER: 5}, 100, 2)
+        with self.subTest():
+            self.assertEqual(CASCADE_TIER_GROUPS, groups)
+        for i in self.test_data:
+            if i['groups'] is not None:
+                with self.subTest():
+                    self.assertLessEqual(len(plan_tier_groups(i['hits'], 100, 2)), len(CASCADE_TIER_GROUPS))
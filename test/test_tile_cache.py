@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+try:
+    import unittest
+    import logging
+    import sys
+    import geopandas as gpd
+    from shapely.geometry import Point, box
+    from osm_poi_matchmaker.libs.tile_cache import TileCache, LRUCache
+    from test.test_candidate_index import candidate
+except ImportError as err:
+    logging.error('Error %s import module: %s', __name__, err)
+    logging.exception('Exception occurred')
+
+    sys.exit(128)
+
+
+class FakePOIBase:
+    # Candidates of the tile and city queries are filtered from a fixed list of OSM objects
+
+    def __init__(self, candidates):
+        self.candidates = gpd.GeoDataFrame(candidates, geometry='way')
+        self.queries = []
+
+    def query_osm_poi_type_bbox_gpd(self, ptype, xmin, ymin, xmax, ymax):
+        self.queries.append('tile')
+        return self.candidates[self.candidates.intersects(box(xmin, ymin, xmax, ymax))]
+
+    def query_osm_poi_type_city_gpd(self, ptype, city):
+        self.queries.append('city')
+        return self.candidates[self.candidates['addr:city'].str.lower() == city.lower()]
+
+
+class TestTileCache(unittest.TestCase):
+    def setUp(self):
+        self.db = FakePOIBase([
+            candidate(1, 'node', Point(19.0010, 47.5), name='Spar'),
+            candidate(2, 'node', Point(19.0025, 47.5), name='CBA'),
+            candidate(3, 'node', Point(19.3000, 47.5), name='Spar', city='Budapest', street='Kossuth utca',
+                      housenumber='2'),
+        ])
+        self.cache = TileCache(self.db, 2000, 2)
+
+    def test_tiles(self):
+        match = self.cache.query_osm_shop_poi_gpd(19.0, 47.5, 'shop', 'spar', '', '', '', '', '', 50, 100, 200)
+        with self.subTest():
+            self.assertEqual(1, match['osm_id'].values[0])
+        # Same tile is answered from cache
+        match = self.cache.query_osm_shop_poi_gpd(19.0005, 47.5, 'shop', 'cba', '', '', '', '', '', 50, 200, 200)
+        with self.subTest():
+            self.assertEqual(2, match['osm_id'].values[0])
+        with self.subTest():
+            self.assertEqual(['tile'], self.db.queries)
+
+    def test_address_tiers(self):
+        # Address based tiers have no distance limit, they are answered by city
+        match = self.cache.query_osm_shop_poi_gpd(19.0, 47.5, 'shop', 'spar', '', 'Kossuth utca', '2', '',
+                                                  'Budapest', 50, 100, 200)
+        with self.subTest():
+            self.assertEqual(3, match['osm_id'].values[0])
+        with self.subTest():
+            self.assertEqual(940, match['priority'].values[0])
+        with self.subTest():
+            self.assertEqual(['city'], self.db.queries)
+
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.put('a', 1, 10)
+        cache.put('b', 2, 20)
+        cache.get('a')
+        cache.put('c', 3, 30)
+        with self.subTest():
+            self.assertIsNone(cache.get('b'))
+        with self.subTest():
+            self.assertEqual(1, cache.get('a'))
+        with self.subTest():
+            self.assertEqual({'hits': 2, 'misses': 1, 'evictions': 1, 'memory': 40}, cache.stats)
@@ -5,7 +5,7 @@ try:
     import logging
     import sys
     import time
-    from osm_poi_matchmaker.utils.timing import Timing
+    from osm_poi_matchmaker.utils.timing import Timing, SlowestItems
 except ImportError as err:
     logging.error('Error %s import module: %s', __name__, err)
     logging.exception('Exception occurred')
@@ -23,3 +23,9 @@ class TestTiming(unittest.TestCase):
         time.sleep(self.one_sec_timer)
         end = timer.end()
         self.assertRegexpMatches(end, '{}.*'.format(self.one_sec), 10)
+
+    def test_slowest_items(self):
+        slowest = SlowestItems(2)
+        for elapsed, item in ((0.5, 'a'), (2.0, 'b'), (0.1, 'c'), (1.0, {'d': 1})):
+            slowest.add(elapsed, item)
+        self.assertListEqual([(2.0, 'b'), (1.0, {'d': 1})], slowest.items())
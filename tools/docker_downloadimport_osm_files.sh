@@ -62,6 +62,12 @@ if [ -f "${OUTPUT_DIR}/do_osm_import" -a "${IMPORT}" -eq "1" ]; then
     if [ "$exitcode" != "0" ]; then
       echo "ERROR occured during OSM import!"
       exit 10
+    fi
+    psql -d poi -U poi -h opm_db -f /opm/osm2pgsql/planet_indexes.sql
+    exitcode=${?}
+    if [ "$exitcode" != "0" ]; then
+      echo "ERROR occured during creating indexes of OSM tables!"
+      exit 11
     else
       rm "${OUTPUT_DIR}/osm_download.lock" "${OUTPUT_DIR}/osm_import.lock"
     fi